@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+对冲请求对尾延迟的影响：桩服务器让一小部分请求变成慢请求，对比开启对冲前后的延迟分布
+
+用法: python benchmarks/bench_hedging.py [-n 400] [--straggler-rate 0.03]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import SAMPLE_CONTENT, StubServer  # noqa: E402
+from pluto.provider import HedgeArguments, ProviderClient  # noqa: E402
+from pluto.types import APIProvider  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def run(label: str, client: ProviderClient, n: int, concurrency: int) -> None:
+    def one(_: int) -> float:
+        start = time.perf_counter()
+        client.completion("stub-model", MESSAGES)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies: List[float] = sorted(executor.map(one, range(n)))
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    print(
+        f"{label:<8} p50={pct(0.5):7.1f}ms p95={pct(0.95):7.1f}ms "
+        f"p99={pct(0.99):7.1f}ms max={latencies[-1]:7.1f}ms "
+        f"hedges={client.num_hedges} hedge_wins={client.num_hedge_wins}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--straggler-rate", type=float, default=0.03)
+    parser.add_argument("--straggler-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    def reply(body: Dict[str, Any]) -> str:
+        base = random.uniform(0.01, 0.03)
+        if random.random() < args.straggler_rate:
+            base += args.straggler_latency
+        time.sleep(base)
+        return SAMPLE_CONTENT
+
+    with StubServer(reply) as stub:
+        api_base = stub.url + "/v1"
+        for label, hedge in [
+            ("plain", None),
+            ("hedged", HedgeArguments(percentile=0.95, max_extra_fraction=0.1)),
+        ]:
+            deadline: Optional[float] = 30.0 if hedge else None
+            client = ProviderClient(
+                APIProvider.OPENAI_COMPATIBLE,
+                api_base,
+                "sk-stub",
+                request_timeout=deadline,
+                hedge=hedge,
+            )
+            run(label, client, args.n, args.concurrency)
+            # 等落败的副本请求结束后再关闭连接池
+            time.sleep(args.straggler_latency)
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
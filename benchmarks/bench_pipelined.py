@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+对比先建树再生成数据与 create_data_pipelined 的端到端耗时。
+桩服务器为每个请求加上固定延迟，模拟模型的响应时间。
+
+基线与流水线使用同一个客户端、同样的并发上限：先逐层并发建树（每层用 deepen
+同时展开所有叶子），再以 batch_size 等于并发上限的 create_data 生成同样数量的样本。
+另外给出串行建树的耗时作为参考。
+
+用法: python benchmarks/bench_pipelined.py [--degree 4] [--depth 3] [--samples 40]
+                                          [--repeat 3]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import SAMPLE_CONTENT, StubServer  # noqa: E402
+from pluto.data_engine import DataEngine, EngineArguments  # noqa: E402
+from pluto.provider import ProviderClient  # noqa: E402
+from pluto.topic_tree import TopicTree, TopicTreeArguments  # noqa: E402
+from pluto.types import APIProvider  # noqa: E402
+
+
+def make_reply(degree: int) -> Any:
+    counter = [0]
+
+    def reply(body: Dict[str, Any]) -> str:
+        if "node path" in json.dumps(body):
+            counter[0] += 1
+            return json.dumps([f"topic {counter[0]}.{i}" for i in range(degree)])
+        return SAMPLE_CONTENT
+
+    return reply
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--degree", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式的重复次数")
+    args = parser.parse_args()
+
+    tree_args = TopicTreeArguments(
+        "root", tree_degree=args.degree, tree_depth=args.depth
+    )
+    engine_args = EngineArguments("instructions", "system prompt")
+    num_steps = args.samples // args.batch_size
+
+    with StubServer(make_reply(args.degree), latency=args.latency) as stub:
+        client = ProviderClient(
+            APIProvider.OPENAI_COMPATIBLE, stub.url + "/v1", "stub-key"
+        )
+
+        start = time.perf_counter()
+        TopicTree(tree_args, client=client).build_tree("stub-model")
+        serial_tree_time = time.perf_counter() - start
+
+        def tree_then_data() -> float:
+            # 逐层并发建树，请求数与 build_tree 相同，每层的节点同时展开
+            start = time.perf_counter()
+            tree = TopicTree(tree_args, client=client)
+            tree.tree_paths = [[tree_args.root_prompt]]
+            for _ in range(args.depth):
+                tree.deepen("stub-model", levels=1)
+            tree_times.append(time.perf_counter() - start)
+            # 每步的批次大小取客户端的并发上限，生成阶段同样用满并发预算
+            num_samples = num_steps * args.batch_size
+            steps = math.ceil(num_samples / client.max_concurrency)
+            DataEngine(engine_args, client=client).create_data(
+                "stub-model",
+                steps,
+                batch_size=math.ceil(num_samples / steps),
+                topic_tree=tree,
+            )
+            return time.perf_counter() - start
+
+        def pipelined() -> float:
+            start = time.perf_counter()
+            DataEngine(engine_args, client=client).create_data_pipelined(
+                "stub-model",
+                num_steps,
+                TopicTree(tree_args, client=client),
+                batch_size=args.batch_size,
+            )
+            return time.perf_counter() - start
+
+        # 单核机器上线程调度的抖动较大，每种方式重复多次取最小值
+        tree_times: List[float] = []
+        sequential = min(tree_then_data() for _ in range(args.repeat))
+        overlapped = min(pipelined() for _ in range(args.repeat))
+        client.close()
+
+    print()
+    print(f"concurrency limit: {client.max_concurrency}")
+    print(
+        f"tree, then data: {sequential:.2f}s "
+        f"(concurrent tree {min(tree_times):.2f}s)"
+    )
+    print(f"pipelined:       {overlapped:.2f}s")
+    print(f"serial build_tree alone, for reference: {serial_tree_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+对比每次调用都重新解析配置的旧路径与共享 ProviderClient 的单请求开销。
+
+litellm 自身按参数缓存 HTTP 客户端并复用 keep-alive 连接，因此两条路径的
+新建连接数都接近 0，延迟也相当；该基准用于确认共享客户端没有引入额外开销，
+而不是证明连接池更快。
+
+用法: python benchmarks/bench_provider_client.py [-n 200] [--provider openai_compatible]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import litellm  # noqa: E402
+
+from benchmarks.stub_server import StubServer  # noqa: E402
+from pluto.provider import ProviderClient, configure_api_provider  # noqa: E402
+from pluto.types import APIProvider  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def run(label: str, n: int, call: Callable[[], object], stub: StubServer) -> None:
+    call()  # 预热，排除首次导入等一次性开销
+    connections_before = stub.connections
+    latencies: List[float] = []
+    for _ in range(n):
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    print(
+        f"{label:<10} mean={statistics.mean(latencies):7.2f}ms "
+        f"p50={latencies[len(latencies) // 2]:7.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:7.2f}ms "
+        f"new_connections={stub.connections - connections_before}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200, help="每种模式的请求数")
+    parser.add_argument(
+        "--provider",
+        default=APIProvider.OPENAI_COMPATIBLE.value,
+        choices=[APIProvider.OPENAI_COMPATIBLE.value, APIProvider.OLLAMA.value],
+    )
+    args = parser.parse_args()
+
+    provider = APIProvider(args.provider)
+    with StubServer() as stub:
+        api_base = stub.url + "/v1" if provider != APIProvider.OLLAMA else stub.url
+
+        def per_call() -> object:
+            # 旧路径：每次调用都重新解析提供商配置并构造参数
+            model, base, key = configure_api_provider(
+                "stub-model", provider, api_base, "sk-stub"
+            )
+            return litellm.completion(
+                model=model, messages=MESSAGES, api_base=base, api_key=key
+            )
+
+        client = ProviderClient(provider, api_base, "sk-stub")
+
+        def pooled() -> object:
+            return client.completion("stub-model", MESSAGES)
+
+        print(f"provider={provider.value} requests={args.n} server={stub.url}")
+        run("per-call", args.n, per_call, stub)
+        run("pooled", args.n, pooled, stub)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+导入耗时与内存基准：每种导入方式在全新的解释器中执行若干次，取最短耗时与峰值 RSS。
+--check 时超出阈值或加载了不该加载的重依赖即以非零状态退出，可用于 CI 防止回归。
+
+用法: python benchmarks/bench_startup.py [-n 5] [--check]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["litellm", "httpx", "openai", "tqdm"]
+
+# (名称, 导入语句, 是否允许加载重依赖, 耗时阈值秒, RSS 阈值 MB)
+CASES: List[Tuple[str, str, bool, float, float]] = [
+    ("import pluto", "import pluto", False, 0.3, 40),
+    ("Dataset/APIProvider", "from pluto import Dataset, APIProvider", False, 0.3, 40),
+    ("DataEngine", "from pluto import DataEngine, TopicTree", False, 0.5, 50),
+    ("ProviderClient()", "import pluto; pluto.ProviderClient()", False, 0.5, 50),
+    # 第一次请求前才会导入 litellm，作为对照
+    ("litellm", "import pluto.provider, litellm", True, 10.0, 400),
+]
+
+_CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss /= 1024
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss / 1024,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(statement: str, runs: int) -> Dict:
+    env = dict(os.environ, LITELLM_LOCAL_MODEL_COST_MAP="True")
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                _CHILD.format(statement=statement, heavy=HEAVY_MODULES),
+            ],
+            cwd=ROOT,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "seconds": min(r["seconds"] for r in results),
+        "rss_mb": max(r["rss_mb"] for r in results),
+        "heavy": results[0]["heavy"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=5, help="每种导入方式的运行次数")
+    parser.add_argument("--check", action="store_true", help="超出阈值时返回非零")
+    args = parser.parse_args()
+
+    failures = []
+    for name, statement, allow_heavy, max_seconds, max_rss in CASES:
+        result = measure(statement, args.n)
+        print(
+            f"{name:<20} {result['seconds'] * 1000:8.1f}ms "
+            f"{result['rss_mb']:7.1f}MB  heavy={','.join(result['heavy']) or '-'}"
+        )
+        if not allow_heavy and result["heavy"]:
+            failures.append(f"{name} imported {', '.join(result['heavy'])}")
+        if result["seconds"] > max_seconds:
+            failures.append(f"{name} took {result['seconds']:.2f}s > {max_seconds}s")
+        if result["rss_mb"] > max_rss:
+            failures.append(f"{name} used {result['rss_mb']:.0f}MB > {max_rss}MB")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
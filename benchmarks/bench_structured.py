@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+结构化输出对解析失败与重试次数的影响。桩服务器模拟一个模型：请求带 JSON Schema 时
+总是返回符合 schema 的输出；只有 JSON 模式或没有格式约束时，按 --error-rate 的概率
+返回不符合要求的输出（角色名错误、缺少字段、列表无法解析等）。
+--reject-schema 模拟不支持 JSON Schema 的提供商，验证退回 JSON 模式的路径。
+
+用法: python benchmarks/bench_structured.py [--error-rate 0.2] [--reject-schema]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+from typing import Any, Dict, List
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import SAMPLE_CONTENT, StubError, StubServer  # noqa: E402
+from pluto.data_engine import DataEngine, EngineArguments  # noqa: E402
+from pluto.provider import ProviderClient  # noqa: E402
+from pluto.sampling import SamplingArguments  # noqa: E402
+from pluto.topic_tree import TopicTree, TopicTreeArguments  # noqa: E402
+from pluto.types import APIProvider  # noqa: E402
+
+MALFORMED_SAMPLES = [
+    json.dumps({"messages": [{"role": "human", "content": "hi"}]}),
+    json.dumps({"sample": {"messages": []}}),
+    json.dumps({"messages": "user: hi\nassistant: hello"}),
+]
+MALFORMED_SUBTOPICS = [
+    "Here are some subtopics: [basics, advanced usage, pitfalls]",
+    "1. basics\n2. advanced usage\n3. pitfalls",
+]
+
+
+class SimulatedModel:
+    def __init__(self, error_rate: float, reject_schema: bool, seed: int):
+        self.error_rate = error_rate
+        self.reject_schema = reject_schema
+        self.rng = random.Random(seed)
+        self.counts = {
+            "tree": 0,
+            "tree_malformed": 0,
+            "sample": 0,
+            "sample_malformed": 0,
+            "rejected": 0,
+        }
+        self.lock = threading.Lock()
+
+    def __call__(self, body: Dict[str, Any]) -> str:
+        response_format = body.get("response_format") or {}
+        schema = None
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+        is_tree = "node path" in json.dumps(body["messages"])
+        with self.lock:
+            if schema is not None and self.reject_schema:
+                self.counts["rejected"] += 1
+                raise StubError(400, "response_format json_schema is not supported")
+            kind = "tree" if is_tree else "sample"
+            fail = schema is None and self.rng.random() < self.error_rate
+            self.counts[kind] += 1
+            self.counts[kind + "_malformed"] += fail
+            pick = self.rng.randrange(100)
+            topic = self.rng.randrange(10**6)
+
+        if is_tree:
+            if schema is not None:
+                n = schema["properties"]["subtopics"]["maxItems"]
+                subtopics = [f"topic {topic}.{i}" for i in range(n)]
+                return json.dumps({"subtopics": subtopics})
+            if fail:
+                return MALFORMED_SUBTOPICS[pick % len(MALFORMED_SUBTOPICS)]
+            return json.dumps([f"topic {topic}.{i}" for i in range(3)])
+        if fail:
+            return MALFORMED_SAMPLES[pick % len(MALFORMED_SAMPLES)]
+        return SAMPLE_CONTENT
+
+
+def run(label: str, args: argparse.Namespace, structured: bool) -> None:
+    model = SimulatedModel(args.error_rate, args.reject_schema, args.seed)
+    with StubServer(model) as stub:
+        client = ProviderClient(
+            APIProvider.OPENAI_COMPATIBLE,
+            stub.url + "/v1",
+            "stub-key",
+            structured_outputs=structured,
+        )
+        tree = TopicTree(
+            TopicTreeArguments("root", tree_degree=3, tree_depth=args.depth),
+            client=client,
+        )
+        tree.build_tree("stub-model")
+        engine = DataEngine(EngineArguments("instructions", "system"), client=client)
+        engine.create_data(
+            "stub-model",
+            num_steps=args.samples // 10,
+            batch_size=10,
+            topic_tree=tree,
+            # 树的叶子可能少于样本数（JSON 模式下还会丢失分支），统一有放回抽样
+            sampling=SamplingArguments(strategy="with_replacement", seed=args.seed),
+        )
+
+    counts = model.counts
+    results.append(
+        f"{label:<12} tree: {counts['tree']} requests, "
+        f"{counts['tree_malformed']} failed parses, "
+        f"{len(tree.tree_paths)} leaves | samples: {counts['sample']} requests, "
+        f"{counts['sample_malformed']} failed parses/retries | "
+        f"schema rejections: {counts['rejected']}"
+    )
+
+
+results: List[str] = []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--reject-schema", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run("json mode", args, structured=False)
+    run("json schema", args, structured=True)
+    print()
+    for line in results:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
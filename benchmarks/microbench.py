@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+CPU 热路径微基准：在确定性生成的数据上测量 prompt 构建、列表提取、样本校验、
+数据集读写（默认参数的 save 与不写旁路文件的 save）、分词计数与主题树保存的耗时，
+不发送任何网络请求。
+
+默认规模：10 万个样本、度为 10 深度为 5 的主题树（10 万个叶子）、
+每段 40 轮的长对话。结果可保存为基线（benchmarks/microbench_baseline.json，
+随仓库提交），compare 按阈值标记回归。不同机器的速度差异用一段固定的
+纯 Python 校准负载消除：比较的是各项耗时与校准耗时之比。
+
+用法:
+    python benchmarks/microbench.py run [--scale 0.1] [--only NAME ...]
+        [--output results.json] [--save-baseline] [--check]
+    python benchmarks/microbench.py compare results.json [--threshold 0.2]
+        [--io-threshold 0.5]
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 分词计数会导入 litellm；使用其自带的模型价格表，导入时不联网
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from pluto.data_engine import DataEngine, EngineArguments  # noqa: E402
+from pluto import provenance  # noqa: E402
+from pluto.dataset import Dataset  # noqa: E402
+from pluto.prompts import SAMPLE_GENERATION_PROMPT  # noqa: E402
+from pluto.topic_tree import TopicTree, TopicTreeArguments  # noqa: E402
+from pluto.utils import extract_list, remove_linebreaks_and_spaces  # noqa: E402
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "microbench_baseline.json"
+)
+
+NUM_SAMPLES = 100000
+TREE_DEGREE = 10
+TREE_DEPTH = 5
+NUM_LONG_CONVERSATIONS = 1000
+LONG_CONVERSATION_TURNS = 40
+NUM_PROMPTS = 10000
+NUM_LIST_OUTPUTS = 20000
+NUM_TOKEN_COUNTS = 10000
+
+WORDS = (
+    "the a of to and in is for on with as by that this from model data python "
+    "function class value error request response token batch topic tree sample "
+    "user assistant system query index cache thread memory network file stream "
+    "parse schema list dict string number result example training dataset"
+).split()
+
+
+def _text(rng: random.Random, num_words: int) -> str:
+    """随机文本，夹杂换行与多余空格，贴近模型输出"""
+    words = rng.choices(WORDS, k=num_words)
+    for i in range(0, num_words, 17):
+        words[i] += rng.choice(["\n", "  ", "\n\n", ""])
+    return " ".join(words)
+
+
+def _conversation(rng: random.Random, turns: int, words: int) -> Dict:
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for t in range(turns):
+        role = "user" if t % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": _text(rng, words)})
+    return {"messages": messages}
+
+
+class Fixtures:
+    """按需生成并缓存的基准数据，scale 缩放各项规模"""
+
+    def __init__(self, scale: float, seed: int = 0):
+        self.scale = scale
+        self.seed = seed
+        self.workdir = tempfile.mkdtemp(prefix="pluto-microbench-")
+        self._cache: Dict[str, Any] = {}
+
+    def scaled(self, n: int) -> int:
+        return max(1, int(n * self.scale))
+
+    def _get(self, name: str, build: Callable[[random.Random], Any]) -> Any:
+        if name not in self._cache:
+            self._cache[name] = build(random.Random(f"{self.seed}-{name}"))
+        return self._cache[name]
+
+    @property
+    def samples(self) -> List[Dict]:
+        return self._get(
+            "samples",
+            lambda rng: [
+                _conversation(rng, rng.choice([2, 4, 6]), rng.randint(20, 80))
+                for _ in range(self.scaled(NUM_SAMPLES))
+            ],
+        )
+
+    @property
+    def metadata(self) -> List[Dict]:
+        """create_data 为每个样本记录的来源信息"""
+
+        def build(rng: random.Random) -> List[Dict]:
+            paths = self.tree_paths
+            metadata = []
+            for i in range(len(self.samples)):
+                path = paths[i % len(paths)]
+                metadata.append(
+                    {
+                        "tree_path": path,
+                        "tree_path_id": provenance.path_id(path),
+                        "model": "gpt-4o-mini",
+                        "timestamp": 1700000000.0 + i,
+                        "endpoint": "https://api.openai.com/v1",
+                        "usage": {
+                            "prompt_tokens": rng.randint(300, 900),
+                            "completion_tokens": rng.randint(100, 600),
+                            "total_tokens": 0,
+                        },
+                    }
+                )
+            return metadata
+
+        return self._get("metadata", build)
+
+    @property
+    def long_conversations(self) -> List[Dict]:
+        return self._get(
+            "long",
+            lambda rng: [
+                _conversation(rng, LONG_CONVERSATION_TURNS, rng.randint(150, 300))
+                for _ in range(self.scaled(NUM_LONG_CONVERSATIONS))
+            ],
+        )
+
+    @property
+    def tree_paths(self) -> List[List[str]]:
+        def build(rng: random.Random) -> List[List[str]]:
+            names = [
+                [f"{' '.join(rng.choices(WORDS, k=3))} {i}" for i in range(TREE_DEGREE)]
+                for _ in range(TREE_DEPTH)
+            ]
+            leaves = itertools.product(range(TREE_DEGREE), repeat=TREE_DEPTH)
+            num_leaves = self.scaled(TREE_DEGREE**TREE_DEPTH)
+            return [
+                ["root topic"] + [names[d][k] for d, k in enumerate(leaf)]
+                for leaf in itertools.islice(leaves, num_leaves)
+            ]
+
+        return self._get("tree", build)
+
+    @property
+    def list_outputs(self) -> List[str]:
+        """模型返回的子主题列表，前后带有说明文字"""
+
+        def build(rng: random.Random) -> List[str]:
+            outputs = []
+            for _ in range(self.scaled(NUM_LIST_OUTPUTS)):
+                items = [" ".join(rng.choices(WORDS, k=4)) for _ in range(10)]
+                outputs.append(
+                    f"Here are the subtopics:\n{json.dumps(items)}\nHope this helps."
+                )
+            return outputs
+
+        return self._get("lists", build)
+
+    @property
+    def engine(self) -> DataEngine:
+        def build(rng: random.Random) -> DataEngine:
+            examples = Dataset.from_list(self.samples[:1000])
+            return DataEngine(
+                EngineArguments(
+                    instructions=_text(rng, 60),
+                    system_prompt=_text(rng, 40),
+                    example_data=examples,
+                )
+            )
+
+        return self._get("engine", build)
+
+    @property
+    def jsonl_path(self) -> str:
+        """from_jsonl 读取的文件，生成一次后复用"""
+
+        def build(rng: random.Random) -> str:
+            path = os.path.join(self.workdir, "samples.jsonl")
+            dataset = Dataset()
+            dataset.add_samples(self.samples, self.metadata)
+            dataset.save(path)
+            return path
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self._get("jsonl", build)
+
+    def close(self) -> None:
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# 每个基准接收 Fixtures，返回 (被计时的函数, 处理的条目数)；生成数据不计入耗时
+
+
+def bench_build_prompt(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    engine = fx.engine
+    paths = fx.tree_paths[: fx.scaled(NUM_PROMPTS)]
+
+    def run() -> None:
+        random.seed(0)
+        for path in paths:
+            engine.build_prompt(SAMPLE_GENERATION_PROMPT, "model", 3, path)
+
+    return run, len(paths)
+
+
+def bench_build_examples_text(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    engine = fx.engine
+    n = fx.scaled(NUM_PROMPTS)
+
+    def run() -> None:
+        random.seed(0)
+        for _ in range(n):
+            engine.build_examples_text(3)
+
+    return run, n
+
+
+def bench_extract_list(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    outputs = fx.list_outputs
+
+    def run() -> None:
+        for output in outputs:
+            extract_list(output)
+
+    return run, len(outputs)
+
+
+def bench_remove_linebreaks(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    texts = [json.dumps(s, ensure_ascii=False) for s in fx.samples]
+
+    def run() -> None:
+        for text in texts:
+            remove_linebreaks_and_spaces(text)
+
+    return run, len(texts)
+
+
+def bench_validate_sample(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    samples = fx.samples
+
+    def run() -> None:
+        for sample in samples:
+            Dataset.validate_sample(sample)
+
+    return run, len(samples)
+
+
+def bench_validate_long(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    samples = fx.long_conversations
+
+    def run() -> None:
+        for sample in samples:
+            Dataset.validate_sample(sample)
+
+    return run, len(samples)
+
+
+def _bench_save(
+    samples: List[Dict], records: Optional[List[Dict]], path: str, **kwargs: Any
+) -> Callable[[], Any]:
+    dataset = Dataset()
+    dataset.add_samples(samples, records)
+
+    def run() -> None:
+        # 每次都从未分词的状态开始，否则 save 中的分词只在第一次计时
+        dataset.token_lengths = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            dataset.save(path, **kwargs)
+
+    return run
+
+
+def bench_dataset_save(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    """用户实际调用的 save(path)：默认参数，样本带有 create_data 记录的来源信息"""
+    path = os.path.join(fx.workdir, "save.jsonl")
+    return _bench_save(fx.samples, fx.metadata, path), len(fx.samples)
+
+
+def bench_dataset_save_bare(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    """不写任何旁路文件，只有 JSONL 本身"""
+    path = os.path.join(fx.workdir, "save_bare.jsonl")
+    run = _bench_save(fx.samples, None, path, token_index=False, metadata=False)
+    return run, len(fx.samples)
+
+
+def bench_dataset_save_long(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    path = os.path.join(fx.workdir, "save_long.jsonl")
+    return _bench_save(fx.long_conversations, None, path), len(fx.long_conversations)
+
+
+def bench_token_count(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    """默认分词器（litellm 内置的 tiktoken）为新样本计数"""
+    dataset = Dataset.from_list(fx.samples[: fx.scaled(NUM_TOKEN_COUNTS)])
+    dataset.token_counter(dataset.samples[0])
+
+    def run() -> None:
+        dataset.token_lengths = []
+        dataset.get_token_lengths()
+
+    return run, len(dataset.samples)
+
+
+def bench_dataset_from_jsonl(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    path = fx.jsonl_path
+    return lambda: Dataset.from_jsonl(path), len(fx.samples)
+
+
+def bench_topic_tree_save(fx: Fixtures) -> Tuple[Callable[[], Any], int]:
+    tree = TopicTree(
+        TopicTreeArguments("root topic", tree_degree=TREE_DEGREE, tree_depth=TREE_DEPTH)
+    )
+    tree.tree_paths = fx.tree_paths
+    path = os.path.join(fx.workdir, "tree.jsonl")
+    return lambda: tree.save(path), len(tree.tree_paths)
+
+
+# 以文件读写为主的基准，耗时受磁盘与页缓存状态影响，波动比纯计算大得多
+IO_BOUND = {
+    "dataset_save",
+    "dataset_save_bare",
+    "dataset_save_long",
+    "dataset_from_jsonl",
+    "topic_tree_save",
+}
+
+CASES: List[Tuple[str, Callable[[Fixtures], Tuple[Callable[[], Any], int]]]] = [
+    ("build_prompt", bench_build_prompt),
+    ("build_examples_text", bench_build_examples_text),
+    ("extract_list", bench_extract_list),
+    ("remove_linebreaks_and_spaces", bench_remove_linebreaks),
+    ("validate_sample", bench_validate_sample),
+    ("validate_sample_long", bench_validate_long),
+    ("dataset_save", bench_dataset_save),
+    ("dataset_save_bare", bench_dataset_save_bare),
+    ("dataset_save_long", bench_dataset_save_long),
+    ("dataset_from_jsonl", bench_dataset_from_jsonl),
+    ("token_count", bench_token_count),
+    ("topic_tree_save", bench_topic_tree_save),
+]
+
+
+def calibrate(repeat: int) -> float:
+    """固定的纯 Python 负载（JSON 编解码与字符串处理），用来折算机器速度"""
+    rng = random.Random(0)
+    docs = [_conversation(rng, 4, 40) for _ in range(8000)]
+
+    def run() -> None:
+        for doc in docs:
+            text = json.dumps(doc)
+            json.loads(text)
+            " ".join(text.split())
+
+    return min(_time(run) for _ in range(repeat))
+
+
+def _time(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_cases(
+    scale: float, repeat: int, only: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    fx = Fixtures(scale)
+    results: Dict[str, Dict[str, Any]] = {}
+    # 运行前后各校准一次取最短，减少机器负载波动对折算的影响
+    calibration = calibrate(repeat)
+    try:
+        for name, case in CASES:
+            if only and name not in only:
+                continue
+            func, items = case(fx)
+            seconds = min(_time(func) for _ in range(repeat))
+            results[name] = {"seconds": seconds, "items": items}
+            print(
+                f"{name:<30} {seconds * 1000:10.1f}ms "
+                f"{seconds / items * 1e6:10.2f}us/item  ({items} items)"
+            )
+    finally:
+        fx.close()
+    calibration = min(calibration, calibrate(repeat))
+    print(f"{'calibration':<30} {calibration * 1000:10.1f}ms")
+    return {
+        "scale": scale,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "calibration": calibration,
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float,
+    io_threshold: float,
+) -> List[str]:
+    """
+    按校准耗时折算后比较，慢于基线超过 threshold（IO_BOUND 中的项为
+    io_threshold）的项视为回归
+    """
+    if current["scale"] != baseline["scale"]:
+        print(
+            f"warning: scale {current['scale']} differs from the baseline's "
+            f"{baseline['scale']}, comparing per-item times"
+        )
+    speed = baseline["calibration"] / current["calibration"]
+    regressions = []
+    print(f"machine speed factor vs baseline: {1 / speed:.2f}x")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<30} (not in baseline)")
+            continue
+        per_item = result["seconds"] / result["items"] * speed
+        ratio = per_item / (base["seconds"] / base["items"])
+        limit = io_threshold if name in IO_BOUND else threshold
+        flag = ""
+        if ratio > 1 + limit:
+            flag = "  REGRESSION"
+            regressions.append(f"{name} is {ratio:.2f}x the baseline")
+        elif ratio < 1 - limit:
+            flag = "  faster"
+        print(f"{name:<30} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dump(results: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"wrote {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="运行基准")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="数据规模倍数")
+    run_parser.add_argument("--repeat", type=int, default=3, help="每项取最短耗时")
+    run_parser.add_argument("--only", nargs="+", help="只运行这些基准")
+    run_parser.add_argument("--output", help="结果写入该 JSON 文件")
+    run_parser.add_argument(
+        "--save-baseline", action="store_true", help="把结果写为提交的基线"
+    )
+    run_parser.add_argument(
+        "--check", action="store_true", help="与基线比较，有回归时返回非零"
+    )
+    run_parser.add_argument("--threshold", type=float, default=0.2)
+    run_parser.add_argument("--io-threshold", type=float, default=0.5)
+
+    compare_parser = commands.add_parser("compare", help="与基线比较")
+    compare_parser.add_argument("current", help="run --output 写出的结果")
+    compare_parser.add_argument("--baseline", default=BASELINE_PATH)
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.2, help="允许的相对变慢比例"
+    )
+    compare_parser.add_argument(
+        "--io-threshold", type=float, default=0.5, help="读写文件的基准允许的变慢比例"
+    )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_cases(args.scale, args.repeat, args.only)
+        if args.output:
+            _dump(results, args.output)
+        if args.save_baseline:
+            _dump(results, BASELINE_PATH)
+        if not args.check:
+            return
+        regressions = compare(
+            results, _load(BASELINE_PATH), args.threshold, args.io_threshold
+        )
+    else:
+        regressions = compare(
+            _load(args.current),
+            _load(args.baseline),
+            args.threshold,
+            args.io_threshold,
+        )
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+本地桩服务器：模拟 OpenAI 兼容接口与 Ollama 接口，供离线基准测试使用
+"""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+SAMPLE_CONTENT = json.dumps(
+    {
+        "messages": [
+            {"role": "user", "content": "What is a list comprehension?"},
+            {"role": "assistant", "content": "A compact way to build a list."},
+        ]
+    }
+)
+
+
+class StubError(Exception):
+    """reply 抛出该异常时，桩服务器以对应的状态码返回错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def default_reply(body: Dict[str, Any]) -> str:
+    return SAMPLE_CONTENT
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # 客户端放弃请求（例如对冲中落败的副本）时连接被重置，属正常情况
+        pass
+
+
+class StubServer:
+    """在后台线程中运行的 HTTP/1.1 keep-alive 桩服务器"""
+
+    def __init__(
+        self,
+        reply: Callable[[Dict[str, Any]], str] = default_reply,
+        latency: float = 0.0,
+        port: int = 0,
+    ):
+        self.reply = reply
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _QuietHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    @property
+    def url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def _handler(self) -> Any:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                # 关闭 Nagle，避免头和正文分两次写出时叠加延迟 ACK
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                self._send({"models": []})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                try:
+                    content = stub.reply(body)
+                except StubError as e:
+                    error = {"message": e.message, "type": "invalid_request_error"}
+                    self._send({"error": error}, e.status)
+                    return
+                if self.path.endswith("/chat/completions"):
+                    payload: Dict[str, Any] = {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": 10,
+                            "completion_tokens": 10,
+                            "total_tokens": 20,
+                        },
+                    }
+                elif self.path == "/api/chat":
+                    payload = {
+                        "model": body.get("model", "stub"),
+                        "message": {"role": "assistant", "content": content},
+                        "done": True,
+                        "prompt_eval_count": 10,
+                        "eval_count": 10,
+                    }
+                else:  # /api/generate
+                    payload = {
+                        "model": body.get("model", "stub"),
+                        "response": content,
+                        "done": True,
+                        "prompt_eval_count": 10,
+                        "eval_count": 10,
+                    }
+                self._send(payload)
+
+            def _send(self, payload: Dict[str, Any], status: int = 200) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
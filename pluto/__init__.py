@@ -1,13 +1,78 @@
-from .data_engine import EngineArguments, DataEngine
-from .dataset import Dataset
-from .topic_tree import TopicTree, TopicTreeArguments
-from .types import APIProvider
+"""
+子模块在第一次访问对应名称时才导入（PEP 562），
+因此只用到 Dataset 或 APIProvider 时不会加载 litellm、httpx 与 tqdm。
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .batch import LocalBatchBackend, OpenAIBatchBackend
+    from .cascade import ModelCascade, ModelTier
+    from .data_engine import EngineArguments, DataEngine
+    from .dataset import Dataset
+    from .pipeline import Pipeline
+    from .profiler import Profiler
+    from .provider import HedgeArguments, OllamaArguments, ProviderClient
+    from .sampling import SamplingArguments
+    from .service import GenerationService, ServiceArguments
+    from .topic_tree import TopicTree, TopicTreeArguments
+    from .types import APIProvider
+    from .work_queue import WorkQueue
+
+_LAZY_IMPORTS = {
+    'LocalBatchBackend': '.batch',
+    'OpenAIBatchBackend': '.batch',
+    'EngineArguments': '.data_engine',
+    'DataEngine': '.data_engine',
+    'Dataset': '.dataset',
+    'ModelCascade': '.cascade',
+    'ModelTier': '.cascade',
+    'Pipeline': '.pipeline',
+    'Profiler': '.profiler',
+    'HedgeArguments': '.provider',
+    'OllamaArguments': '.provider',
+    'ProviderClient': '.provider',
+    'SamplingArguments': '.sampling',
+    'GenerationService': '.service',
+    'ServiceArguments': '.service',
+    'TopicTree': '.topic_tree',
+    'TopicTreeArguments': '.topic_tree',
+    'APIProvider': '.types',
+    'WorkQueue': '.work_queue',
+}
 
 __all__ = [
+    'LocalBatchBackend',
+    'OpenAIBatchBackend',
     'EngineArguments',
     'DataEngine', 
     'Dataset',
+    'ModelCascade',
+    'ModelTier',
+    'Pipeline',
+    'Profiler',
+    'HedgeArguments',
+    'OllamaArguments',
+    'ProviderClient',
+    'SamplingArguments',
+    'GenerationService',
+    'ServiceArguments',
     'TopicTree',
     'TopicTreeArguments',
-    'APIProvider'
+    'APIProvider',
+    'WorkQueue',
 ]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    # 缓存到模块命名空间，之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,455 @@
+"""
+数据集的多样性与冗余分析：distinct-n、MinHash 近似重复聚类、按顶层分支的冗余率，
+以及抽样样本间的两两相似度分布。
+
+所有文本按块转换为 NumPy 数组后向量化计算：词的哈希由字节前缀和求得，
+MinHash 签名用 reduceat 按样本取最小值，候选重复对由 LSH 分桶得到。
+内存只与签名矩阵（样本数 x num_perm 个 uint32）和单个块的大小有关，
+distinct-n 使用 KMV 草图估计，不保存全部 n-gram。NumPy 是可选依赖。
+"""
+
+import json
+import os
+import random
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import provenance
+from .sampling import branch_of
+
+DEFAULT_NUM_PERM = 32
+DEFAULT_BANDS = 8
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SHINGLE = 3
+
+_PRIME = 1099511628211
+_MIX = 0x9E3779B97F4A7C15
+_MASK = (1 << 64) - 1
+
+
+def _import_numpy() -> ModuleType:
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "dataset analysis requires numpy: pip install 'pluto-clean[analysis]'"
+        ) from e
+    return numpy
+
+
+def _inverse_mod64(value: int) -> int:
+    # 牛顿迭代求奇数在模 2^64 下的逆元，每次迭代有效位数翻倍
+    inverse = value
+    for _ in range(6):
+        inverse = (inverse * (2 - value * inverse)) & _MASK
+    return inverse
+
+
+_PRIME_INV = _inverse_mod64(_PRIME)
+
+# (样本, 元数据)
+SampleSource = Callable[[], Iterator[Tuple[Dict, Dict]]]
+
+
+def sample_text(sample: Dict) -> str:
+    """用于分析的文本：除系统消息外所有消息的内容"""
+    return "\n".join(
+        str(m.get("content", ""))
+        for m in sample.get("messages", [])
+        if m.get("role") != "system"
+    )
+
+
+def _mix(np: Any, values: Any) -> Any:
+    """splitmix64 的终混函数，打散多项式哈希的低位"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def token_hashes(texts: List[str]) -> Tuple[Any, Any]:
+    """
+    把文本切分为词并哈希，返回 (每个词的 uint64 哈希, 词所属文本的下标)。
+    ASCII 字母数字的连续段为一个词，每个非 ASCII 字符（例如汉字）单独为一个词。
+
+    词 [s, e] 的哈希为 sum(b[j] * P^(e-j))，借助 P 在模 2^64 下的逆元
+    改写为前缀和之差，所有词的哈希一次算出。
+    """
+    np = _import_numpy()
+    encoded = [text.lower().encode("utf-8") for text in texts]
+    lengths = np.array([len(e) + 1 for e in encoded], dtype=np.int64)
+    # 文本之间以换行分隔，保证词不会跨越文本
+    data = np.frombuffer(b"\n".join(encoded) + b"\n", dtype=np.uint8)
+    doc = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+    alnum = (
+        ((data >= 48) & (data <= 57))
+        | ((data >= 65) & (data <= 90))
+        | ((data >= 97) & (data <= 122))
+    )
+    member = alnum | (data >= 0x80)
+    # UTF-8 的首字节开始一个新词，后续字节 (0x80-0xBF) 属于同一个词
+    start = (data >= 0xC0) | (alnum & ~np.concatenate(([False], alnum[:-1])))
+    following = np.concatenate((start[1:], [True]))
+    end = member & (following | ~np.concatenate((member[1:], [False])))
+    starts = np.flatnonzero(start)
+    ends = np.flatnonzero(end)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+
+    values = data.astype(np.uint64) + np.uint64(1)
+    powers = np.full(len(data), _PRIME, dtype=np.uint64)
+    powers[0] = 1
+    powers = np.cumprod(powers, dtype=np.uint64)
+    inverse_powers = np.full(len(data), _PRIME_INV, dtype=np.uint64)
+    inverse_powers[0] = 1
+    inverse_powers = np.cumprod(inverse_powers, dtype=np.uint64)
+    prefix = np.concatenate(
+        ([np.uint64(0)], np.cumsum(values * inverse_powers, dtype=np.uint64))
+    )
+    hashes = (prefix[ends + 1] - prefix[starts]) * powers[ends]
+    return _mix(np, hashes), doc[starts]
+
+
+def ngram_hashes(hashes: Any, doc: Any, n: int) -> Tuple[Any, Any]:
+    """同一文本中连续 n 个词的组合哈希"""
+    np = _import_numpy()
+    if n == 1:
+        return hashes, doc
+    if len(hashes) < n:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+    count = len(hashes) - n + 1
+    combined = hashes[:count].copy()
+    for j in range(1, n):
+        combined = _mix(np, combined * np.uint64(_MIX) + hashes[j : j + count])
+    valid = doc[:count] == doc[n - 1 :]
+    return combined[valid], doc[:count][valid]
+
+
+class KMVSketch:
+    """
+    k 个最小哈希值的草图：不同值少于 k 个时计数精确，
+    否则由第 k 小的值估计不同值的个数，相对误差约 1/sqrt(k)。
+    """
+
+    def __init__(self, k: int = 65536):
+        self.k = k
+        self.total = 0
+        self._values = _import_numpy().zeros(0, dtype="uint64")
+
+    def add(self, hashes: Any) -> None:
+        np = _import_numpy()
+        self.total += len(hashes)
+        values = np.unique(np.concatenate((self._values, hashes)))
+        self._values = values[: self.k]
+
+    def distinct(self) -> float:
+        if len(self._values) < self.k:
+            return float(len(self._values))
+        return (self.k - 1) / (float(self._values[-1]) / 2.0**64)
+
+    def ratio(self) -> float:
+        """distinct-n：不同 n-gram 数与 n-gram 总数之比"""
+        return min(1.0, self.distinct() / self.total) if self.total else 0.0
+
+
+def minhash_signatures(
+    hashes: Any, doc: Any, num_docs: int, coefficients: Tuple[Any, Any]
+) -> Any:
+    """
+    每个文本的 MinHash 签名 (num_docs, num_perm)。每个排列为 a * h + b (mod 2^64)，
+    取高 32 位；doc 须按升序排列。没有任何 shingle 的文本签名全为最大值。
+    """
+    np = _import_numpy()
+    a, b = coefficients
+    signatures = np.full((num_docs, len(a)), np.iinfo(np.uint32).max, dtype=np.uint32)
+    if len(hashes) == 0:
+        return signatures
+    boundaries = np.flatnonzero(np.concatenate(([True], doc[1:] != doc[:-1])))
+    docs = doc[boundaries]
+    for i in range(len(a)):
+        permuted = (hashes * a[i] + b[i]) >> np.uint64(32)
+        signatures[docs, i] = np.minimum.reduceat(permuted, boundaries)
+    return signatures
+
+
+class _UnionFind:
+    def __init__(self) -> None:
+        self.parent: Dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, x: int, y: int) -> None:
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            # 以较小的下标为根，簇的代表即最早出现的样本
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+
+def duplicate_pairs(signatures: Any, bands: int, threshold: float) -> Any:
+    """
+    LSH：签名按 band 分段哈希，同一桶中的样本与桶内第一个样本比较签名，
+    估计的 Jaccard 相似度不低于 threshold 的作为重复对返回 (m, 2)。
+    """
+    np = _import_numpy()
+    num_docs, num_perm = signatures.shape
+    rows = num_perm // bands
+    pairs = []
+    for band in range(bands):
+        columns = signatures[:, band * rows : (band + 1) * rows].astype(np.uint64)
+        keys = np.zeros(num_docs, dtype=np.uint64)
+        for c in range(rows):
+            keys = _mix(np, keys * np.uint64(_PRIME) + columns[:, c])
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        new_bucket = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        first = order[np.flatnonzero(new_bucket)][np.cumsum(new_bucket) - 1]
+        candidates = first != order
+        if not candidates.any():
+            continue
+        left, right = first[candidates], order[candidates]
+        similarity = (signatures[left] == signatures[right]).mean(axis=1)
+        keep = similarity >= threshold
+        pairs.append(np.stack((left[keep], right[keep]), axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def pairwise_similarity(
+    signatures: Any, sample_size: int, rng: random.Random, block_size: int = 256
+) -> Dict[str, float]:
+    """随机抽取 sample_size 个样本，分块计算两两之间估计 Jaccard 相似度的分布"""
+    np = _import_numpy()
+    num_docs = signatures.shape[0]
+    if num_docs < 2:
+        return {}
+    chosen = sorted(rng.sample(range(num_docs), min(sample_size, num_docs)))
+    subset = signatures[chosen]
+    # 直方图的 bin 宽度与签名长度一致，统计量是精确的
+    num_perm = subset.shape[1]
+    histogram = np.zeros(num_perm + 1, dtype=np.int64)
+    for begin in range(0, len(subset), block_size):
+        block = subset[begin : begin + block_size]
+        agree = (block[:, None, :] == subset[None, :, :]).sum(axis=2)
+        # 只统计上三角，去掉自身与重复计数
+        rows = np.arange(begin, begin + len(block))[:, None]
+        upper = np.arange(len(subset))[None, :] > rows
+        histogram += np.bincount(agree[upper], minlength=num_perm + 1)
+
+    total = int(histogram.sum())
+    cumulative = np.cumsum(histogram)
+    levels = np.arange(num_perm + 1) / num_perm
+
+    def percentile(q: float) -> float:
+        return float(levels[np.searchsorted(cumulative, q * total)])
+
+    return {
+        "pairs": total,
+        "mean": float((histogram * levels).sum() / total),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": float(levels[np.flatnonzero(histogram)[-1]]),
+    }
+
+
+def analyze(
+    source: SampleSource,
+    num_perm: int = DEFAULT_NUM_PERM,
+    bands: int = DEFAULT_BANDS,
+    threshold: float = DEFAULT_THRESHOLD,
+    shingle_size: int = DEFAULT_SHINGLE,
+    chunk_size: int = 2048,
+    pairwise_sample: int = 2000,
+    top_clusters: int = 10,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    source 每次调用返回一个新的 (样本, 元数据) 迭代器；第一遍计算签名与 distinct-n，
+    第二遍只读取最大的几个重复簇的示例文本。
+    """
+    np = _import_numpy()
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    rng = random.Random(seed)
+    coefficient_rng = np.random.default_rng(seed)
+    coefficients = (
+        coefficient_rng.integers(0, 2**63, num_perm, dtype=np.uint64) * np.uint64(2)
+        + np.uint64(1),
+        coefficient_rng.integers(0, 2**63, num_perm, dtype=np.uint64),
+    )
+    sketches = {n: KMVSketch() for n in (1, 2, 3)}
+    signatures = []
+    branches: List[Optional[str]] = []
+    num_tokens = 0
+
+    def process(texts: List[str]) -> None:
+        nonlocal num_tokens
+        hashes, doc = token_hashes(texts)
+        num_tokens += len(hashes)
+        for n, sketch in sketches.items():
+            sketch.add(ngram_hashes(hashes, doc, n)[0])
+        shingles, shingle_doc = ngram_hashes(hashes, doc, shingle_size)
+        # 词数不足 shingle_size 的文本以单个词作为 shingle
+        short = np.bincount(doc, minlength=len(texts)) < shingle_size
+        if short.any():
+            extra = short[doc]
+            shingles = np.concatenate((shingles, hashes[extra]))
+            shingle_doc = np.concatenate((shingle_doc, doc[extra]))
+            order = np.argsort(shingle_doc, kind="stable")
+            shingles, shingle_doc = shingles[order], shingle_doc[order]
+        signatures.append(
+            minhash_signatures(shingles, shingle_doc, len(texts), coefficients)
+        )
+
+    texts: List[str] = []
+    for sample, metadata in source():
+        texts.append(sample_text(sample))
+        path = metadata.get("tree_path") if metadata else None
+        branches.append(branch_of(path) if path else None)
+        if len(texts) >= chunk_size:
+            process(texts)
+            texts = []
+    if texts:
+        process(texts)
+
+    num_samples = len(branches)
+    if num_samples == 0:
+        return {"samples": 0}
+    matrix = np.concatenate(signatures)
+
+    clusters = _UnionFind()
+    for left, right in duplicate_pairs(matrix, bands, threshold).tolist():
+        clusters.union(left, right)
+    members: Dict[int, List[int]] = {}
+    for index in clusters.parent:
+        members.setdefault(clusters.find(index), []).append(index)
+    groups = sorted(members.values(), key=lambda m: (-len(m), min(m)))
+    # 每个簇中除最早出现的样本外都算作冗余
+    redundant = set()
+    for group in groups:
+        redundant.update(sorted(group)[1:])
+
+    branch_stats: Dict[str, Dict[str, Any]] = {}
+    for index, branch in enumerate(branches):
+        if branch is None:
+            continue
+        stats = branch_stats.setdefault(branch, {"samples": 0, "redundant": 0})
+        stats["samples"] += 1
+        stats["redundant"] += index in redundant
+    for stats in branch_stats.values():
+        stats["redundancy"] = stats["redundant"] / stats["samples"]
+
+    top = [sorted(group) for group in groups[:top_clusters]]
+    wanted = {group[0]: i for i, group in enumerate(top)}
+    examples: Dict[int, str] = {}
+    if wanted:
+        for index, (sample, _) in enumerate(source()):
+            if index in wanted:
+                examples[wanted[index]] = sample_text(sample)
+                if len(examples) == len(wanted):
+                    break
+
+    return {
+        "samples": num_samples,
+        "tokens": num_tokens,
+        "distinct": {
+            f"distinct-{n}": sketch.ratio() for n, sketch in sketches.items()
+        },
+        "threshold": threshold,
+        "duplicate_clusters": len(groups),
+        "redundant_samples": len(redundant),
+        "redundancy": len(redundant) / num_samples,
+        "clusters": [
+            {"size": len(group), "indices": group[:20], "example": examples.get(i, "")}
+            for i, group in enumerate(top)
+        ],
+        "branches": branch_stats,
+        "pairwise": pairwise_similarity(matrix, pairwise_sample, rng),
+    }
+
+
+def iter_file(path: str) -> Iterator[Tuple[Dict, Dict]]:
+    """
+    逐个读取 JSONL 或列式文件中的样本；JSONL 文件的元数据来自旁路文件
+    <path>.meta.jsonl，没有该文件或行数不一致时元数据为空
+    """
+    if path.endswith((".parquet", ".pq", ".arrow", ".feather")):
+        from . import columnar
+
+        # 按记录批次读取，内存中只有一个批次转换出的 Python 对象
+        for record_batch in columnar.iter_batches(path):
+            samples, _, metadata = columnar.table_to_samples(record_batch)
+            yield from zip(samples, metadata)
+        return
+    meta_path = provenance.metadata_path(path)
+    if os.path.exists(meta_path) and _count_lines(meta_path) == _count_lines(path):
+        with open(path, "r", encoding="utf-8") as f, open(
+            meta_path, "r", encoding="utf-8"
+        ) as meta_f:
+            for line, meta_line in zip(f, meta_f):
+                if line.strip():
+                    yield json.loads(line), json.loads(meta_line)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line), {}
+
+
+def _count_lines(path: str) -> int:
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def analyze_file(path: str, **kwargs: Any) -> Dict[str, Any]:
+    return analyze(lambda: iter_file(path), **kwargs)
+
+
+def analyze_dataset(dataset: Any, **kwargs: Any) -> Dict[str, Any]:
+    return analyze(lambda: zip(dataset.samples, dataset.get_metadata()), **kwargs)
+
+
+def format_report(report: Dict[str, Any], example_chars: int = 100) -> str:
+    if not report.get("samples"):
+        return "empty dataset"
+    lines = [f"samples: {report['samples']}, tokens: {report['tokens']}"]
+    lines.append(
+        "  ".join(f"{name}: {value:.3f}" for name, value in report["distinct"].items())
+    )
+    lines.append(
+        f"near-duplicates (jaccard >= {report['threshold']}): "
+        f"{report['duplicate_clusters']} clusters, "
+        f"{report['redundant_samples']} redundant samples "
+        f"({report['redundancy']:.1%})"
+    )
+    for cluster in report["clusters"]:
+        example = " ".join(cluster["example"].split())[:example_chars]
+        lines.append(f"  {cluster['size']:>6} x  {example}")
+    pairwise = report["pairwise"]
+    if pairwise:
+        lines.append(
+            f"pairwise similarity over {pairwise['pairs']} sampled pairs: "
+            f"mean {pairwise['mean']:.3f}, p50 {pairwise['p50']:.3f}, "
+            f"p90 {pairwise['p90']:.3f}, p99 {pairwise['p99']:.3f}, "
+            f"max {pairwise['max']:.3f}"
+        )
+    if report["branches"]:
+        lines.append("redundancy by branch:")
+        branches = report["branches"].items()
+        for branch, stats in sorted(branches, key=lambda kv: -kv[1]["redundancy"]):
+            lines.append(
+                f"  {branch}: {stats['redundant']}/{stats['samples']} "
+                f"({stats['redundancy']:.1%})"
+            )
+    return "\n".join(lines)
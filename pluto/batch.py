@@ -0,0 +1,306 @@
+"""
+离线批处理模式：把所有 prompt 渲染为批量请求 JSONL 文件提交给提供商的批处理接口，
+之后轮询结果并导入。文件格式与 OpenAI Batch API 一致：
+
+    请求: {"custom_id": ..., "method": "POST", "url": "/v1/chat/completions",
+           "body": {...}}
+    结果: {"id": ..., "custom_id": ..., "response": {"status_code": 200, "body": {...}},
+           "error": null}
+
+LocalBatchBackend 在本地用 ProviderClient 执行同样格式的文件，便于离线测试，
+也可以让本地模型（例如 Ollama）走同一套流程。
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .provider import ProviderClient
+
+ENDPOINT = "/v1/chat/completions"
+
+VALIDATING = "validating"
+IN_PROGRESS = "in_progress"
+FINALIZING = "finalizing"
+COMPLETED = "completed"
+FAILED = "failed"
+EXPIRED = "expired"
+CANCELLED = "cancelled"
+TERMINAL_STATES = (COMPLETED, FAILED, EXPIRED, CANCELLED)
+
+# (模型输出文本, 错误信息, 来源信息)
+Result = Tuple[Optional[str], Optional[str], Dict[str, Any]]
+
+
+def request_line(
+    custom_id: str, model_name: str, messages: List[Dict[str, str]], **params: Any
+) -> Dict[str, Any]:
+    body: Dict[str, Any] = {"model": model_name, "messages": messages}
+    body.update(params)
+    return {"custom_id": custom_id, "method": "POST", "url": ENDPOINT, "body": body}
+
+
+def output_format_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把客户端给出的输出格式参数转换为 Chat Completions 请求体中的字段：
+    Ollama 的 format 改写为对应的 response_format，其他提供商专用的字段不写入请求文件
+    """
+    response_format = params.get("response_format")
+    output_format = params.get("format")
+    if isinstance(output_format, dict):
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": output_format.get("title", "response"),
+                "schema": output_format,
+                "strict": True,
+            },
+        }
+    elif output_format == "json":
+        response_format = {"type": "json_object"}
+    return {"response_format": response_format} if response_format else {}
+
+
+def manifest_path(requests_path: str) -> str:
+    """记录每个 custom_id 对应树路径的旁路文件"""
+    return requests_path + ".manifest.jsonl"
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_jsonl(path: str, lines: List[Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def read_results(path: str) -> Dict[str, Result]:
+    """
+    读取结果文件，返回 custom_id -> (模型输出文本, 错误信息, 来源信息)，
+    来源信息取自响应中的 model、created 与 usage 字段
+    """
+    results: Dict[str, Result] = {}
+    for line in iter_jsonl(path):
+        custom_id = line["custom_id"]
+        response = line.get("response") or {}
+        error = line.get("error")
+        if error:
+            results[custom_id] = (None, str(error.get("message", error)), {})
+        elif response.get("status_code") == 200:
+            body = response["body"]
+            content = body["choices"][0]["message"]["content"]
+            provenance: Dict[str, Any] = {}
+            if body.get("model"):
+                provenance["model"] = body["model"]
+            if body.get("created"):
+                provenance["timestamp"] = body["created"]
+            if body.get("usage"):
+                provenance["usage"] = body["usage"]
+            results[custom_id] = (content, None, provenance)
+        else:
+            body = response.get("body") or {}
+            results[custom_id] = (
+                None,
+                f"status {response.get('status_code')}: {body.get('error')}",
+                {},
+            )
+    return results
+
+
+class BatchBackend(ABC):
+    """批处理接口：提交请求文件、查询状态、下载结果文件"""
+
+    @abstractmethod
+    def submit(self, requests_path: str) -> str:
+        """提交请求文件，返回批次 id"""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        pass
+
+    @abstractmethod
+    def download_results(self, batch_id: str, output_path: str) -> bool:
+        """把结果（含出错的请求）写入 output_path；没有任何结果时返回 False"""
+
+    def wait(
+        self,
+        batch_id: str,
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """轮询直到批次结束，返回最终状态；超时抛出 TimeoutError"""
+        start = time.time()
+        while True:
+            status = self.status(batch_id)
+            if status in TERMINAL_STATES:
+                return status
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError(f"batch {batch_id} still {status} after {timeout}s")
+            print(f"batch {batch_id} is {status}, checking again in {poll_interval}s")
+            time.sleep(poll_interval)
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API，api_base 指向其他实现了该接口的服务时同样可用"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        api_base: Optional[str] = None,
+        completion_window: str = "24h",
+    ):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key, base_url=api_base)
+        self.completion_window = completion_window
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def download_results(self, batch_id: str, output_path: str) -> bool:
+        batch = self.client.batches.retrieve(batch_id)
+        # 成功与失败的请求分别在输出文件和错误文件中
+        file_ids = [i for i in (batch.output_file_id, batch.error_file_id) if i]
+        if not file_ids:
+            return False
+        with open(output_path, "w", encoding="utf-8") as f:
+            for file_id in file_ids:
+                text = self.client.files.content(file_id).text
+                f.write(text if text.endswith("\n") else text + "\n")
+        return True
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    在后台线程中用 ProviderClient 执行请求文件的本地实现。
+    批次状态与结果保存在 workdir 中；进程退出时尚未完成的批次会被视为失败。
+    """
+
+    def __init__(self, client: ProviderClient, workdir: str):
+        self.client = client
+        self.workdir = workdir
+        os.makedirs(workdir, exist_ok=True)
+        self._threads: Dict[str, threading.Thread] = {}
+
+    def _state_path(self, batch_id: str) -> str:
+        return os.path.join(self.workdir, f"{batch_id}.json")
+
+    def _output_path(self, batch_id: str) -> str:
+        return os.path.join(self.workdir, f"{batch_id}.output.jsonl")
+
+    def _set_status(self, batch_id: str, status: str) -> None:
+        # 先写同目录的临时文件再替换，并发的 status() 不会读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.workdir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"id": batch_id, "status": status}, f)
+            os.replace(tmp_path, self._state_path(batch_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def submit(self, requests_path: str) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:16]}"
+        self._set_status(batch_id, IN_PROGRESS)
+        thread = threading.Thread(
+            target=self._run, args=(batch_id, requests_path), daemon=True
+        )
+        self._threads[batch_id] = thread
+        thread.start()
+        return batch_id
+
+    def _run(self, batch_id: str, requests_path: str) -> None:
+        try:
+            requests = list(iter_jsonl(requests_path))
+            workers = max(1, min(self.client.max_concurrency, len(requests)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._execute, requests))
+            tmp_path = self._output_path(batch_id) + ".tmp"
+            write_jsonl(tmp_path, results)
+            os.replace(tmp_path, self._output_path(batch_id))
+            self._set_status(batch_id, COMPLETED)
+        except Exception as e:
+            print(f"local batch {batch_id} failed: {e}")
+            self._set_status(batch_id, FAILED)
+
+    def _execute(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        body = dict(request["body"])
+        model_name = body.pop("model")
+        messages = body.pop("messages")
+        response_format = body.pop("response_format", None)
+        if response_format is not None and response_format["type"] == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            body.update(self.client.structured_output_params(model_name, schema))
+        elif response_format is not None:
+            body.update(self.client.json_mode_params())
+        result: Dict[str, Any] = {
+            "id": f"batch_req_{uuid.uuid4().hex[:16]}",
+            "custom_id": request["custom_id"],
+            "response": None,
+            "error": None,
+        }
+        try:
+            response = self.client.completion(model_name, messages, **body)
+            content = response.choices[0].message.content
+        except Exception as e:
+            result["error"] = {"code": type(e).__name__, "message": str(e)}
+            return result
+        usage = getattr(response, "usage", None)
+        result["response"] = {
+            "status_code": 200,
+            "body": {
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": getattr(response, "model", None) or model_name,
+                "usage": {
+                    "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                    "completion_tokens": getattr(usage, "completion_tokens", None),
+                    "total_tokens": getattr(usage, "total_tokens", None),
+                },
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+            },
+        }
+        return result
+
+    def status(self, batch_id: str) -> str:
+        with open(self._state_path(batch_id), "r", encoding="utf-8") as f:
+            status = json.load(f)["status"]
+        thread = self._threads.get(batch_id)
+        if status == IN_PROGRESS and (thread is None or not thread.is_alive()):
+            # 提交该批次的进程已退出
+            return FAILED
+        return status
+
+    def download_results(self, batch_id: str, output_path: str) -> bool:
+        if not os.path.exists(self._output_path(batch_id)):
+            return False
+        shutil.copyfile(self._output_path(batch_id), output_path)
+        return True
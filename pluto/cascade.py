@@ -0,0 +1,109 @@
+"""
+模型级联：请求先交给最便宜的模型，只有抽取或校验失败时才升级到更贵的模型
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from .provider import ProviderClient
+
+T = TypeVar("T")
+
+
+@dataclass
+class ModelTier:
+    client: ProviderClient
+    model_name: str
+
+
+@dataclass
+class TierStats:
+    attempts: int = 0
+    successes: int = 0
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts else 0.0
+
+
+class ModelCascade:
+    """按顺序排列的 (提供商, 模型) 层级，并记录每一层的成功率"""
+
+    def __init__(self, tiers: List[ModelTier]):
+        if not tiers:
+            raise ValueError("a model cascade needs at least one tier")
+        self.tiers = tiers
+        self.stats = [TierStats() for _ in tiers]
+        self._lock = threading.Lock()
+
+    def batch_completion(
+        self,
+        messages: List[List[Dict[str, str]]],
+        parse: Callable[[Any], T],
+        json_mode: bool = False,
+        schema: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Optional[T]]:
+        """
+        逐层执行一批请求。parse 抛出异常即视为该请求在当前层失败，
+        失败的请求升级到下一层；所有层都失败的位置返回 None。
+        给出 schema 时按 JSON Schema 约束输出，不支持的层退回 JSON 模式。
+        """
+        results: List[Optional[T]] = [None] * len(messages)
+        pending = list(range(len(messages)))
+        for tier, stats in zip(self.tiers, self.stats):
+            if not pending:
+                break
+
+            params = dict(kwargs)
+            if schema is not None:
+                params.update(
+                    tier.client.structured_output_params(tier.model_name, schema)
+                )
+            elif json_mode:
+                params.update(tier.client.json_mode_params())
+            try:
+                responses = tier.client.batch_completion(
+                    tier.model_name, [messages[i] for i in pending], **params
+                )
+            except Exception as e:
+                responses = [e] * len(pending)
+
+            failed = []
+            for i, response in zip(pending, responses):
+                try:
+                    if isinstance(response, Exception):
+                        raise response
+                    results[i] = parse(response)
+                except Exception as e:
+                    print(f"{tier.model_name} failed, escalating: {e}")
+                    failed.append(i)
+
+            with self._lock:
+                stats.attempts += len(pending)
+                stats.successes += len(pending) - len(failed)
+            pending = failed
+
+        return results
+
+    def completion(
+        self,
+        messages: List[Dict[str, str]],
+        parse: Callable[[Any], T],
+        json_mode: bool = False,
+        schema: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Optional[T]:
+        return self.batch_completion(
+            [messages], parse, json_mode, schema, **kwargs
+        )[0]
+
+    def summary(self) -> str:
+        lines = ["model cascade:"]
+        for tier, stats in zip(self.tiers, self.stats):
+            lines.append(
+                f"  {tier.model_name}: {stats.successes}/{stats.attempts} "
+                f"succeeded ({stats.success_rate:.0%})"
+            )
+        return "\n".join(lines)
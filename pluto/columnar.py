@@ -0,0 +1,153 @@
+"""
+列式导出与导入（Parquet / Arrow IPC）。pyarrow 是可选依赖，只在使用这些格式时导入。
+
+每行一个样本：messages 为 list<struct<role, content>> 列，另有 num_tokens、
+tree_path、model 元数据列，其余元数据以 JSON 字符串保存在 metadata 列中。
+"""
+
+import json
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+# 单独成列的元数据字段
+_METADATA_COLUMNS = ("tree_path", "model")
+
+
+def _import_pyarrow() -> ModuleType:
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(
+            "Arrow/Parquet support requires pyarrow: pip install 'pluto-clean[arrow]'"
+        ) from e
+    return pyarrow
+
+
+def _is_parquet(path: str) -> bool:
+    return path.endswith((".parquet", ".pq"))
+
+
+def schema() -> Any:
+    pa = _import_pyarrow()
+    message = pa.struct([("role", pa.string()), ("content", pa.string())])
+    return pa.schema(
+        [
+            ("messages", pa.list_(message)),
+            ("num_tokens", pa.int32()),
+            ("tree_path", pa.list_(pa.string())),
+            ("model", pa.string()),
+            ("metadata", pa.string()),
+        ]
+    )
+
+
+class ColumnarWriter:
+    """
+    流式写入：样本先缓存在内存中，每满 row_group_size 个写出一个行组，
+    因此可以在生成过程中边生成边写，内存占用与数据集大小无关。
+    文件扩展名为 .parquet 时写 Parquet，否则写可内存映射的 Arrow IPC 文件。
+    """
+
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        pa = _import_pyarrow()
+        self.path = path
+        self.row_group_size = row_group_size
+        self.num_rows = 0
+        self._schema = schema()
+        self._rows: Dict[str, List[Any]] = {name: [] for name in self._schema.names}
+        if _is_parquet(path):
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self._schema)
+
+    def write(
+        self,
+        sample: Dict,
+        num_tokens: Optional[int] = None,
+        metadata: Optional[Dict] = None,
+    ) -> None:
+        metadata = metadata or {}
+        self._rows["messages"].append(
+            [
+                {"role": m["role"], "content": m["content"]}
+                for m in sample["messages"]
+            ]
+        )
+        self._rows["num_tokens"].append(num_tokens)
+        for name in _METADATA_COLUMNS:
+            self._rows[name].append(metadata.get(name))
+        extra = {k: v for k, v in metadata.items() if k not in _METADATA_COLUMNS}
+        self._rows["metadata"].append(
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+        if len(self._rows["messages"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows["messages"]:
+            return
+        pa = _import_pyarrow()
+        batch = pa.RecordBatch.from_pydict(self._rows, schema=self._schema)
+        if _is_parquet(self.path):
+            self._writer.write_table(
+                pa.Table.from_batches([batch]), row_group_size=self.row_group_size
+            )
+        else:
+            self._writer.write_batch(batch)
+        self.num_rows += batch.num_rows
+        self._rows = {name: [] for name in self._schema.names}
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def read_table(path: str) -> Any:
+    """以内存映射方式读取为 pyarrow.Table，列数据直接引用文件页，不会整体拷贝到内存"""
+    pa = _import_pyarrow()
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path, memory_map=True)
+    # 表中的列引用映射的内存，因此不能提前关闭 source
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def iter_batches(
+    path: str, batch_size: int = DEFAULT_ROW_GROUP_SIZE
+) -> Iterator[Any]:
+    """逐个返回文件中的 pyarrow.RecordBatch，不把整个文件读成一张表"""
+    pa = _import_pyarrow()
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(batch_size)
+        return
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+
+
+def table_to_samples(table: Any) -> Tuple[List[Dict], List[Optional[int]], List[Dict]]:
+    """把表（或单个 RecordBatch）转换回 (样本, token 数, 元数据)"""
+    columns = table.to_pydict()
+    samples = [{"messages": messages} for messages in columns["messages"]]
+    metadata = []
+    for i in range(table.num_rows):
+        meta = json.loads(columns["metadata"][i]) if columns["metadata"][i] else {}
+        for name in _METADATA_COLUMNS:
+            if columns[name][i] is not None:
+                meta[name] = columns[name][i]
+        metadata.append(meta)
+    return samples, columns["num_tokens"], metadata
@@ -1,14 +1,29 @@
-import litellm
-from typing import List, Optional, Tuple
-from tqdm import tqdm
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import random
 import json
 import math
+import os
+import socket
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from dataclasses import dataclass
+from . import batch, profiler, provenance
 from .prompts import SAMPLE_GENERATION_PROMPT
 from .topic_tree import TopicTree
+from .cascade import ModelCascade
 from .dataset import Dataset
+from .pipeline import Pipeline
+from .provider import ProviderClient
+from .sampling import PER_LEAF, SamplingArguments, sample_paths
+from .schemas import SAMPLE_SCHEMA
 from .types import APIProvider
+from .work_queue import WorkQueue
 
 
 @dataclass
@@ -19,9 +34,23 @@ class EngineArguments:
 
 
 class DataEngine:
-    def __init__(self, args: EngineArguments):
+    def __init__(
+        self,
+        args: EngineArguments,
+        client: Optional[ProviderClient] = None,
+        cascade: Optional[ModelCascade] = None,
+        pipeline: Optional[Pipeline] = None,
+    ):
         self.args = args
         self.dataset = Dataset()
+        # 可与 TopicTree 共享的提供商客户端；为 None 时按 create_data 的参数创建
+        self.client = client
+        # 设置模型级联时忽略 create_data 的模型与提供商参数
+        self.cascade = cascade
+        # 生成的样本先经过流水线的过滤 / 变换阶段再加入数据集
+        self.pipeline = pipeline
+        self._owned_client: Optional[ProviderClient] = None
+        self._owned_client_key: Optional[Tuple[Any, ...]] = None
 
     def create_data(
         self,
@@ -33,39 +62,69 @@ class DataEngine:
         api_provider: APIProvider = APIProvider.DEFAULT,
         api_base: Optional[str] = None,
         api_key: Optional[str] = None,
+        sampling: Optional[SamplingArguments] = None,
     ) -> Dataset:
-        data_creation_prompt = SAMPLE_GENERATION_PROMPT
-
-        # 根据 API 提供商配置模型名称和参数
-        final_model_name, final_api_base, final_api_key = self._configure_api_provider(
-            model_name, api_provider, api_base, api_key
-        )
+        # 提供商配置只解析一次，请求复用客户端的连接池
+        client = self._get_client(api_provider, api_base, api_key)
 
         if self.args.example_data is None:
             num_example_demonstrations = 0
 
-        if num_steps is None:
+        # 每个叶子固定样本数时，总步数由叶子数决定
+        per_leaf = sampling is not None and sampling.strategy == PER_LEAF
+        if num_steps is None and not (topic_tree is not None and per_leaf):
             raise Exception("no number of steps was specified")
 
+        tree_paths: Optional[List[List[str]]] = None
         if topic_tree is not None:
-            tree_paths = topic_tree.tree_paths
-
-        if topic_tree is not None and num_steps is not None:
-            if num_steps * batch_size > len(tree_paths):
-                raise Exception(
-                    "num_steps * batch_size cannot be bigger than number of tree paths"
-                )
-            else:
-                tree_paths = random.sample(tree_paths, num_steps * batch_size)
-
-        if topic_tree is not None:
+            tree_paths = sample_paths(
+                topic_tree.tree_paths,
+                num_steps * batch_size if num_steps is not None else None,
+                sampling,
+            )
             num_steps = math.ceil(len(tree_paths) / batch_size)
+        assert num_steps is not None
 
         print(f"Generating dataset in {num_steps} steps, with batch size {batch_size}.")
+        if self.pipeline is not None:
+            # 流水线在后台线程中处理样本，生成循环只负责提交
+            self.pipeline.start(self._add_to_dataset)
+        try:
+            self._run_steps(
+                client,
+                model_name,
+                num_steps,
+                batch_size,
+                num_example_demonstrations,
+                tree_paths,
+            )
+        finally:
+            if self.pipeline is not None:
+                self.pipeline.close()
+
+        if self.pipeline is not None:
+            print(self.pipeline.summary())
+        if self.cascade is not None:
+            print(self.cascade.summary())
+
+        return self.dataset
+
+    def _run_steps(
+        self,
+        client: ProviderClient,
+        model_name: str,
+        num_steps: int,
+        batch_size: int,
+        num_example_demonstrations: int,
+        tree_paths: Optional[List[List[str]]],
+    ) -> None:
+        from tqdm import tqdm
+
         for step in tqdm(range(num_steps)):
             prompts = []
+            metadata = []
             for i in range(batch_size):
-                if topic_tree is not None:
+                if tree_paths is not None:
                     try:
                         path = tree_paths[step * batch_size + i]
                     except Exception:
@@ -74,50 +133,589 @@ class DataEngine:
                     path = None
 
                 sample_prompt = self.build_prompt(
-                    data_creation_prompt=data_creation_prompt,
+                    data_creation_prompt=SAMPLE_GENERATION_PROMPT,
                     model_name=model_name,
                     num_example_demonstrations=num_example_demonstrations,
                     subtopics_list=path,
                 )
                 prompts.append(sample_prompt)
+                metadata.append(self.sample_metadata(model_name, path))
 
+            # 只重试失败的请求，已成功的样本不会被重新生成
+            samples: List[Optional[Dict]] = [None] * len(prompts)
             for j in range(3):
-                try:
-                    # 使用统一的配置调用 litellm
-                    responses = litellm.batch_completion(
-                        model=final_model_name,
-                        messages=[[{"role": "user", "content": p}] for p in prompts],
-                        temperature=1.0,
-                        max_retries=10,
-                        api_base=final_api_base,
-                        api_key=final_api_key,
-                        response_format={"type": "json_object"} if api_provider not in [APIProvider.OLLAMA] else None
+                pending = [i for i, sample in enumerate(samples) if sample is None]
+                generated = self._generate_samples(
+                    client, model_name, [prompts[i] for i in pending]
+                )
+                for i, result in zip(pending, generated):
+                    if result is not None:
+                        samples[i], sample_provenance = result
+                        metadata[i].update(sample_provenance)
+
+                if all(sample is not None for sample in samples):
+                    valid = [sample for sample in samples if sample is not None]
+                    self._write_samples(valid, metadata)
+                    print("Example of a generated sample: ", valid[0])
+                    break
+
+                print("error generating example, retrying...")
+                if j == 2:
+                    raise Exception(
+                        f"{j} consecutive errors generating training examples. Something's probably wrong."
                     )
 
-                    samples = [
-                        json.loads(r.choices[0].message.content) for r in responses
-                    ]
-                    for sample in samples:
-                        new_message = {
-                            "role": "system",
-                            "content": self.args.system_prompt,
-                        }
-                        sample["messages"].insert(0, new_message)
-
-                    self.dataset.add_samples(samples)
-                    print("Example of a generated sample: ", samples[0])
-                    break
+    def create_data_pipelined(
+        self,
+        model_name: str,
+        num_steps: int,
+        topic_tree: TopicTree,
+        num_example_demonstrations: int = 3,
+        batch_size: int = 10,
+        tree_model_name: Optional[str] = None,
+        api_provider: APIProvider = APIProvider.DEFAULT,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> Dataset:
+        """
+        边建树边生成数据：每个节点展开后立即提交其子节点，叶子一出现就开始生成样本，
+        两类请求共用同一个客户端的并发上限，总耗时接近 max(建树, 生成) 而不是两者之和。
+
+        从叶子中均匀抽取 num_steps * batch_size 个：每个叶子分配一个随机键，最终选取
+        键最小的叶子。建树期间只为键低于预估阈值的叶子提前生成样本，并暂存结果；
+        树完成后补齐未覆盖的叶子，丢弃多生成的样本。
+        与 create_data 一样，选中的叶子重试后仍生成失败时抛出异常，
+        已生成的样本保留在 self.dataset 中。
+        """
+        client = self._get_client(api_provider, api_base, api_key)
+        if topic_tree.client is None:
+            topic_tree.client = client
+        elif topic_tree.client is not client:
+            print("topic tree has its own client, concurrency budgets are not shared")
+        tree_model_name = tree_model_name or model_name
+
+        if self.args.example_data is None:
+            num_example_demonstrations = 0
+
+        from tqdm import tqdm
+
+        rng = random.Random(seed)
+        num_samples = num_steps * batch_size
+        tree_args = topic_tree.args
+        # 按每个节点都返回 tree_degree 个子主题估计叶子数
+        threshold = min(1.0, num_samples / tree_args.tree_degree**tree_args.tree_depth)
+
+        leaves: List[List[str]] = []
+        keys: List[float] = []
+        # 已提交生成的叶子；建树完成前生成的样本暂存在 buffered 中
+        submitted = set()
+        buffered: Dict[int, Tuple[Dict, Dict]] = {}
+        selected: Optional[set] = None
+        num_wasted = 0
+        failed = set()
+        start = time.time()
+        tree_time = 0.0
+
+        def generate(idx: int) -> Optional[Tuple[Dict, Dict]]:
+            prompt = self.build_prompt(
+                data_creation_prompt=SAMPLE_GENERATION_PROMPT,
+                model_name=model_name,
+                num_example_demonstrations=num_example_demonstrations,
+                subtopics_list=leaves[idx],
+            )
+            for _ in range(3):
+                result = self._generate_samples(client, model_name, [prompt])[0]
+                if result is not None:
+                    return result
+            return None
+
+        def commit(idx: int, result: Tuple[Dict, Dict]) -> None:
+            sample, sample_provenance = result
+            metadata = self.sample_metadata(model_name, leaves[idx])
+            metadata.update(sample_provenance)
+            self._write_samples([sample], [metadata])
+            progress.update(1)
+
+        print(f"Building topic tree and generating {num_samples} samples in parallel.")
+        if self.pipeline is not None:
+            self.pipeline.start(self._add_to_dataset)
+        progress = tqdm(total=num_samples)
+        # 线程数不限制并发，真正的并发上限是客户端的请求槽位
+        executor = ThreadPoolExecutor(max_workers=client.pool_size + 4)
+        try:
+            tasks: Dict[Future, Tuple[str, Any]] = {}
+            num_tree_tasks = 0
+            if tree_args.tree_depth == 0:
+                leaves.append([tree_args.root_prompt])
+                keys.append(rng.random())
+            else:
+                root = [tree_args.root_prompt]
+                tasks[
+                    executor.submit(topic_tree.expand_node, tree_model_name, root)
+                ] = ("node", root)
+                num_tree_tasks = 1
+
+            while tasks or selected is None:
+                if num_tree_tasks == 0 and selected is None:
+                    # 树已完成：选出键最小的叶子，提交尚未生成的部分
+                    tree_time = time.time() - start
+                    topic_tree.tree_paths = list(leaves)
+                    order = sorted(range(len(leaves)), key=lambda i: keys[i])
+                    selected = set(order[:num_samples])
+                    if len(leaves) < num_samples:
+                        print(
+                            f"topic tree has only {len(leaves)} leaves, "
+                            f"generating {len(leaves)} samples"
+                        )
+                    for idx, result in buffered.items():
+                        if idx in selected:
+                            commit(idx, result)
+                        else:
+                            num_wasted += 1
+                    buffered.clear()
+                    for idx in order[:num_samples]:
+                        if idx not in submitted:
+                            submitted.add(idx)
+                            tasks[executor.submit(generate, idx)] = ("sample", idx)
+                    continue
+
+                done, _ = wait(tasks, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, value = tasks.pop(future)
+                    if kind == "node":
+                        num_tree_tasks -= 1
+                        try:
+                            children = future.result()
+                        except Exception as e:
+                            print(f"failed to expand {' -> '.join(value)}: {e}")
+                            children = []
+                        for child in children:
+                            if len(child) - 1 < tree_args.tree_depth:
+                                tasks[
+                                    executor.submit(
+                                        topic_tree.expand_node, tree_model_name, child
+                                    )
+                                ] = ("node", child)
+                                num_tree_tasks += 1
+                                continue
+                            idx = len(leaves)
+                            leaves.append(child)
+                            keys.append(rng.random())
+                            if keys[idx] < threshold:
+                                submitted.add(idx)
+                                tasks[executor.submit(generate, idx)] = ("sample", idx)
+                        continue
+
+                    result = future.result()
+                    if result is None:
+                        failed.add(value)
+                        print(f"error generating sample for {leaves[value]}")
+                    elif selected is None:
+                        buffered[value] = result
+                    elif value in selected:
+                        commit(value, result)
+                    else:
+                        num_wasted += 1
+        finally:
+            for future in tasks:
+                future.cancel()
+            executor.shutdown(wait=False)
+            progress.close()
+            if self.pipeline is not None:
+                self.pipeline.close()
+
+        print(
+            f"tree: {len(leaves)} leaves in {tree_time:.1f}s, "
+            f"total: {time.time() - start:.1f}s, "
+            f"{num_wasted} samples discarded, {len(failed)} failed"
+        )
+        if self.pipeline is not None:
+            print(self.pipeline.summary())
+        if self.cascade is not None:
+            print(self.cascade.summary())
+
+        # 没有被选中的叶子生成失败不影响结果
+        num_missing = len(failed & selected) if selected is not None else 0
+        if num_missing:
+            raise Exception(
+                f"{num_missing} selected leaves failed after 3 attempts each. "
+                "Something's probably wrong."
+            )
+        return self.dataset
+
+    def regenerate_branches(
+        self,
+        model_name: str,
+        branches: List[List[str]],
+        num_example_demonstrations: int = 3,
+        batch_size: int = 10,
+        api_provider: APIProvider = APIProvider.DEFAULT,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ) -> Dataset:
+        """
+        删除 self.dataset 中指定分支（主题树路径前缀）下的样本，并按这些样本原来的
+        树路径重新生成同样数量的样本，其他分支的样本保持不变。
+        """
+        if any(not branch for branch in branches):
+            raise ValueError("branches must be non-empty topic tree path prefixes")
+        metadata = self.dataset.get_metadata()
+        indices = sorted(
+            {i for branch in branches for i in self.dataset.samples_under(branch)}
+        )
+        tree_paths = [metadata[i]["tree_path"] for i in indices]
+        self.dataset.remove_branches(branches)
+        print(f"removed {len(tree_paths)} samples, regenerating them")
+        if not tree_paths:
+            return self.dataset
+
+        client = self._get_client(api_provider, api_base, api_key)
+        if self.args.example_data is None:
+            num_example_demonstrations = 0
+        if self.pipeline is not None:
+            self.pipeline.start(self._add_to_dataset)
+        try:
+            self._run_steps(
+                client,
+                model_name,
+                math.ceil(len(tree_paths) / batch_size),
+                batch_size,
+                num_example_demonstrations,
+                tree_paths,
+            )
+        finally:
+            if self.pipeline is not None:
+                self.pipeline.close()
+
+        if self.pipeline is not None:
+            print(self.pipeline.summary())
+        if self.cascade is not None:
+            print(self.cascade.summary())
+        return self.dataset
+
+    def run_worker(
+        self,
+        queue: WorkQueue,
+        model_name: str,
+        num_example_demonstrations: int = 3,
+        batch_size: int = 10,
+        api_provider: APIProvider = APIProvider.DEFAULT,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+        worker_id: Optional[str] = None,
+    ) -> int:
+        """
+        从工作队列中领取任务并生成样本，直到队列中没有可领取的任务。
+        可在任意多个进程中并行运行，返回本 worker 提交的样本数。
+        """
+        client = self._get_client(api_provider, api_base, api_key)
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
 
-                except Exception as e:
-                    print(e)
-                    print("error generating example, retrying...")
-                    if j == 2:
-                        raise Exception(
-                            f"{j} consecutive errors generating training examples. Something's probably wrong."
+        if self.args.example_data is None:
+            num_example_demonstrations = 0
+
+        num_committed = 0
+        while True:
+            lease = queue.lease(worker_id, batch_size)
+            if not lease.items:
+                break
+
+            # 每个任务对应的 prompt 区间：叶子路径 1 个，无主题树时 count 个
+            prompts: List[str] = []
+            spans: List[Tuple[int, int]] = []
+            for item in lease.items:
+                start = len(prompts)
+                for _ in range(item.count):
+                    prompts.append(
+                        self.build_prompt(
+                            data_creation_prompt=SAMPLE_GENERATION_PROMPT,
+                            model_name=model_name,
+                            num_example_demonstrations=num_example_demonstrations,
+                            subtopics_list=item.path,
                         )
+                    )
+                spans.append((start, len(prompts)))
+
+            generated = self._generate_samples(client, model_name, prompts)
+
+            done: Dict[int, List[Dict]] = {}
+            done_metadata: Dict[int, List[Dict]] = {}
+            failed: List[int] = []
+            for item, (start, end) in zip(lease.items, spans):
+                results = [r for r in generated[start:end] if r is not None]
+                if len(results) == end - start:
+                    done[item.id] = [sample for sample, _ in results]
+                    done_metadata[item.id] = [
+                        {**self.sample_metadata(model_name, item.path), **source}
+                        for _, source in results
+                    ]
+                else:
+                    failed.append(item.id)
+
+            num_committed += sum(
+                len(done[item_id])
+                for item_id in queue.complete(lease, done, done_metadata)
+            )
+            if failed:
+                queue.fail(lease, failed, "error generating training examples")
+
+        print(f"worker {worker_id} committed {num_committed} samples")
+        return num_committed
+
+    def prepare_batch(
+        self,
+        model_name: str,
+        requests_path: str,
+        num_steps: Optional[int] = None,
+        num_example_demonstrations: int = 3,
+        batch_size: int = 10,
+        topic_tree: Optional[TopicTree] = None,
+        sampling: Optional[SamplingArguments] = None,
+        api_provider: APIProvider = APIProvider.DEFAULT,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ) -> int:
+        """
+        离线批处理的第一步：把 create_data 会发送的全部 prompt 写成批量请求 JSONL，
+        返回请求数。每个请求的 custom_id 按顺序编号，对应的树路径写入旁边的
+        manifest 文件，之后用 backend.submit(requests_path) 提交。
+        输出格式参数与 create_data 一样由客户端决定，遵循 structured_outputs 设置。
+        """
+        if self.args.example_data is None:
+            num_example_demonstrations = 0
+        client = self._get_client(api_provider, api_base, api_key)
+        output_params = batch.output_format_params(
+            client.structured_output_params(model_name, SAMPLE_SCHEMA)
+        )
+
+        per_leaf = sampling is not None and sampling.strategy == PER_LEAF
+        if num_steps is None and not (topic_tree is not None and per_leaf):
+            raise Exception("no number of steps was specified")
 
+        paths: List[Optional[List[str]]]
+        if topic_tree is not None:
+            paths = list(
+                sample_paths(
+                    topic_tree.tree_paths,
+                    num_steps * batch_size if num_steps is not None else None,
+                    sampling,
+                )
+            )
+        else:
+            assert num_steps is not None
+            paths = [None] * (num_steps * batch_size)
+
+        requests = []
+        manifest = []
+        for i, path in enumerate(paths):
+            custom_id = f"sample-{i:06d}"
+            prompt = self.build_prompt(
+                data_creation_prompt=SAMPLE_GENERATION_PROMPT,
+                model_name=model_name,
+                num_example_demonstrations=num_example_demonstrations,
+                subtopics_list=path,
+            )
+            requests.append(
+                batch.request_line(
+                    custom_id,
+                    model_name,
+                    [{"role": "user", "content": prompt}],
+                    temperature=1.0,
+                    **output_params,
+                )
+            )
+            manifest.append({"custom_id": custom_id, "tree_path": path})
+
+        batch.write_jsonl(requests_path, requests)
+        batch.write_jsonl(batch.manifest_path(requests_path), manifest)
+        print(f"wrote {len(requests)} batch requests to {requests_path}")
+        return len(requests)
+
+    def ingest_batch(
+        self,
+        backend: batch.BatchBackend,
+        batch_id: str,
+        requests_path: str,
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None,
+        max_resubmits: int = 2,
+    ) -> Dataset:
+        """
+        离线批处理的第二步：等待批次结束，把结果解析后加入数据集（同样插入系统消息）。
+        请求失败、响应无法解析或结果中缺失的 custom_id 只重新提交这一部分，
+        最多重提交 max_resubmits 次。
+        """
+        requests = {r["custom_id"]: r for r in batch.iter_jsonl(requests_path)}
+        manifest = {
+            m["custom_id"]: m
+            for m in batch.iter_jsonl(batch.manifest_path(requests_path))
+        }
+        pending = sorted(requests)
+        num_ingested = 0
+
+        if self.pipeline is not None:
+            self.pipeline.start(self._add_to_dataset)
+        try:
+            for attempt in range(max_resubmits + 1):
+                status = backend.wait(batch_id, poll_interval, timeout)
+                results_path = f"{requests_path}.results.{attempt}.jsonl"
+                results: Dict[str, batch.Result] = {}
+                if backend.download_results(batch_id, results_path):
+                    results = batch.read_results(results_path)
+                print(f"batch {batch_id} {status}: {len(results)} results")
+
+                failed = []
+                for custom_id in pending:
+                    content, error, result_provenance = results.get(
+                        custom_id, (None, "missing result", {})
+                    )
+                    if content is not None:
+                        try:
+                            sample = self._parse_content(content)
+                        except Exception as e:
+                            error = str(e)
+                        else:
+                            body = requests[custom_id]["body"]
+                            path = manifest[custom_id]["tree_path"]
+                            metadata = {
+                                "tree_path": path,
+                                "tree_path_id": provenance.path_id(path),
+                                "model": body["model"],
+                                "endpoint": f"batch/{batch_id}",
+                                "timestamp": time.time(),
+                            }
+                            metadata.update(result_provenance)
+                            self._write_samples([sample], [metadata])
+                            num_ingested += 1
+                            continue
+                    print(f"{custom_id} failed: {error}")
+                    failed.append(custom_id)
+
+                pending = failed
+                if not pending or attempt == max_resubmits:
+                    break
+                retry_path = f"{requests_path}.retry{attempt + 1}.jsonl"
+                batch.write_jsonl(retry_path, [requests[i] for i in pending])
+                batch_id = backend.submit(retry_path)
+                print(f"resubmitted {len(pending)} failed requests as {batch_id}")
+        finally:
+            if self.pipeline is not None:
+                self.pipeline.close()
+
+        if self.pipeline is not None:
+            print(self.pipeline.summary())
+        print(f"ingested {num_ingested} samples, {len(pending)} requests failed")
         return self.dataset
 
+    def iter_samples(
+        self,
+        model_name: str,
+        prompts: List[str],
+        client: Optional[ProviderClient] = None,
+    ) -> Iterator[Tuple[int, Optional[Tuple[Dict, Dict]]]]:
+        """
+        每个 prompt 作为独立的请求并发生成，按完成顺序返回
+        (prompt 下标, (样本, 来源信息))，失败的位置为 None。
+        client 为 None 时使用构造时传入的客户端。
+        """
+        client = client or self.client
+        if client is None and self.cascade is None:
+            raise ValueError("iter_samples needs a provider client or a cascade")
+        max_concurrency = client.max_concurrency if client is not None else 32
+        workers = max(1, min(max_concurrency, len(prompts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._generate_samples, client, model_name, [p]): i
+                for i, p in enumerate(prompts)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()[0]
+
+    def _generate_samples(
+        self, client: ProviderClient, model_name: str, prompts: List[str]
+    ) -> List[Optional[Tuple[Dict, Dict]]]:
+        """
+        为每个 prompt 生成一个样本，返回 (样本, 来源信息)；
+        请求、解析或校验失败的位置为 None
+        """
+        messages = [[{"role": "user", "content": p}] for p in prompts]
+        if self.cascade is not None:
+            return self.cascade.batch_completion(
+                messages,
+                self._parse_with_provenance,
+                schema=SAMPLE_SCHEMA,
+                temperature=1.0,
+                max_retries=10,
+            )
+
+        try:
+            responses = client.batch_completion(
+                model_name,
+                messages,
+                temperature=1.0,
+                max_retries=10,
+                **client.structured_output_params(model_name, SAMPLE_SCHEMA),
+            )
+        except Exception as e:
+            responses = [e] * len(prompts)
+
+        samples: List[Optional[Tuple[Dict, Dict]]] = []
+        for response in responses:
+            try:
+                samples.append(self._parse_with_provenance(response))
+            except Exception as e:
+                print(e)
+                samples.append(None)
+        return samples
+
+    def sample_metadata(
+        self, model_name: str, path: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """
+        随样本保存的元数据；使用模型级联时生成样本的模型由响应中的来源信息给出
+        """
+        return {
+            "tree_path": path,
+            "tree_path_id": provenance.path_id(path),
+            "model": model_name if self.cascade is None else None,
+        }
+
+    def _parse_with_provenance(self, response: Any) -> Tuple[Dict, Dict]:
+        return self._parse_sample(response), provenance.response_provenance(response)
+
+    def _parse_sample(self, response: Any) -> Dict:
+        """解析并校验一条模型响应，并在开头插入系统消息"""
+        if isinstance(response, Exception):
+            # batch_completion 以异常对象表示失败的请求
+            raise response
+        return self._parse_content(response.choices[0].message.content)
+
+    def _parse_content(self, content: str) -> Dict:
+        with profiler.span(profiler.PARSE):
+            sample = json.loads(content)
+            sample["messages"].insert(
+                0, {"role": "system", "content": self.args.system_prompt}
+            )
+        with profiler.span(profiler.VALIDATE):
+            if not Dataset.validate_sample(sample):
+                raise ValueError(f"invalid sample: {sample}")
+        return sample
+
+    def _write_samples(self, samples: List[Dict], metadata: List[Dict]) -> None:
+        """把样本交给流水线，或者直接加入数据集"""
+        with profiler.span(profiler.WRITE, count=len(samples)):
+            if self.pipeline is not None:
+                for sample, meta in zip(samples, metadata):
+                    self.pipeline.put(sample, meta)
+            else:
+                self.dataset.add_samples(samples, metadata)
+
+    def _add_to_dataset(self, sample: Dict, metadata: Dict) -> None:
+        """流水线的 sink，在流水线的线程中执行"""
+        with profiler.span(profiler.WRITE, count=1):
+            self.dataset.add_samples([sample], [metadata])
+
     def build_prompt(
         self,
         data_creation_prompt: str,
@@ -125,18 +723,19 @@ class DataEngine:
         num_example_demonstrations: int,
         subtopics_list: Optional[List[str]] = None,
     ) -> str:
-        prompt = data_creation_prompt.replace(
-            "{{{{system_prompt}}}}", self.build_system_prompt()
-        )
-        prompt = prompt.replace(
-            "{{{{instructions}}}}", self.build_custom_instructions_text()
-        )
-        prompt = prompt.replace(
-            "{{{{examples}}}}", self.build_examples_text(num_example_demonstrations)
-        )
-        prompt = prompt.replace(
-            "{{{{subtopics}}}}", self.build_subtopics_text(subtopics_list)
-        )
+        with profiler.span(profiler.BUILD_PROMPT):
+            prompt = data_creation_prompt.replace(
+                "{{{{system_prompt}}}}", self.build_system_prompt()
+            )
+            prompt = prompt.replace(
+                "{{{{instructions}}}}", self.build_custom_instructions_text()
+            )
+            prompt = prompt.replace(
+                "{{{{examples}}}}", self.build_examples_text(num_example_demonstrations)
+            )
+            prompt = prompt.replace(
+                "{{{{subtopics}}}}", self.build_subtopics_text(subtopics_list)
+            )
 
         return prompt
 
@@ -175,56 +774,20 @@ class DataEngine:
         else:
             return f"\nLastly, the topic of the training data should be related to the following subtopics: {' -> '.join(subtopic_list)}"
 
-    def _configure_api_provider(
+    def _get_client(
         self,
-        model_name: str,
         api_provider: APIProvider,
         api_base: Optional[str],
         api_key: Optional[str],
-    ) -> Tuple[str, Optional[str], Optional[str]]:
-        """根据 API 提供商配置模型名称和参数"""
-        
-        final_model_name: str
-        final_api_base: Optional[str]
-        final_api_key: Optional[str]
-
-        if api_provider == APIProvider.OLLAMA:
-            # Ollama 配置
-            final_model_name = f"ollama/{model_name}"
-            final_api_base = api_base or "http://localhost:11434"
-            final_api_key = api_key  # Ollama 通常不需要 API key
-
-        elif api_provider == APIProvider.OPENAI_COMPATIBLE:
-            # 自定义 base URL 的 OpenAI 兼容接口
-            final_model_name = f"openai/{model_name}"
-            
-            if not api_base:
-                raise ValueError("api_base is required for OpenAI compatible provider")
-            if not api_key:
-                raise ValueError("api_key is required for OpenAI compatible provider")
-            final_api_base = api_base
-            final_api_key = api_key
-
-        elif api_provider == APIProvider.OPENROUTER:
-            # OpenRouter 配置
-            final_model_name = f"openrouter/{model_name}"
-            final_api_base = api_base or "https://openrouter.ai/api/v1"
-            final_api_key = api_key
-
-            if not final_api_key:
-                # 尝试从环境变量获取
-                import os
-
-                final_api_key = os.getenv("OPENROUTER_API_KEY")
-                if not final_api_key:
-                    raise ValueError(
-                        "api_key or OPENROUTER_API_KEY environment variable is required for OpenRouter provider"
-                    )
-
-        else:  # APIProvider.DEFAULT
-            # 默认配置（OpenAI/Azure 等）
-            final_model_name = model_name
-            final_api_base = api_base
-            final_api_key = api_key
-
-        return final_model_name, final_api_base, final_api_key
+    ) -> ProviderClient:
+        """优先使用共享的客户端，否则按提供商配置创建并缓存一个"""
+        if self.client is not None:
+            return self.client
+
+        client_key = (api_provider, api_base, api_key)
+        if self._owned_client is None or self._owned_client_key != client_key:
+            if self._owned_client is not None:
+                self._owned_client.close()
+            self._owned_client = ProviderClient(api_provider, api_base, api_key)
+            self._owned_client_key = client_key
+        return self._owned_client
@@ -1,32 +1,72 @@
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Tuple
 import json
+import os
+from . import columnar, external, packing, profiler, provenance
 from .utils import remove_linebreaks_and_spaces
 
 
 class Dataset:
-    def __init__(self) -> None:
+    def __init__(self, token_counter: Optional[packing.TokenCounter] = None) -> None:
         self.samples: List[Dict] = []
+        # samples 前缀的 token 数，首次需要时（保存、打包、分桶、统计）才为新样本分词
+        self.token_lengths: List[int] = []
+        # 与 samples 一一对应的元数据（主题树路径、模型等），不写入 JSONL 训练数据
+        self.metadata: List[Dict] = []
+        self.token_counter = token_counter or packing.count_tokens
+        # 主题树分支（路径前缀）到样本下标的索引，随样本增加增量更新；
+        # 每个样本出现在其路径的每个前缀下，没有路径的样本只在根 () 下
+        self._branch_index: Dict[Tuple[str, ...], List[int]] = {}
+        self._num_indexed = 0
 
     @classmethod
-    def from_jsonl(cls, file_path: str) -> "Dataset":
-        instance = cls()
+    def from_jsonl(
+        cls, file_path: str, token_counter: Optional[packing.TokenCounter] = None
+    ) -> "Dataset":
+        instance = cls(token_counter)
         with open(file_path, "r", encoding="utf-8") as f:
             for line in f:
                 sample = json.loads(line)
                 assert cls.validate_sample(sample)
                 instance.samples.append(sample)
 
+        # 有保存时写出的索引则直接复用，不必重新分词
+        lengths = packing.load_index(file_path, len(instance.samples))
+        if lengths is not None:
+            instance.token_lengths = lengths
+        metadata = provenance.load_metadata(file_path, len(instance.samples))
+        if metadata is not None:
+            instance.metadata = metadata
+
         return instance
 
     @classmethod
-    def from_list(cls, sample_list: List[Dict]) -> "Dataset":
-        instance = cls()
+    def from_list(
+        cls,
+        sample_list: List[Dict],
+        token_counter: Optional[packing.TokenCounter] = None,
+    ) -> "Dataset":
+        instance = cls(token_counter)
         for sample in sample_list:
             assert cls.validate_sample(sample)
             instance.samples.append(sample)
 
         return instance
 
+    @classmethod
+    def from_columnar(
+        cls, file_path: str, token_counter: Optional[packing.TokenCounter] = None
+    ) -> "Dataset":
+        """读取 save_columnar 写出的 Parquet / Arrow 文件，需要安装 pyarrow"""
+        samples, lengths, metadata = columnar.table_to_samples(
+            columnar.read_table(file_path)
+        )
+        instance = cls(token_counter)
+        instance.samples = samples
+        instance.metadata = metadata
+        if all(length is not None for length in lengths):
+            instance.token_lengths = [int(length) for length in lengths]
+        return instance
+
     @classmethod
     def validate_sample(cls, sample: Dict) -> bool:
         if "messages" not in sample:
@@ -38,21 +78,241 @@ class Dataset:
                 return False
         return True
 
-    def save(self, save_path: str) -> None:
-        with open(save_path, "w", encoding="utf-8") as f:
-            for sample in self.samples:
-                f.write(
-                    remove_linebreaks_and_spaces(json.dumps(sample, ensure_ascii=False))
-                    + "\n"
+    def save(
+        self,
+        save_path: str,
+        token_index: bool = True,
+        metadata: bool = True,
+    ) -> None:
+        """
+        token_index 为 True 时把每个样本的 token 数写入索引文件
+        <save_path>.lengths.json，只为还没有计数的样本分词。
+        metadata 为 True 时把样本的来源信息写入旁路文件 <save_path>.meta.jsonl。
+        """
+        with profiler.span(profiler.WRITE, path=save_path):
+            self._write_samples(save_path, self.samples)
+            if token_index:
+                packing.save_index(
+                    save_path, self.get_token_lengths(), self._tokenizer_name()
                 )
+            elif os.path.exists(packing.index_path(save_path)):
+                # 覆盖之前保存的数据时不留下过期的索引文件
+                os.remove(packing.index_path(save_path))
+            if metadata:
+                self._save_metadata(save_path, self.get_metadata())
 
         print(
             f"saved dataset to {save_path}. You can now upload and fine-tune models on multiple platforms:\n\nHaven: https://app.haven.run/\nOpenAI: https://platform.openai.com/finetune"
         )
 
-    def add_samples(self, samples: List[Dict]) -> None:
-        for sample in samples:
+    def add_samples(
+        self, samples: List[Dict], metadata: Optional[List[Dict]] = None
+    ) -> None:
+        self.get_metadata()
+        for i, sample in enumerate(samples):
             if self.__class__.validate_sample(sample):
                 self.samples.append(sample)
+                self.metadata.append(metadata[i] if metadata is not None else {})
             else:
                 print("Invalid sample, not added:", sample)
+
+    def get_metadata(self) -> List[Dict]:
+        """返回每个样本的元数据；直接追加到 samples 的样本元数据为空"""
+        while len(self.metadata) < len(self.samples):
+            self.metadata.append({})
+        return self.metadata
+
+    def branch_index(self) -> Dict[Tuple[str, ...], List[int]]:
+        """返回分支到样本下标的索引，只为尚未索引的新样本更新"""
+        metadata = self.get_metadata()
+        for i in range(self._num_indexed, len(metadata)):
+            path = metadata[i].get("tree_path") or []
+            for depth in range(len(path) + 1):
+                self._branch_index.setdefault(tuple(path[:depth]), []).append(i)
+        self._num_indexed = len(metadata)
+        return self._branch_index
+
+    def samples_under(self, branch: List[str]) -> List[int]:
+        """主题树路径以 branch 开头的样本下标"""
+        return list(self.branch_index().get(tuple(branch), []))
+
+    def remove_branches(self, branches: List[List[str]]) -> int:
+        """删除指定分支下的全部样本及其元数据，返回删除的样本数"""
+        removed = set()
+        for branch in branches:
+            removed.update(self.samples_under(branch))
+        if not removed:
+            return 0
+
+        keep = [i for i in range(len(self.samples)) if i not in removed]
+        metadata = self.get_metadata()
+        # token_lengths 是 samples 的前缀，保留下来的部分仍是新 samples 的前缀
+        self.token_lengths = [
+            self.token_lengths[i] for i in keep if i < len(self.token_lengths)
+        ]
+        self.samples = [self.samples[i] for i in keep]
+        self.metadata = [metadata[i] for i in keep]
+        self._branch_index = {}
+        self._num_indexed = 0
+        return len(removed)
+
+    def branch_stats(self, depth: int = 1) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+        """
+        按路径前 depth 层汇总每个分支的样本数、token 数、生成时的 token 用量
+        与模型分布；路径短于 depth 的样本不计入
+        """
+        lengths = self.get_token_lengths()
+        metadata = self.get_metadata()
+        stats = {}
+        for branch, indices in self.branch_index().items():
+            if len(branch) != depth:
+                continue
+            prompt_tokens = 0
+            completion_tokens = 0
+            models: Dict[str, int] = {}
+            for i in indices:
+                usage = metadata[i].get("usage") or {}
+                prompt_tokens += usage.get("prompt_tokens") or 0
+                completion_tokens += usage.get("completion_tokens") or 0
+                model = metadata[i].get("model")
+                if model:
+                    models[model] = models.get(model, 0) + 1
+            stats[branch] = {
+                "num_samples": len(indices),
+                "num_tokens": sum(lengths[i] for i in indices),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "models": models,
+            }
+        return stats
+
+    def get_token_lengths(self) -> List[int]:
+        """返回每个样本的 token 数，只为尚未计数的新样本分词"""
+        for sample in self.samples[len(self.token_lengths) :]:
+            self.token_lengths.append(self.token_counter(sample))
+        return self.token_lengths
+
+    def save_packed(self, save_path: str, max_tokens: int) -> int:
+        """
+        把对话装箱为不超过 max_tokens 的序列，每行一个序列：
+        {"conversations": [样本, ...], "num_tokens": n}。返回序列数。
+        """
+        lengths = self.get_token_lengths()
+        bins, oversized = packing.pack_lengths(lengths, max_tokens)
+        with open(save_path, "w", encoding="utf-8") as f:
+            for indices in bins:
+                packed = {
+                    "conversations": [self.samples[i] for i in indices],
+                    "num_tokens": sum(lengths[i] for i in indices),
+                }
+                f.write(
+                    remove_linebreaks_and_spaces(json.dumps(packed, ensure_ascii=False))
+                    + "\n"
+                )
+
+        total = sum(lengths[i] for indices in bins for i in indices)
+        utilization = total / (len(bins) * max_tokens) if bins else 0.0
+        print(
+            f"packed {len(self.samples) - len(oversized)} samples into {len(bins)} "
+            f"sequences of {max_tokens} tokens ({utilization:.1%} utilization)"
+        )
+        if oversized:
+            print(f"skipped {len(oversized)} samples longer than {max_tokens} tokens")
+        return len(bins)
+
+    def save_by_length(self, save_path: str, boundaries: List[int]) -> Dict[str, str]:
+        """
+        按 token 数分桶保存，例如 boundaries=[512, 2048] 会写出
+        data.0-512.jsonl、data.513-2048.jsonl 和 data.2049+.jsonl（空桶不写）。
+        返回桶名到文件路径的映射。
+        """
+        lengths = self.get_token_lengths()
+        root, ext = os.path.splitext(save_path)
+        paths = {}
+        for k, indices in enumerate(packing.bucket_lengths(lengths, boundaries)):
+            if not indices:
+                continue
+            name = packing.bucket_name(boundaries, k)
+            path = f"{root}.{name}{ext or '.jsonl'}"
+            self._write_samples(path, [self.samples[i] for i in indices])
+            packing.save_index(
+                path, [lengths[i] for i in indices], self._tokenizer_name()
+            )
+            self._save_metadata(path, [self.get_metadata()[i] for i in indices])
+            paths[name] = path
+            print(f"saved {len(indices)} samples with {name} tokens to {path}")
+        return paths
+
+    def save_columnar(
+        self, save_path: str, row_group_size: int = columnar.DEFAULT_ROW_GROUP_SIZE
+    ) -> None:
+        """
+        保存为列式文件，扩展名为 .parquet 时写 Parquet，否则写 Arrow IPC。
+        除对话外还保存 token 数与元数据，需要安装 pyarrow。
+        """
+        lengths = self.get_token_lengths()
+        metadata = self.get_metadata()
+        with columnar.ColumnarWriter(save_path, row_group_size) as writer:
+            for sample, length, meta in zip(self.samples, lengths, metadata):
+                writer.write(sample, length, meta)
+        print(f"saved {writer.num_rows} samples to {save_path}")
+
+    def _write_samples(self, save_path: str, samples: List[Dict]) -> None:
+        with open(save_path, "w", encoding="utf-8") as f:
+            for sample in samples:
+                f.write(
+                    remove_linebreaks_and_spaces(json.dumps(sample, ensure_ascii=False))
+                    + "\n"
+                )
+
+    def _save_metadata(self, save_path: str, metadata: List[Dict]) -> None:
+        if any(metadata):
+            provenance.save_metadata(save_path, metadata)
+        elif os.path.exists(provenance.metadata_path(save_path)):
+            # 覆盖之前保存的数据时不留下过期的旁路文件
+            os.remove(provenance.metadata_path(save_path))
+
+    def _tokenizer_name(self) -> str:
+        if self.token_counter is packing.count_tokens:
+            return packing.DEFAULT_TOKENIZER_MODEL
+        return getattr(self.token_counter, "__name__", "custom")
+
+    # 以下操作直接处理 JSONL 文件，内存占用受 max_memory_bytes 限制，适用于大于内存的数据集
+
+    @staticmethod
+    def shuffle_file(
+        input_path: str,
+        output_path: str,
+        seed: Optional[int] = None,
+        max_memory_bytes: int = external.DEFAULT_MAX_MEMORY_BYTES,
+    ) -> int:
+        """外部打乱：同一 seed 得到同一顺序，返回样本数"""
+        return external.shuffle_file(input_path, output_path, seed, max_memory_bytes)
+
+    @staticmethod
+    def split_file(
+        input_path: str,
+        output_paths: Dict[str, str],
+        ratios: Dict[str, float],
+        seed: int = 0,
+        group_key: Optional[Callable[[Dict], Any]] = None,
+        by_tree_path: bool = False,
+    ) -> Dict[str, int]:
+        """
+        确定性地按比例划分，例如 ratios={"train": 0.8, "val": 0.1, "test": 0.1}。
+        group_key 返回相同值的样本总是划分到同一部分；by_tree_path 为 True 时
+        按来源信息中的主题树路径分组。
+        """
+        return external.split_file(
+            input_path, output_paths, ratios, seed, group_key, by_tree_path
+        )
+
+    @staticmethod
+    def merge_files(
+        input_paths: List[str],
+        output_path: str,
+        dedupe: bool = True,
+        max_memory_bytes: int = external.DEFAULT_MAX_MEMORY_BYTES,
+    ) -> int:
+        """k 路归并多个运行的输出，可去除重复样本，返回写出的样本数"""
+        return external.merge_files(input_paths, output_path, dedupe, max_memory_bytes)
@@ -0,0 +1,138 @@
+"""
+本地文本向量化与多样性选择，不依赖任何网络模型。
+
+文本按字符 n-gram 哈希到固定维度（hashing trick），再做 TF-IDF 加权与 L2 归一化；
+k-center greedy（最远点采样）每一步选出离已选集合最远的点，使所选子集尽量覆盖
+整个空间。全部计算基于 NumPy 向量化，NumPy 是可选依赖。
+"""
+
+from types import ModuleType
+from typing import Any, List, Optional, Sequence
+
+DEFAULT_DIM = 256
+DEFAULT_NGRAM = 3
+
+# 滚动哈希的乘数与 64 位混合常数
+_PRIME = 1099511628211
+_MIX = 0x9E3779B97F4A7C15
+
+
+def _import_numpy() -> ModuleType:
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "diversity features require numpy: pip install 'pluto-clean[diverse]'"
+        ) from e
+    return numpy
+
+
+def hashed_ngram_counts(
+    texts: Sequence[str],
+    n: int = DEFAULT_NGRAM,
+    dim: int = DEFAULT_DIM,
+    chunk_size: int = 4096,
+) -> Any:
+    """
+    每个文本的字符 n-gram 计数，按哈希值落入 dim 个桶，返回 (len(texts), dim) 的
+    float32 矩阵。所有文本的字节拼接成一个数组，一次性计算所有位置的 n-gram 哈希。
+    """
+    np = _import_numpy()
+    counts = np.zeros((len(texts), dim), dtype=np.float32)
+    prime = np.uint64(_PRIME)
+    mix = np.uint64(_MIX)
+    for begin in range(0, len(texts), chunk_size):
+        chunk = texts[begin : begin + chunk_size]
+        encoded = [(" " + text.lower() + " ").encode("utf-8") for text in chunk]
+        lengths = np.array([len(e) for e in encoded], dtype=np.int64)
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        num_grams = len(data) - n + 1
+        if num_grams <= 0:
+            continue
+        doc = np.repeat(np.arange(len(chunk), dtype=np.int64), lengths)
+
+        hashes = np.zeros(num_grams, dtype=np.uint64)
+        for j in range(n):
+            # uint64 数组运算按 2^64 取模回绕
+            hashes = hashes * prime + data[j : j + num_grams]
+        # 只保留不跨越文本边界的 n-gram
+        valid = doc[:num_grams] == doc[n - 1 :]
+        hashes = hashes[valid]
+        hashes ^= hashes >> np.uint64(29)
+        hashes *= mix
+        hashes ^= hashes >> np.uint64(32)
+        buckets = (hashes % np.uint64(dim)).astype(np.int64)
+
+        flat = doc[:num_grams][valid] * dim + buckets
+        counts[begin : begin + len(chunk)] = np.bincount(
+            flat, minlength=len(chunk) * dim
+        ).reshape(len(chunk), dim)
+    return counts
+
+
+def embed_texts(
+    texts: Sequence[str], n: int = DEFAULT_NGRAM, dim: int = DEFAULT_DIM
+) -> Any:
+    """哈希 n-gram 的 TF-IDF 向量，每行 L2 归一化，点积即余弦相似度"""
+    np = _import_numpy()
+    matrix = hashed_ngram_counts(texts, n, dim)
+    df = np.count_nonzero(matrix, axis=0)
+    idf = np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0
+    np.log1p(matrix, out=matrix)
+    matrix *= idf.astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def k_center_greedy(vectors: Any, k: int, start: int = 0) -> List[int]:
+    """
+    从 start 开始，每一步选出与已选点最大余弦相似度最小（即最远）的点。
+    每一步只需一次矩阵-向量乘法，总开销 O(k * n * dim)。
+    """
+    np = _import_numpy()
+    n = vectors.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
+    selected = [start]
+    min_dist = 1.0 - vectors @ vectors[start]
+    min_dist[start] = -np.inf
+    for _ in range(k - 1):
+        i = int(np.argmax(min_dist))
+        selected.append(i)
+        np.minimum(min_dist, 1.0 - vectors @ vectors[i], out=min_dist)
+        # 零向量与自身的距离也是 1，显式排除已选的点
+        min_dist[i] = -np.inf
+    return selected
+
+
+def path_text(path: List[str]) -> str:
+    return " -> ".join(path)
+
+
+def select_diverse(
+    texts: Sequence[str],
+    k: int,
+    start: Optional[int] = None,
+    n: int = DEFAULT_NGRAM,
+    dim: int = DEFAULT_DIM,
+) -> List[int]:
+    """选出 k 个尽量彼此不同的文本的下标；start 为 None 时从第一个文本开始"""
+    if not texts or k <= 0:
+        return []
+    vectors = embed_texts(texts, n, dim)
+    return k_center_greedy(vectors, k, start or 0)
+
+
+def coverage_radius(
+    vectors: Any, selected: List[int], block_size: int = 8192
+) -> float:
+    """所有点到最近的已选点的最大余弦距离，越小说明所选子集覆盖越好"""
+    centers = vectors[selected]
+    radius = 0.0
+    for begin in range(0, vectors.shape[0], block_size):
+        similarity = vectors[begin : begin + block_size] @ centers.T
+        radius = max(radius, float(1.0 - similarity.max(axis=1).min()))
+    return max(0.0, radius)
@@ -0,0 +1,369 @@
+"""
+JSONL 数据集的外存操作：打乱、划分与多路归并。
+所有操作逐行流式读写，内存占用由 max_memory_bytes 限定，与文件大小无关。
+来源信息旁路文件（.meta.jsonl）与 token 长度索引（.lengths.json）随对应的行一起
+移动；输入缺少某个旁路文件时，输出也不写出该文件。
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import random
+import tempfile
+from contextlib import ExitStack
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import packing, provenance
+
+DEFAULT_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+# 一次归并同时打开的有序段数上限，段数更多时先分组归并为更长的段
+MAX_FAN_IN = 64
+
+# 一个样本在临时文件中占三行：样本、来源信息、token 长度；缺少的部分为空行
+_Record = Tuple[bytes, bytes, bytes]
+
+
+def iter_lines(path: str) -> Iterator[bytes]:
+    """逐行读取，跳过空行，并保证每行以换行符结尾"""
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            yield line if line.endswith(b"\n") else line + b"\n"
+
+
+def _atomic_writer(path: str) -> IO[bytes]:
+    """写入同目录下的临时文件，调用方在完成后用 os.replace 替换目标"""
+    directory = os.path.dirname(os.path.abspath(path))
+    return tempfile.NamedTemporaryFile(
+        "wb", dir=directory, prefix=".pluto_", suffix=".tmp", delete=False
+    )
+
+
+def _commit(tmp: IO[bytes], path: str) -> None:
+    tmp.close()
+    # 临时文件权限为 0600，改为按 umask 设置，与直接 open 写出的文件一致
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp.name, 0o666 & ~umask)
+    os.replace(tmp.name, path)
+
+
+class _Sidecars:
+    """输入文件的旁路文件；行数与样本数不一致（数据文件已被修改）时视为不存在"""
+
+    def __init__(self, path: str):
+        self.has_metadata = False
+        self.lengths: Optional[List[int]] = None
+        self.tokenizer: Optional[str] = None
+        metadata_file = provenance.metadata_path(path)
+        index_file = packing.index_path(path)
+        if not os.path.exists(metadata_file) and not os.path.exists(index_file):
+            return
+
+        num_samples = sum(1 for _ in iter_lines(path))
+        if os.path.exists(metadata_file):
+            num_metadata = sum(1 for _ in iter_lines(metadata_file))
+            self.has_metadata = num_metadata == num_samples
+        if os.path.exists(index_file):
+            with open(index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("num_samples") == num_samples and index.get("tokenizer"):
+                self.lengths = index["lengths"]
+                self.tokenizer = index["tokenizer"]
+
+    def size(self, path: str) -> int:
+        if not self.has_metadata:
+            return 0
+        return os.path.getsize(provenance.metadata_path(path))
+
+
+def _iter_records(path: str, sidecars: _Sidecars) -> Iterator[_Record]:
+    metadata = (
+        iter_lines(provenance.metadata_path(path)) if sidecars.has_metadata else None
+    )
+    for i, line in enumerate(iter_lines(path)):
+        meta = next(metadata) if metadata is not None else b"\n"
+        length = b"%d\n" % sidecars.lengths[i] if sidecars.lengths else b"\n"
+        yield line, meta, length
+
+
+def _read_records(f: IO[bytes]) -> Iterator[_Record]:
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        yield line, f.readline(), f.readline()
+
+
+class _RecordWriter:
+    """原子地写出样本及其旁路文件，不写出的旁路文件在输出路径上的旧版本会被删除"""
+
+    def __init__(self, path: str, metadata: bool, tokenizer: Optional[str]):
+        self.path = path
+        self.out = _atomic_writer(path)
+        self.metadata = (
+            _atomic_writer(provenance.metadata_path(path)) if metadata else None
+        )
+        self.tokenizer = tokenizer
+        self.lengths: List[int] = []
+        self.count = 0
+
+    def write(self, record: _Record) -> None:
+        line, meta, length = record
+        self.out.write(line)
+        if self.metadata is not None:
+            self.metadata.write(meta)
+        if self.tokenizer is not None:
+            self.lengths.append(int(length))
+        self.count += 1
+
+    def commit(self) -> None:
+        _commit(self.out, self.path)
+        metadata_file = provenance.metadata_path(self.path)
+        if self.metadata is not None:
+            _commit(self.metadata, metadata_file)
+        elif os.path.exists(metadata_file):
+            os.remove(metadata_file)
+        if self.tokenizer is not None:
+            packing.save_index(self.path, self.lengths, self.tokenizer)
+        elif os.path.exists(packing.index_path(self.path)):
+            os.remove(packing.index_path(self.path))
+
+    def abort(self) -> None:
+        for tmp in (self.out, self.metadata):
+            if tmp is not None:
+                tmp.close()
+                os.unlink(tmp.name)
+
+
+def shuffle_file(
+    input_path: str,
+    output_path: str,
+    seed: Optional[int] = None,
+    max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+    tmp_dir: Optional[str] = None,
+) -> int:
+    """
+    对大于内存的文件做均匀随机打乱：先把每行随机分散到若干临时桶中，
+    桶的数量保证每个桶都能装入内存，再逐桶在内存中打乱后依次写出。
+    """
+    rng = random.Random(seed)
+    sidecars = _Sidecars(input_path)
+    size = os.path.getsize(input_path) + sidecars.size(input_path)
+    # 预留一倍余量，避免随机分桶不均时单个桶超出限制
+    num_buckets = max(1, math.ceil(2 * size / max_memory_bytes))
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as workdir, ExitStack() as stack:
+        buckets = [
+            stack.enter_context(open(os.path.join(workdir, f"{i}.jsonl"), "w+b"))
+            for i in range(num_buckets)
+        ]
+        for record in _iter_records(input_path, sidecars):
+            buckets[rng.randrange(num_buckets)].writelines(record)
+
+        writer = _RecordWriter(output_path, sidecars.has_metadata, sidecars.tokenizer)
+        try:
+            for bucket in buckets:
+                bucket.seek(0)
+                records = list(_read_records(bucket))
+                rng.shuffle(records)
+                for record in records:
+                    writer.write(record)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    return writer.count
+
+
+def _split_fraction(key: str, seed: int) -> float:
+    """把 key 稳定地映射到 [0, 1)，同一 key 与 seed 总是得到同一个值"""
+    digest = hashlib.blake2b(f"{seed}:{key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+def split_file(
+    input_path: str,
+    output_paths: Dict[str, str],
+    ratios: Dict[str, float],
+    seed: int = 0,
+    group_key: Optional[Callable[[Dict], Any]] = None,
+    by_tree_path: bool = False,
+) -> Dict[str, int]:
+    """
+    按比例把文件确定性地划分为多个部分（例如 train/val/test）。
+
+    每行按其内容的哈希分配到某一部分，因此结果与行序无关、可重复。
+    给定 group_key 时按 group_key(sample) 的哈希分配，同一组的样本总是
+    落在同一部分，避免训练集与验证集之间泄漏。by_tree_path 为 True 时
+    按来源信息中的主题树路径分组，需要输入带有 .meta.jsonl 旁路文件。
+    """
+    if set(ratios) != set(output_paths):
+        raise ValueError("ratios and output_paths must have the same keys")
+    total = sum(ratios.values())
+    if total <= 0:
+        raise ValueError("ratios must sum to a positive number")
+    if group_key is not None and by_tree_path:
+        raise ValueError("pass either group_key or by_tree_path, not both")
+    sidecars = _Sidecars(input_path)
+    if by_tree_path and not sidecars.has_metadata:
+        raise ValueError(
+            f"by_tree_path needs an up-to-date {provenance.metadata_path(input_path)}"
+        )
+
+    names = list(ratios)
+    bounds = []
+    cumulative = 0.0
+    for name in names:
+        cumulative += ratios[name] / total
+        bounds.append(cumulative)
+
+    writers = {
+        name: _RecordWriter(
+            output_paths[name], sidecars.has_metadata, sidecars.tokenizer
+        )
+        for name in names
+    }
+    try:
+        for record in _iter_records(input_path, sidecars):
+            line, meta, _ = record
+            if group_key is not None:
+                key = json.dumps(
+                    group_key(json.loads(line)), ensure_ascii=False, sort_keys=True
+                )
+            elif by_tree_path:
+                key = str(json.loads(meta).get("tree_path_id"))
+            else:
+                key = line.decode("utf-8")
+            fraction = _split_fraction(key, seed)
+            name = next(
+                (n for n, bound in zip(names, bounds) if fraction < bound), names[-1]
+            )
+            writers[name].write(record)
+    except BaseException:
+        for writer in writers.values():
+            writer.abort()
+        raise
+
+    for writer in writers.values():
+        writer.commit()
+    return {name: writer.count for name, writer in writers.items()}
+
+
+def _write_sorted_runs(
+    input_path: str,
+    sidecars: _Sidecars,
+    workdir: str,
+    max_memory_bytes: int,
+    start_index: int,
+) -> List[str]:
+    """把输入切成内存可容纳的块，各自按样本排序后写成有序的临时文件"""
+    runs: List[str] = []
+    records: List[_Record] = []
+    size = 0
+
+    def flush() -> None:
+        records.sort()
+        path = os.path.join(workdir, f"run_{start_index + len(runs)}.jsonl")
+        with open(path, "wb") as f:
+            for record in records:
+                f.writelines(record)
+        runs.append(path)
+        records.clear()
+
+    for record in _iter_records(input_path, sidecars):
+        records.append(record)
+        size += sum(len(part) for part in record)
+        if size >= max_memory_bytes:
+            flush()
+            size = 0
+    if records:
+        flush()
+    return runs
+
+
+def _merge_records(streams: List[Iterator[_Record]], dedupe: bool) -> Iterator[_Record]:
+    previous: Optional[bytes] = None
+    for record in heapq.merge(*streams):
+        if dedupe and record[0] == previous:
+            continue
+        yield record
+        previous = record[0]
+
+
+def _merge_runs(runs: List[str], workdir: str, dedupe: bool, fan_in: int) -> List[str]:
+    """每轮把至多 fan_in 个有序段归并为一个，直到剩下的段数不超过 fan_in"""
+    num_passes = 0
+    while len(runs) > fan_in:
+        merged: List[str] = []
+        for start in range(0, len(runs), fan_in):
+            group = runs[start : start + fan_in]
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            path = os.path.join(workdir, f"pass_{num_passes}_{len(merged)}.jsonl")
+            with ExitStack() as stack, open(path, "wb") as out:
+                streams = [
+                    _read_records(stack.enter_context(open(run, "rb")))
+                    for run in group
+                ]
+                for record in _merge_records(streams, dedupe):
+                    out.writelines(record)
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        runs = merged
+        num_passes += 1
+    return runs
+
+
+def merge_files(
+    input_paths: List[str],
+    output_path: str,
+    dedupe: bool = True,
+    max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+    tmp_dir: Optional[str] = None,
+    fan_in: int = MAX_FAN_IN,
+) -> int:
+    """
+    多路归并多个运行的输出。每个输入先外部排序为若干有序段，
+    再分轮做至多 fan_in 路的归并，同时打开的文件数不超过 fan_in；
+    dedupe 为 True 时去掉完全相同的样本，保留排在最前的一条及其来源信息。
+    输出按样本的 JSON 文本排序，需要随机顺序时再调用 shuffle_file。
+    只有所有输入都带有某个旁路文件（token 长度索引还需使用同一分词器）时才合并它。
+    """
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+    sidecars = [_Sidecars(path) for path in input_paths]
+    metadata = bool(sidecars) and all(s.has_metadata for s in sidecars)
+    tokenizers = {s.tokenizer for s in sidecars}
+    tokenizer = tokenizers.pop() if len(tokenizers) == 1 else None
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as workdir:
+        runs: List[str] = []
+        # 所有输入共享内存预算
+        run_memory = max(1, max_memory_bytes // 2)
+        for path, path_sidecars in zip(input_paths, sidecars):
+            runs.extend(
+                _write_sorted_runs(path, path_sidecars, workdir, run_memory, len(runs))
+            )
+
+        runs = _merge_runs(runs, workdir, dedupe, fan_in)
+        writer = _RecordWriter(output_path, metadata, tokenizer)
+        try:
+            with ExitStack() as stack:
+                streams = [
+                    _read_records(stack.enter_context(open(run, "rb"))) for run in runs
+                ]
+                for record in _merge_records(streams, dedupe):
+                    writer.write(record)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    return writer.count
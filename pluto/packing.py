@@ -0,0 +1,99 @@
+"""
+样本 token 长度索引与序列打包：把对话装箱为固定长度的序列，或按长度分桶。
+"""
+
+import bisect
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+TokenCounter = Callable[[Dict], int]
+
+DEFAULT_TOKENIZER_MODEL = "gpt-3.5-turbo"
+
+
+def count_tokens(sample: Dict) -> int:
+    """默认的 token 计数：使用 litellm 内置的 tiktoken 分词器，不需要联网"""
+    import litellm
+
+    return litellm.token_counter(
+        model=DEFAULT_TOKENIZER_MODEL, messages=sample["messages"]
+    )
+
+
+def index_path(save_path: str) -> str:
+    """token 长度索引与数据文件放在一起"""
+    return save_path + ".lengths.json"
+
+
+def save_index(save_path: str, lengths: List[int], tokenizer: str) -> None:
+    with open(index_path(save_path), "w", encoding="utf-8") as f:
+        json.dump(
+            {"tokenizer": tokenizer, "num_samples": len(lengths), "lengths": lengths},
+            f,
+        )
+
+
+def load_index(save_path: str, num_samples: int) -> Optional[List[int]]:
+    """读取索引；不存在或样本数不一致（文件已被修改）时返回 None"""
+    path = index_path(save_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("num_samples") != num_samples:
+        print(f"ignoring stale token length index {path}")
+        return None
+    return index["lengths"]
+
+
+def pack_lengths(
+    lengths: List[int], max_tokens: int
+) -> Tuple[List[List[int]], List[int]]:
+    """
+    最佳适应递减（best-fit decreasing）装箱：按长度从大到小依次放入剩余空间最小
+    且放得下的箱子，放不下时开新箱。装箱效果与 first-fit decreasing 相当，
+    用二分查找代替逐箱扫描，复杂度为 O(n log n)。
+
+    返回 (每个箱子中的样本下标, 超过 max_tokens 而无法装箱的样本下标)。
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    bins: List[List[int]] = []
+    oversized: List[int] = []
+    # 按剩余空间升序排列的 (剩余空间, 箱子编号)
+    free: List[Tuple[int, int]] = []
+    for i in order:
+        length = lengths[i]
+        if length > max_tokens:
+            oversized.append(i)
+            continue
+        pos = bisect.bisect_left(free, (length, -1))
+        if pos < len(free):
+            remaining, bin_id = free.pop(pos)
+        else:
+            remaining, bin_id = max_tokens, len(bins)
+            bins.append([])
+        bins[bin_id].append(i)
+        if remaining - length > 0:
+            bisect.insort(free, (remaining - length, bin_id))
+    return bins, oversized
+
+
+def bucket_lengths(lengths: List[int], boundaries: List[int]) -> List[List[int]]:
+    """
+    按长度分桶：第 k 个桶包含 boundaries[k-1] < 长度 <= boundaries[k] 的样本，
+    最后一个桶包含超过最大边界的样本。
+    """
+    boundaries = sorted(boundaries)
+    buckets: List[List[int]] = [[] for _ in range(len(boundaries) + 1)]
+    for i, length in enumerate(lengths):
+        buckets[bisect.bisect_left(boundaries, length)].append(i)
+    return buckets
+
+
+def bucket_name(boundaries: List[int], k: int) -> str:
+    boundaries = sorted(boundaries)
+    low = boundaries[k - 1] + 1 if k > 0 else 0
+    if k == len(boundaries):
+        return f"{low}+"
+    return f"{low}-{boundaries[k]}"
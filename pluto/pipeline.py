@@ -0,0 +1,327 @@
+"""
+生成后处理流水线：用户注册的过滤 / 变换阶段在工作线程中与生成并发执行，
+阶段之间用有界队列连接，队列满时反压到生成循环。
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from . import profiler
+
+FILTER = "filter"
+TRANSFORM = "transform"
+
+# 队列结束标记
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    # filter 返回真值表示保留；transform 返回新样本，返回 None 表示丢弃
+    fn: Callable[[Dict], Any]
+    kind: str
+    workers: int = 1
+    # 在进程池中执行 fn，适用于 CPU 密集的阶段；fn 与样本必须可被 pickle
+    use_process: bool = False
+
+
+@dataclass
+class StageStats:
+    received: int = 0
+    passed: int = 0
+    dropped: int = 0
+    errors: int = 0
+    # 所有工作线程在该阶段内累计花费的时间
+    seconds: float = 0.0
+
+
+class Pipeline:
+    """
+    按注册顺序执行的样本处理阶段。
+
+    典型用法是交给 DataEngine(pipeline=...)，生成的样本通过校验后进入流水线，
+    通过所有阶段的样本才加入数据集；也可以用 run() 处理已有的样本。
+    """
+
+    def __init__(self, queue_size: int = 256, process_workers: Optional[int] = None):
+        self.queue_size = queue_size
+        self.process_workers = process_workers
+        self.stages: List[Stage] = []
+        self.stats: Dict[str, StageStats] = {}
+        self._queues: List["queue.Queue[Any]"] = []
+        self._threads: List[List[threading.Thread]] = []
+        # 每个阶段从输入队列读取的线程数，close() 为每个读取线程发送一个结束标记
+        self._readers: List[int] = []
+        self._sink_thread: Optional[threading.Thread] = None
+        self._sink_error: Optional[BaseException] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def add_filter(
+        self,
+        fn: Callable[[Dict], bool],
+        name: Optional[str] = None,
+        workers: int = 1,
+        use_process: bool = False,
+    ) -> "Pipeline":
+        return self._add_stage(fn, FILTER, name, workers, use_process)
+
+    def add_transform(
+        self,
+        fn: Callable[[Dict], Optional[Dict]],
+        name: Optional[str] = None,
+        workers: int = 1,
+        use_process: bool = False,
+    ) -> "Pipeline":
+        return self._add_stage(fn, TRANSFORM, name, workers, use_process)
+
+    def _add_stage(
+        self,
+        fn: Callable[[Dict], Any],
+        kind: str,
+        name: Optional[str],
+        workers: int,
+        use_process: bool,
+    ) -> "Pipeline":
+        if self._sink_thread is not None:
+            raise Exception("cannot add stages to a running pipeline")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        name = name or getattr(fn, "__name__", kind)
+        if name in self.stats:
+            name = f"{name}_{len(self.stages)}"
+        self.stages.append(Stage(name, fn, kind, workers, use_process))
+        self.stats[name] = StageStats()
+        return self
+
+    def start(self, sink: Callable[[Dict, Dict], None]) -> None:
+        """
+        启动所有阶段；通过全部阶段的样本在单个线程中依次交给 sink(sample, metadata)，
+        metadata 为 put() 时附带的元数据，不经过各阶段的函数。
+        """
+        if self._sink_thread is not None:
+            raise Exception("pipeline is already running")
+        self._sink_error = None
+        stages = self.stages
+        self.stats = {stage.name: StageStats() for stage in stages}
+        if any(stage.use_process for stage in stages):
+            self._executor = ProcessPoolExecutor(max_workers=self.process_workers)
+
+        self._queues = [
+            queue.Queue(maxsize=self.queue_size) for _ in range(len(stages) + 1)
+        ]
+        self._threads = []
+        self._readers = []
+        for i, stage in enumerate(stages):
+            inbox, outbox = self._queues[i], self._queues[i + 1]
+            if stage.use_process:
+                # 一个线程提交、一个线程收集结果，进程池中同时保持多个任务在途
+                pending: "queue.Queue[Any]" = queue.Queue()
+                slots = threading.BoundedSemaphore(self._process_slots(stage))
+                threads = [
+                    threading.Thread(
+                        target=self._submit_process_stage,
+                        args=(stage, inbox, pending, slots),
+                        name=f"pipeline-{stage.name}-submit",
+                        daemon=True,
+                    ),
+                    threading.Thread(
+                        target=self._collect_process_stage,
+                        args=(stage, pending, outbox, slots),
+                        name=f"pipeline-{stage.name}-collect",
+                        daemon=True,
+                    ),
+                ]
+                self._readers.append(1)
+            else:
+                threads = [
+                    threading.Thread(
+                        target=self._run_stage,
+                        args=(stage, inbox, outbox),
+                        name=f"pipeline-{stage.name}-{n}",
+                        daemon=True,
+                    )
+                    for n in range(stage.workers)
+                ]
+                self._readers.append(len(threads))
+            for thread in threads:
+                thread.start()
+            self._threads.append(threads)
+
+        self._sink_thread = threading.Thread(
+            target=self._run_sink, args=(sink, self._queues[-1]), daemon=True
+        )
+        self._sink_thread.start()
+
+    def put(self, sample: Dict, metadata: Optional[Dict] = None) -> None:
+        """提交一个样本；第一个队列已满时阻塞，直到下游跟上"""
+        if self._sink_thread is None:
+            raise Exception("pipeline is not running, call start() first")
+        self._queues[0].put((sample, metadata or {}))
+
+    def close(self) -> None:
+        """等待所有已提交的样本处理完毕，并停止工作线程"""
+        if self._sink_thread is None:
+            return
+        # 逐个阶段发送结束标记：上一阶段全部退出后，队列中不会再有新样本
+        for i, threads in enumerate(self._threads):
+            for _ in range(self._readers[i]):
+                self._queues[i].put(_DONE)
+            for thread in threads:
+                thread.join()
+        self._queues[-1].put(_DONE)
+        self._sink_thread.join()
+        self._sink_thread = None
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._sink_error is not None:
+            raise self._sink_error
+
+    def run(self, samples: Iterable[Dict]) -> List[Dict]:
+        """同步处理一组样本，返回通过所有阶段的样本（多线程阶段不保证顺序）"""
+        results: List[Dict] = []
+        self.start(lambda sample, metadata: results.append(sample))
+        try:
+            for sample in samples:
+                self.put(sample)
+        finally:
+            self.close()
+        return results
+
+    def _run_stage(
+        self, stage: Stage, inbox: "queue.Queue[Any]", outbox: "queue.Queue[Any]"
+    ) -> None:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+
+            sample, metadata = item
+            started = time.perf_counter()
+            try:
+                with profiler.span(f"stage:{stage.name}"):
+                    result = stage.fn(sample)
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+            elapsed = time.perf_counter() - started
+            self._finish(stage, sample, metadata, result, error, elapsed, outbox)
+
+    def _process_slots(self, stage: Stage) -> int:
+        """进程阶段的在途任务上限：进程数的两倍，使进程在结果回传时不空闲"""
+        processes = self.process_workers or os.cpu_count() or 1
+        return max(stage.workers, 2 * processes)
+
+    def _submit_process_stage(
+        self,
+        stage: Stage,
+        inbox: "queue.Queue[Any]",
+        pending: "queue.Queue[Any]",
+        slots: threading.BoundedSemaphore,
+    ) -> None:
+        assert self._executor is not None
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                pending.put(_DONE)
+                return
+            sample, metadata = item
+            slots.acquire()
+            started = time.perf_counter()
+            try:
+                future = self._executor.submit(stage.fn, sample)
+            except Exception as e:
+                # 进程池已损坏等情况，交给收集线程按普通错误计数
+                future = Future()
+                future.set_exception(e)
+            pending.put((future, sample, metadata, started))
+
+    def _collect_process_stage(
+        self,
+        stage: Stage,
+        pending: "queue.Queue[Any]",
+        outbox: "queue.Queue[Any]",
+        slots: threading.BoundedSemaphore,
+    ) -> None:
+        """按提交顺序收集结果；等待队首任务时其余任务仍在进程池中执行"""
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                return
+            future, sample, metadata, started = item
+            try:
+                with profiler.span(f"stage:{stage.name}"):
+                    result = future.result()
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+            finally:
+                slots.release()
+            elapsed = time.perf_counter() - started
+            self._finish(stage, sample, metadata, result, error, elapsed, outbox)
+
+    def _finish(
+        self,
+        stage: Stage,
+        sample: Dict,
+        metadata: Dict,
+        result: Any,
+        error: Optional[BaseException],
+        elapsed: float,
+        outbox: "queue.Queue[Any]",
+    ) -> None:
+        stats = self.stats[stage.name]
+        if stage.kind == FILTER:
+            output = sample if result else None
+        else:
+            output = result
+
+        with self._lock:
+            stats.received += 1
+            stats.seconds += elapsed
+            if error is not None:
+                stats.errors += 1
+            elif output is None:
+                stats.dropped += 1
+            else:
+                stats.passed += 1
+        if error is not None:
+            print(f"pipeline stage {stage.name} failed: {error}")
+        if output is not None:
+            outbox.put((output, metadata))
+
+    def _run_sink(
+        self, sink: Callable[[Dict, Dict], None], inbox: "queue.Queue[Any]"
+    ) -> None:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            # sink 出错后继续消费队列，避免上游阻塞；错误在 close() 中抛出
+            if self._sink_error is not None:
+                continue
+            try:
+                sink(*item)
+            except BaseException as e:
+                self._sink_error = e
+
+    def summary(self) -> str:
+        lines = ["pipeline:"]
+        for name, stats in self.stats.items():
+            per_sample = stats.seconds / stats.received * 1000 if stats.received else 0
+            lines.append(
+                f"  {name}: {stats.received} in, {stats.passed} passed, "
+                f"{stats.dropped} dropped, {stats.errors} errors, "
+                f"{stats.seconds:.2f}s ({per_sample:.2f}ms/sample)"
+            )
+        return "\n".join(lines)
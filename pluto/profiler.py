@@ -0,0 +1,141 @@
+"""
+可选的性能剖析：记录每个请求各阶段的耗时区间，导出为 Chrome trace-event JSON，
+可在 Perfetto (https://ui.perfetto.dev) 或 chrome://tracing 中查看。
+
+未启用 Profiler 时 span() 返回一个共享的空上下文，几乎没有开销。
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+# 各模块记录的阶段名
+BUILD_PROMPT = "build_prompt"
+WAIT_SLOT = "wait_slot"
+REQUEST = "request"
+PARSE = "parse"
+VALIDATE = "validate"
+WRITE = "write"
+
+
+class _NullSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+_active: Optional["Profiler"] = None
+
+
+def span(name: str, **args: Any) -> ContextManager[None]:
+    """记录一个耗时区间；没有启用的 Profiler 时不做任何事"""
+    profiler = _active
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name, **args)
+
+
+class Profiler:
+    """
+    用法：
+
+        with Profiler() as profiler:
+            engine.create_data(...)
+        profiler.export("trace.json")
+    """
+
+    def __init__(self) -> None:
+        self.events: List[Dict[str, Any]] = []
+        self._thread_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._previous: Optional[Profiler] = None
+
+    def __enter__(self) -> "Profiler":
+        global _active
+        self._previous = _active
+        _active = self
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        global _active
+        _active = self._previous
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.record(name, start, end, **args)
+
+    def record(self, name: str, start: float, end: float, **args: Any) -> None:
+        """记录一个已结束的区间，start 与 end 为 time.perf_counter() 的值"""
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start - self._start) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = {k: _jsonable(v) for k, v in args.items()}
+        with self._lock:
+            self.events.append(event)
+            if thread.ident not in self._thread_names and thread.ident is not None:
+                self._thread_names[thread.ident] = thread.name
+
+    def export(self, path: str) -> None:
+        """写出 Chrome trace-event JSON"""
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self._thread_names)
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in thread_names.items()
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": metadata + events, "displayTimeUnit": "ms"},
+                f,
+                ensure_ascii=False,
+            )
+        print(f"saved {len(events)} trace events to {path}")
+
+    def summary(self) -> str:
+        """按阶段汇总的次数、总耗时与最大耗时"""
+        totals: Dict[str, List[float]] = {}
+        with self._lock:
+            for event in self.events:
+                totals.setdefault(event["name"], []).append(event["dur"] / 1000)
+        lines = ["profile:"]
+        for name, durations in sorted(totals.items(), key=lambda kv: -sum(kv[1])):
+            lines.append(
+                f"  {name}: {len(durations)} spans, total {sum(durations):.1f}ms, "
+                f"mean {sum(durations) / len(durations):.2f}ms, "
+                f"max {max(durations):.1f}ms"
+            )
+        return "\n".join(lines)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return str(value)
@@ -71,3 +71,84 @@ node path: {{{{subtopics_list}}}}
 desired number of subtopics: {{{{num_subtopics}}}}
 
 Now return the subtopics as a python list, and return it in just one line, not multiple ones. Don't return anything else."""
+
+
+NESTED_TREE_GENERATION_PROMPT = """I want to train a large language model and I am using another, bigger large language model to generate training data for this. To avoid repetitive training samples, we modify the prompt for each sampling procedure according to a topic, and we organize these topics recursively as a tree: every topic has a list of subtopics, and every subtopic has its own subtopics.
+Your job is the following: I will give you a path of nodes down the topic tree - you should then come up with several levels of subtopics below this node at once and return them as one nested json object. Every key is a subtopic, and its value holds the subtopics one level further down. On the last level, the value is a list of subtopic strings.
+
+Example 1:
+node path: "News Topics" -> "Sports"
+desired number of subtopics per node: 3
+desired number of levels: 2
+subtopics: {"Football": ["college football", "football stadiums", "Seattle Seahawks"], "Tennis": ["Wimbledon", "tennis rackets", "Serena Williams"], "Olympics": ["Olympic host cities", "doping scandals", "Olympic records"]}
+
+Example 2:
+node path: "Small Talk Topics"
+desired number of subtopics per node: 2
+desired number of levels: 3
+subtopics: {"Hobbies": {"Cooking": ["recipes", "kitchen gadgets"], "Gardening": ["house plants", "vegetable gardens"]}, "Family": {"Siblings": ["sibling rivalry", "twins"], "Family Traditions": ["holiday dinners", "family reunions"]}}
+
+
+Here is a description / the system prompt for the model we want to train:
+
+<system_prompt>
+{{{{system_prompt}}}}
+</system_prompt>
+
+
+Here is your topic input. When generating subtopics, remain somewhat vague. Things can only be tangentially related and they don't have to be interpreted in a single way. Importantly, make sure that the subtopics fit the system prompt, if one was supplied:
+node path: {{{{subtopics_list}}}}
+desired number of subtopics per node: {{{{num_subtopics}}}}
+desired number of levels: {{{{num_levels}}}}
+
+Now return the subtopics as one json object in just one line, not multiple ones. Don't return anything else."""
+
+
+BATCH_TREE_GENERATION_PROMPT = """I want to train a large language model and I am using another, bigger large language model to generate training data for this. To avoid repetitive training samples, we modify the prompt for each sampling procedure according to a topic, and we organize these topics recursively as a tree: every topic has a list of subtopics, and every subtopic has its own subtopics.
+Your job is the following: I will give you several numbered paths of nodes down the topic tree - for every one of them you should come up with a list of new subtopics for the last node of the path. Return one json object that maps the number of every path to its list of subtopics. Here is an example of what your output should look like:
+
+node paths:
+1: "News Topics" -> "Sports" -> "Football"
+2: "News Topics" -> "Sports" -> "Tennis"
+3: "News Topics" -> "Entertainment" -> "Movies"
+desired number of subtopics: 4
+subtopics: {"1": ["college football", "football stadiums", "Seattle Seahawks", "football sponsorships"], "2": ["Wimbledon", "tennis rackets", "Serena Williams", "clay courts"], "3": ["Tom Hanks", "film festivals", "box office records", "movie sequels"]}
+
+
+Here is a description / the system prompt for the model we want to train:
+
+<system_prompt>
+{{{{system_prompt}}}}
+</system_prompt>
+
+
+Here is your topic input. When generating subtopics, remain somewhat vague. Things can only be tangentially related and they don't have to be interpreted in a single way. Importantly, make sure that the subtopics fit the system prompt, if one was supplied:
+node paths:
+{{{{subtopics_lists}}}}
+desired number of subtopics: {{{{num_subtopics}}}}
+
+Now return the subtopics for every path as one json object in just one line, not multiple ones. Don't return anything else."""
+
+
+TREE_WIDENING_PROMPT = """I want to train a large language model and I am using another, bigger large language model to generate training data for this. To avoid repetitive training samples, we modify the prompt for each sampling procedure according to a topic, and we organize these topics recursively as a tree: every topic has a list of subtopics, and every subtopic has its own subtopics.
+Your job is the following: I will give you a path of nodes down the topic tree together with the subtopics this node already has - you should then come up with additional subtopics for this node that are clearly different from the existing ones, and return them as a python list. Here is an example of what your output should look like:
+
+node path: "News Topics" -> "Sports" -> "Football"
+existing subtopics: ["college football", "football stadiums", "Seattle Seahawks"]
+desired number of additional subtopics: 3
+subtopics: ["football injuries", "fantasy football", "women's football leagues"]
+
+
+Here is a description / the system prompt for the model we want to train:
+
+<system_prompt>
+{{{{system_prompt}}}}
+</system_prompt>
+
+
+Here is your topic input. When generating subtopics, remain somewhat vague. Things can only be tangentially related and they don't have to be interpreted in a single way. Do not repeat or rephrase any of the existing subtopics. Importantly, make sure that the subtopics fit the system prompt, if one was supplied:
+node path: {{{{subtopics_list}}}}
+existing subtopics: {{{{existing_subtopics}}}}
+desired number of additional subtopics: {{{{num_subtopics}}}}
+
+Now return the additional subtopics as a python list, and return it in just one line, not multiple ones. Don't return anything else."""
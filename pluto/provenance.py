@@ -0,0 +1,60 @@
+"""
+样本的来源信息（主题树路径及其 id、模型、端点、时间戳、token 用量）。
+来源信息保存在 Dataset.metadata 中，不写入 JSONL 训练数据；
+save 时另存为旁路文件 <path>.meta.jsonl，from_jsonl 时按样本数校验后读回。
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+
+def path_id(path: Optional[List[str]]) -> Optional[str]:
+    """主题树路径的稳定 id，与路径在树中的位置无关"""
+    if path is None:
+        return None
+    data = json.dumps(path, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def response_provenance(response: Any) -> Dict[str, Any]:
+    """从模型响应中取出模型名、端点与 token 用量"""
+    provenance: Dict[str, Any] = {"timestamp": time.time()}
+    model = getattr(response, "model", None)
+    if model:
+        provenance["model"] = model
+    hidden = getattr(response, "_hidden_params", None) or {}
+    if hidden.get("api_base"):
+        provenance["endpoint"] = hidden["api_base"]
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        provenance["usage"] = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "total_tokens": getattr(usage, "total_tokens", None),
+        }
+    return provenance
+
+
+def metadata_path(path: str) -> str:
+    return path + ".meta.jsonl"
+
+
+def save_metadata(path: str, metadata: List[Dict]) -> None:
+    with open(metadata_path(path), "w", encoding="utf-8") as f:
+        for meta in metadata:
+            f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+
+
+def load_metadata(path: str, num_samples: int) -> Optional[List[Dict]]:
+    """读取旁路文件；文件不存在或行数与样本数不一致（数据文件已被修改）时返回 None"""
+    if not os.path.exists(metadata_path(path)):
+        return None
+    with open(metadata_path(path), "r", encoding="utf-8") as f:
+        metadata = [json.loads(line) for line in f if line.strip()]
+    if len(metadata) != num_samples:
+        print(f"ignoring stale metadata file {metadata_path(path)}")
+        return None
+    return metadata
@@ -0,0 +1,580 @@
+"""
+API 提供商客户端：统一解析提供商配置，并持有可复用的 HTTP 连接池
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from . import profiler
+from .types import APIProvider
+
+
+def configure_api_provider(
+    model_name: str,
+    api_provider: APIProvider,
+    api_base: Optional[str],
+    api_key: Optional[str],
+) -> Tuple[str, Optional[str], Optional[str]]:
+    """根据 API 提供商配置模型名称和参数"""
+
+    final_model_name: str
+    final_api_base: Optional[str]
+    final_api_key: Optional[str]
+
+    if api_provider == APIProvider.OLLAMA:
+        # Ollama 配置
+        final_model_name = f"ollama/{model_name}"
+        final_api_base = api_base or "http://localhost:11434"
+        final_api_key = api_key  # Ollama 通常不需要 API key
+
+    elif api_provider == APIProvider.OPENAI_COMPATIBLE:
+        # 自定义 base URL 的 OpenAI 兼容接口
+        final_model_name = f"openai/{model_name}"
+        if not api_base:
+            raise ValueError("api_base is required for OpenAI compatible provider")
+        if not api_key:
+            raise ValueError("api_key is required for OpenAI compatible provider")
+        final_api_base = api_base
+        final_api_key = api_key
+
+    elif api_provider == APIProvider.OPENROUTER:
+        # OpenRouter 配置
+        final_model_name = f"openrouter/{model_name}"
+        final_api_base = api_base or "https://openrouter.ai/api/v1"
+        final_api_key = api_key
+
+        if not final_api_key:
+            # 尝试从环境变量获取
+            final_api_key = os.getenv("OPENROUTER_API_KEY")
+            if not final_api_key:
+                raise ValueError(
+                    "api_key or OPENROUTER_API_KEY environment variable is required for OpenRouter provider"
+                )
+
+    else:  # APIProvider.DEFAULT
+        # 默认配置（OpenAI/Azure 等）
+        final_model_name = model_name
+        final_api_base = api_base
+        final_api_key = api_key
+
+    return final_model_name, final_api_base, final_api_key
+
+
+@dataclass
+class OllamaArguments:
+    """Ollama 吞吐模式配置"""
+
+    # 整个运行期间让模型常驻内存，避免建树与生成数据两阶段之间被卸载
+    keep_alive: str = "30m"
+    # 服务端并行槽位数（OLLAMA_NUM_PARALLEL）；为 None 时自动探测
+    num_parallel: Optional[int] = None
+    # 首次请求前预加载模型，把冷启动时间挪出请求路径
+    warmup: bool = True
+    # 探测并行槽位时最多同时发出的请求数
+    max_probe_parallel: int = 8
+
+
+@dataclass
+class HedgeArguments:
+    """对冲请求配置：请求超过历史延迟分位数仍未返回时，再发一个副本，取先完成者"""
+
+    # 触发对冲的延迟分位数
+    percentile: float = 0.95
+    # 对冲请求数占总请求数的上限，限制额外负载
+    max_extra_fraction: float = 0.1
+    # 积累到这么多个延迟样本之后才开始对冲
+    min_samples: int = 20
+    # 触发对冲的最短等待时间（秒）
+    min_delay: float = 0.0
+    # 对冲请求发往的另一个端点（同类提供商的副本）；为 None 时发往同一端点
+    client: Optional["ProviderClient"] = None
+    # 用于估计分位数的最近延迟样本数
+    window: int = 1000
+
+
+class _ConcurrencyLimit:
+    """
+    可在运行中调整上限的并发槽位。调小上限时不打断在途请求，
+    新请求要等在途数降到新上限以下才能拿到槽位。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def resize(self, limit: int) -> None:
+        with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+
+
+class ProviderClient:
+    """
+    可在 TopicTree 与 DataEngine 之间共享的提供商客户端。
+
+    提供商配置（api_base、api_key、模型前缀）只在构造时解析一次；
+    所有请求复用同一个 keep-alive 连接池，避免每次调用重新建立 TCP/TLS 连接。
+    """
+
+    def __init__(
+        self,
+        api_provider: APIProvider = APIProvider.DEFAULT,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+        pool_size: int = 32,
+        timeout: float = 600.0,
+        connect_timeout: float = 10.0,
+        keepalive_expiry: float = 60.0,
+        ollama: Optional[OllamaArguments] = None,
+        request_timeout: Optional[float] = None,
+        hedge: Optional[HedgeArguments] = None,
+        structured_outputs: bool = True,
+    ):
+        self.api_provider = api_provider
+        # 只有 Ollama 提供商才启用吞吐模式
+        self.ollama = ollama if api_provider == APIProvider.OLLAMA else None
+        # 用占位模型名解析一次，校验必填参数并得到最终的 api_base / api_key
+        _, self.api_base, self.api_key = configure_api_provider(
+            "", api_provider, api_base, api_key
+        )
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self.connect_timeout = connect_timeout
+        self.keepalive_expiry = keepalive_expiry
+
+        self._model_names: Dict[str, str] = {}
+        # httpx 与 litellm 导入较慢，连接池在第一次请求时才创建
+        self._http_client: Any = None
+        self._llm_client: Any = None
+        self._clients_built = False
+        self._clients_lock = threading.Lock()
+
+        # 同时在途的请求数上限，由共享该客户端的 TopicTree 与 DataEngine 共用
+        self.max_concurrency = pool_size
+        self._slots = _ConcurrencyLimit(self.max_concurrency)
+        self._warm_models: Set[str] = set()
+        self._warm_lock = threading.Lock()
+
+        # 每个请求的截止时间（秒），超时后放弃等待并抛出 TimeoutError
+        self.request_timeout = request_timeout
+        self.hedge = hedge
+        self.num_requests = 0
+        self.num_hedges = 0
+        self.num_hedge_wins = 0
+        self._latencies: Deque[float] = deque(
+            maxlen=hedge.window if hedge else 1000
+        )
+        self._stats_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # 为 False 时不发送 JSON Schema，只使用 JSON 模式
+        self.structured_outputs = structured_outputs
+        # 拒绝过 JSON Schema 的模型，之后的请求直接使用 JSON 模式
+        self._schema_unsupported: Set[str] = set()
+        if request_timeout is not None or hedge is not None:
+            # 主请求与对冲请求都在该线程池中执行，调用方线程只负责等待
+            self._executor = ThreadPoolExecutor(max_workers=2 * pool_size + 4)
+
+    def _ensure_clients(self) -> None:
+        """创建连接池以及交给 litellm 的 client，只执行一次"""
+        if self._clients_built:
+            return
+        with self._clients_lock:
+            if self._clients_built:
+                return
+            with profiler.span("init_client"):
+                import httpx
+                import litellm  # noqa: F401
+
+                self._http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                )
+                self._llm_client = self._build_llm_client()
+            self._clients_built = True
+
+    def _get_http_client(self) -> Any:
+        self._ensure_clients()
+        return self._http_client
+
+    def _build_llm_client(self) -> Any:
+        """构造交给 litellm 的 client 参数，使其走本对象持有的连接池"""
+        if self.api_provider in (APIProvider.OLLAMA, APIProvider.OPENROUTER):
+            # 这两类提供商在 litellm 中走通用 HTTP handler
+            from litellm.llms.custom_httpx.http_handler import HTTPHandler
+
+            return HTTPHandler(timeout=self.timeout, client=self._http_client)
+
+        if self.api_provider == APIProvider.OPENAI_COMPATIBLE:
+            from openai import OpenAI
+
+            return OpenAI(
+                api_key=self.api_key,
+                base_url=self.api_base,
+                http_client=self._http_client,
+            )
+
+        # DEFAULT 的路由由模型名决定，交给 litellm 自身按 key 缓存的客户端
+        return None
+
+    def model(self, model_name: str) -> str:
+        """返回带提供商前缀的模型名"""
+        if model_name not in self._model_names:
+            final_model_name = configure_api_provider(
+                model_name, self.api_provider, self.api_base, self.api_key
+            )[0]
+            if self.ollama is not None:
+                # /api/chat 路由支持顶层的 keep_alive 与 format 字段
+                final_model_name = "ollama_chat/" + model_name
+            self._model_names[model_name] = final_model_name
+        return self._model_names[model_name]
+
+    def json_mode_params(self) -> Dict[str, Any]:
+        """要求模型返回 JSON 对象的请求参数"""
+        if self.ollama is not None:
+            # 使用 Ollama 原生的 format 选项
+            return {"format": "json"}
+        if self.api_provider == APIProvider.OLLAMA:
+            # 普通模式下 Ollama 模型可能不支持 response_format
+            return {}
+        return {"response_format": {"type": "json_object"}}
+
+    def structured_output_params(
+        self, model_name: str, schema: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """要求模型按 JSON Schema 返回的请求参数；不支持时退回 json_mode_params"""
+        if not self.structured_outputs or model_name in self._schema_unsupported:
+            return self.json_mode_params()
+        if self.ollama is not None:
+            return {"format": schema}
+        # litellm 会把 json_schema 转换为普通模式下 Ollama 的 format 字段
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": schema.get("title", "response"),
+                    "schema": schema,
+                    "strict": True,
+                },
+            }
+        }
+
+    def set_max_concurrency(self, max_concurrency: int) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self._slots.resize(self.max_concurrency)
+
+    def warmup(self, model_name: str) -> None:
+        """预加载 Ollama 模型，并按 keep_alive 让其常驻；同一模型只执行一次"""
+        if self.ollama is None or model_name in self._warm_models:
+            return
+        with self._warm_lock:
+            if model_name in self._warm_models:
+                return
+
+            start = time.time()
+            if self.ollama.warmup:
+                # 不带 prompt 的 generate 请求只加载模型
+                response = self._get_http_client().post(
+                    f"{self.api_base}/api/generate",
+                    json={"model": model_name, "keep_alive": self.ollama.keep_alive},
+                )
+                response.raise_for_status()
+                print(
+                    f"warmed up ollama model {model_name} in {time.time() - start:.1f}s"
+                )
+
+            num_parallel = self.ollama.num_parallel or self.detect_parallel_slots(
+                model_name
+            )
+            self.set_max_concurrency(min(num_parallel, self.pool_size))
+            print(f"ollama parallel slots: {self.max_concurrency}")
+            self._warm_models.add(model_name)
+
+    def detect_parallel_slots(self, model_name: str) -> int:
+        """
+        探测 Ollama 服务端的并行槽位数。
+
+        优先读取 OLLAMA_NUM_PARALLEL（本机服务时有效）；否则同时发出若干个只生成
+        一个 token 的请求，与最快请求几乎同时完成的请求数即为并行槽位数。
+        """
+        assert self.ollama is not None
+        env_parallel = os.getenv("OLLAMA_NUM_PARALLEL")
+        if env_parallel and env_parallel.isdigit() and int(env_parallel) > 0:
+            return int(env_parallel)
+
+        def probe() -> float:
+            start = time.perf_counter()
+            self._get_http_client().post(
+                f"{self.api_base}/api/generate",
+                json={
+                    "model": model_name,
+                    "prompt": "ping",
+                    "stream": False,
+                    "keep_alive": self.ollama.keep_alive if self.ollama else None,
+                    "options": {"num_predict": 1},
+                },
+            ).raise_for_status()
+            return time.perf_counter() - start
+
+        try:
+            probes = self.ollama.max_probe_parallel
+            with ThreadPoolExecutor(max_workers=probes) as executor:
+                latencies = sorted(executor.map(lambda _: probe(), range(probes)))
+        except Exception as e:
+            print(f"failed to detect ollama parallel slots, using 1: {e}")
+            return 1
+
+        # 排队的请求至少要多等一整轮，以最快请求的 1.5 倍为界
+        first_wave = [t for t in latencies if t <= latencies[0] * 1.5]
+        return len(first_wave)
+
+    def completion_params(self, model_name: str, **kwargs: Any) -> Dict[str, Any]:
+        """构造一次 completion 调用的参数"""
+        params: Dict[str, Any] = {"model": self.model(model_name)}
+        if self.api_base:
+            params["api_base"] = self.api_base
+        if self.api_key:
+            params["api_key"] = self.api_key
+        self._ensure_clients()
+        if self._llm_client is not None:
+            params["client"] = self._llm_client
+        params.update(kwargs)
+        return params
+
+    def completion(
+        self, model_name: str, messages: List[Dict[str, str]], **kwargs: Any
+    ) -> Any:
+        # 首次导入 litellm 需要数秒，须在请求计时与截止时间之外完成
+        self._ensure_clients()
+        if self.ollama is not None:
+            self.warmup(model_name)
+            kwargs.setdefault("keep_alive", self.ollama.keep_alive)
+
+        try:
+            return self._dispatch(model_name, messages, kwargs)
+        except Exception as e:
+            if not _uses_schema(kwargs) or not _is_bad_request(e):
+                raise
+            with self._stats_lock:
+                self._schema_unsupported.add(model_name)
+            print(f"{model_name} rejected the JSON schema, using JSON mode: {e}")
+            kwargs = {
+                k: v
+                for k, v in kwargs.items()
+                if k not in ("response_format", "format")
+            }
+            kwargs.update(self.json_mode_params())
+            return self._dispatch(model_name, messages, kwargs)
+
+    def _dispatch(
+        self, model_name: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]
+    ) -> Any:
+        if self._executor is None:
+            return self._send(model_name, messages, kwargs)
+        return self._completion_with_deadline(model_name, messages, kwargs)
+
+    def _send(
+        self,
+        model_name: str,
+        messages: List[Dict[str, str]],
+        kwargs: Dict[str, Any],
+        started: Optional[threading.Event] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> Any:
+        import litellm
+
+        params = self.completion_params(model_name, messages=messages, **kwargs)
+        if self.request_timeout is not None:
+            # 让底层 HTTP 请求也在截止时间后中止
+            params.setdefault("timeout", self.request_timeout)
+
+        with profiler.span(profiler.WAIT_SLOT):
+            self._slots.acquire()
+        start: Optional[float] = None
+        try:
+            if started is not None:
+                started.set()
+            if cancelled is not None and cancelled.is_set():
+                # 排队期间调用方已超时或已拿到结果，不再发送
+                raise TimeoutError("request was cancelled before it was sent")
+            start = time.perf_counter()
+            with profiler.span(profiler.REQUEST, model=params["model"]):
+                return litellm.completion(**params)
+        finally:
+            self._slots.release()
+            if start is not None:
+                # 失败、超时与对冲落败的请求同样计入，只统计成功请求会低估分位数
+                with self._stats_lock:
+                    self._latencies.append(time.perf_counter() - start)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """当前的对冲等待时间；样本不足或未启用对冲时返回 None"""
+        if self.hedge is None:
+            return None
+        with self._stats_lock:
+            if len(self._latencies) < self.hedge.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.hedge.percentile))
+        return max(self.hedge.min_delay, latencies[index])
+
+    def _take_hedge_budget(self) -> bool:
+        assert self.hedge is not None
+        with self._stats_lock:
+            if self.num_hedges >= self.hedge.max_extra_fraction * self.num_requests:
+                return False
+            self.num_hedges += 1
+            return True
+
+    def _completion_with_deadline(
+        self, model_name: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]
+    ) -> Any:
+        assert self._executor is not None
+        with self._stats_lock:
+            self.num_requests += 1
+
+        started = threading.Event()
+        cancelled = threading.Event()
+        primary = self._executor.submit(
+            self._send, model_name, messages, kwargs, started, cancelled
+        )
+        # 主请求在拿到槽位前就失败时也要唤醒下面的等待
+        primary.add_done_callback(lambda _: started.set())
+        futures: List[Future] = [primary]
+
+        # 截止时间与对冲等待都从主请求拿到并发槽位开始计时，排队时间不计入
+        started.wait()
+        deadline = (
+            time.monotonic() + self.request_timeout
+            if self.request_timeout is not None
+            else None
+        )
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None:
+            assert self.hedge is not None
+            timeout = remaining()
+            wait(
+                futures,
+                timeout=hedge_delay if timeout is None else min(hedge_delay, timeout),
+            )
+            if not primary.done() and self._take_hedge_budget():
+                target = self.hedge.client or self
+                futures.append(
+                    self._executor.submit(
+                        target._send, model_name, messages, kwargs, None, cancelled
+                    )
+                )
+
+        error: Optional[BaseException] = None
+        while futures:
+            done, _ = wait(futures, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                cancelled.set()
+                for future in futures:
+                    future.cancel()
+                raise TimeoutError(
+                    f"request did not complete within {self.request_timeout}s"
+                )
+
+            for future in done:
+                futures.remove(future)
+                error = future.exception()
+                if error is None:
+                    # 取先成功的结果，尚未发出的副本直接取消
+                    cancelled.set()
+                    for other in futures:
+                        other.cancel()
+                    if future is not primary:
+                        with self._stats_lock:
+                            self.num_hedge_wins += 1
+                    return future.result()
+
+        assert error is not None
+        raise error
+
+    def batch_completion(
+        self, model_name: str, messages: List[List[Dict[str, str]]], **kwargs: Any
+    ) -> List[Any]:
+        """
+        并发执行多个请求，在途请求数受 max_concurrency 限制。
+        与 litellm.batch_completion 一致，失败的请求在结果中以异常对象返回。
+        """
+        self._ensure_clients()
+        if self.ollama is not None:
+            # 在开线程前完成预热，使并发度按探测到的槽位数确定
+            self.warmup(model_name)
+
+        workers = max(1, min(self.max_concurrency, len(messages)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self.completion, model_name, m, **kwargs)
+                for m in messages
+            ]
+
+        results: List[Any] = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._http_client is not None:
+            self._http_client.close()
+
+    def __enter__(self) -> "ProviderClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# 只有错误信息提到这些参数时才认为是不支持 JSON Schema，其他 400 照常抛出
+_SCHEMA_ERROR_KEYS = ("response_format", "json_schema")
+
+
+def _uses_schema(kwargs: Dict[str, Any]) -> bool:
+    response_format = kwargs.get("response_format")
+    if isinstance(response_format, dict):
+        return response_format.get("type") == "json_schema"
+    return isinstance(kwargs.get("format"), dict)
+
+
+def _is_bad_request(error: Exception) -> bool:
+    """提供商拒绝的是 JSON Schema 参数（而不是其他请求错误、网络或服务端错误）"""
+    rejected = getattr(error, "status_code", None) in (400, 422) or type(
+        error
+    ).__name__ in ("BadRequestError", "UnsupportedParamsError")
+    if not rejected:
+        return False
+    message = str(error).lower()
+    return any(key in message for key in _SCHEMA_ERROR_KEYS)
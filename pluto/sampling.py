@@ -0,0 +1,135 @@
+"""
+主题树叶子的抽样策略：不放回、每个叶子固定数量、按分支权重有放回抽样、
+按路径文本的多样性选择。
+有放回抽样使用 alias 方法，预处理 O(n)，每次抽取 O(1)，
+因此一棵中等规模的树也能驱动任意数量的样本。
+"""
+
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+UNIQUE = "unique"
+PER_LEAF = "per_leaf"
+WITH_REPLACEMENT = "with_replacement"
+DIVERSE = "diverse"
+
+
+@dataclass
+class SamplingArguments:
+    # unique: 不放回抽样（默认）；per_leaf: 每个叶子生成 samples_per_leaf 个样本；
+    # with_replacement: 按权重有放回抽样；diverse: 选出路径文本彼此差异最大的叶子
+    strategy: str = UNIQUE
+    samples_per_leaf: int = 1
+    # 顶层分支（根节点下的第一层）的权重，未列出的分支为 1.0
+    branch_weights: Optional[Dict[str, float]] = None
+    # 为 True 时各顶层分支按权重分配总概率，与分支下的叶子数无关
+    balance_branches: bool = False
+    seed: Optional[int] = None
+
+
+class AliasSampler:
+    """Vose 的 alias 方法：按给定权重抽取下标"""
+
+    def __init__(self, weights: List[float], rng: Optional[random.Random] = None):
+        if not weights or any(w < 0 for w in weights) or sum(weights) <= 0:
+            raise ValueError("weights must be non-negative and sum to a positive value")
+        self._rng: Any = rng or random
+        n = len(weights)
+        total = sum(weights)
+        prob = [w * n / total for w in weights]
+        alias = list(range(n))
+        small = [i for i, p in enumerate(prob) if p < 1.0]
+        large = [i for i, p in enumerate(prob) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            g = large.pop()
+            alias[s] = g
+            prob[g] += prob[s] - 1.0
+            (small if prob[g] < 1.0 else large).append(g)
+        # 剩余的桶只因浮点误差偏离 1
+        for i in small + large:
+            prob[i] = 1.0
+        self._prob = prob
+        self._alias = alias
+
+    def draw(self) -> int:
+        i = int(self._rng.random() * len(self._prob))
+        return i if self._rng.random() < self._prob[i] else self._alias[i]
+
+    def draw_many(self, k: int) -> List[int]:
+        return [self.draw() for _ in range(k)]
+
+
+def branch_of(path: List[str]) -> str:
+    """叶子所在的顶层分支；路径只有根节点时返回根节点"""
+    return path[1] if len(path) > 1 else path[0]
+
+
+def leaf_weights(tree_paths: List[List[str]], args: SamplingArguments) -> List[float]:
+    branch_weights = args.branch_weights or {}
+    counts: Dict[str, int] = {}
+    if args.balance_branches:
+        for path in tree_paths:
+            counts[branch_of(path)] = counts.get(branch_of(path), 0) + 1
+
+    weights = []
+    for path in tree_paths:
+        branch = branch_of(path)
+        weight = branch_weights.get(branch, 1.0)
+        if args.balance_branches:
+            weight /= counts[branch]
+        weights.append(weight)
+    return weights
+
+
+def sample_paths(
+    tree_paths: List[List[str]],
+    num_samples: Optional[int],
+    args: Optional[SamplingArguments] = None,
+) -> List[List[str]]:
+    """
+    按策略从叶子中抽取路径，每条路径对应一个待生成的样本。
+    per_leaf 策略的样本数固定为叶子数乘以 samples_per_leaf，忽略 num_samples。
+    """
+    args = args or SamplingArguments()
+    rng: Any = random.Random(args.seed) if args.seed is not None else random
+
+    if args.strategy == PER_LEAF:
+        if args.samples_per_leaf < 1:
+            raise ValueError("samples_per_leaf must be at least 1")
+        paths = [path for path in tree_paths for _ in range(args.samples_per_leaf)]
+        rng.shuffle(paths)
+        return paths
+
+    if num_samples is None:
+        raise Exception("no number of samples was specified")
+
+    if args.strategy == UNIQUE:
+        if num_samples > len(tree_paths):
+            raise Exception(
+                "num_steps * batch_size cannot be bigger than number of tree paths"
+            )
+        return rng.sample(tree_paths, num_samples)
+
+    if args.strategy == DIVERSE:
+        if num_samples > len(tree_paths):
+            raise Exception(
+                "num_steps * batch_size cannot be bigger than number of tree paths"
+            )
+        from .diversity import path_text, select_diverse
+
+        selected = select_diverse(
+            [path_text(path) for path in tree_paths],
+            num_samples,
+            start=rng.randrange(len(tree_paths)) if tree_paths else 0,
+        )
+        paths = [tree_paths[i] for i in selected]
+        rng.shuffle(paths)
+        return paths
+
+    if args.strategy == WITH_REPLACEMENT:
+        sampler = AliasSampler(leaf_weights(tree_paths, args), rng)
+        return [tree_paths[i] for i in sampler.draw_many(num_samples)]
+
+    raise ValueError(f"unknown sampling strategy: {args.strategy}")
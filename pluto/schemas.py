@@ -0,0 +1,47 @@
+"""
+结构化输出使用的 JSON Schema。title 用作 OpenAI json_schema 的 name。
+所有对象都列出全部 required 字段并禁止额外字段，满足 OpenAI strict 模式的要求。
+"""
+
+from typing import Any, Dict
+
+SAMPLE_SCHEMA: Dict[str, Any] = {
+    "title": "training_sample",
+    "type": "object",
+    "properties": {
+        "messages": {
+            "type": "array",
+            "minItems": 2,
+            "items": {
+                "type": "object",
+                "properties": {
+                    # 系统消息由引擎插入，模型只生成 user / assistant 消息
+                    "role": {"type": "string", "enum": ["user", "assistant"]},
+                    "content": {"type": "string"},
+                },
+                "required": ["role", "content"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["messages"],
+    "additionalProperties": False,
+}
+
+
+def subtopics_schema(num_subtopics: int) -> Dict[str, Any]:
+    """恰好 num_subtopics 个字符串的列表；OpenAI 要求顶层为对象，因此包在 subtopics 字段中"""
+    return {
+        "title": "subtopics",
+        "type": "object",
+        "properties": {
+            "subtopics": {
+                "type": "array",
+                "items": {"type": "string"},
+                "minItems": num_subtopics,
+                "maxItems": num_subtopics,
+            }
+        },
+        "required": ["subtopics"],
+        "additionalProperties": False,
+    }
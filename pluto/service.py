@@ -0,0 +1,454 @@
+"""
+常驻的本地生成服务：DataEngine、提供商客户端（连接池）与主题树在进程内保持常驻，
+prompt 模板只渲染一次，按需为给定的主题路径生成少量样本。
+
+并发到达的请求拆成单个样本的任务放入同一队列，调度线程最多等待 max_wait 秒
+把任务合并为一批（至多 max_batch_size 个），同时在途的批次不超过 max_in_flight；
+批次都在途时新任务继续排队，下一批因此更大。批次内每个样本是独立的请求，
+哪个先完成就先以 NDJSON 流式返回，不等待整批结束。
+
+HTTP 接口（TCP 或 Unix socket）：
+    POST /generate  {"path": [...], "count": 3}
+        每行 {"sample": ..., "metadata": ...} 或 {"error": ...}，
+        最后一行 {"done": true, "generated": n, "failed": k}
+    GET /metrics    请求数、批次大小、延迟 p50/p99 等
+    GET /health
+
+用法: python -m pluto.service --model gpt-4o-mini --system-prompt "..." --port 8765
+"""
+
+import argparse
+import json
+import os
+import queue
+import random
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .data_engine import DataEngine, EngineArguments
+from .dataset import Dataset
+from .prompts import SAMPLE_GENERATION_PROMPT
+from .provider import ProviderClient
+from .topic_tree import TopicTree, TopicTreeArguments
+from .types import APIProvider
+
+
+@dataclass
+class ServiceArguments:
+    model_name: str
+    num_example_demonstrations: int = 3
+    # 一批最多合并的样本数
+    max_batch_size: int = 32
+    # 第一个任务到达后等待更多任务合并的最长时间（秒）
+    max_wait: float = 0.02
+    # 同时在途的批次数
+    max_in_flight: int = 4
+    # 单个请求最多生成的样本数
+    max_count: int = 100
+    # 每个样本最多尝试的次数
+    max_attempts: int = 3
+    # 计算延迟分位数时保留的最近请求数
+    latency_window: int = 10000
+
+
+class _Request:
+    def __init__(self) -> None:
+        # 生成结果 (样本, 元数据)；None 表示该样本多次尝试后仍失败
+        self.results: "queue.Queue[Optional[Tuple[Dict, Dict]]]" = queue.Queue()
+
+
+@dataclass
+class _Job:
+    prompt: str
+    path: Optional[List[str]]
+    request: _Request
+    attempts: int = 0
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Metrics:
+    def __init__(self, window: int):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.active_requests = 0
+        self.samples = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.batched_jobs = 0
+        # 含有多个请求的任务的批次数
+        self.coalesced_batches = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.first_sample: Deque[float] = deque(maxlen=window)
+
+    def record_batch(self, jobs: List[_Job]) -> None:
+        with self.lock:
+            self.batches += 1
+            self.batched_jobs += len(jobs)
+            if len({id(job.request) for job in jobs}) > 1:
+                self.coalesced_batches += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            latencies = list(self.latencies)
+            first_sample = list(self.first_sample)
+            return {
+                "uptime": time.time() - self.started,
+                "requests": self.requests,
+                "active_requests": self.active_requests,
+                "samples": self.samples,
+                "failed": self.failed,
+                "retries": self.retries,
+                "batches": self.batches,
+                "mean_batch_size": self.batched_jobs / self.batches
+                if self.batches
+                else 0.0,
+                "coalesced_batches": self.coalesced_batches,
+                "latency_p50": _percentile(latencies, 0.5),
+                "latency_p99": _percentile(latencies, 0.99),
+                "first_sample_p50": _percentile(first_sample, 0.5),
+                "first_sample_p99": _percentile(first_sample, 0.99),
+            }
+
+
+class GenerationService:
+    def __init__(
+        self,
+        engine: DataEngine,
+        args: ServiceArguments,
+        client: Optional[ProviderClient] = None,
+        topic_tree: Optional[TopicTree] = None,
+        seed: Optional[int] = None,
+    ):
+        self.engine = engine
+        self.args = args
+        self.client = client or engine.client or ProviderClient()
+        engine.client = self.client
+        self.topic_tree = topic_tree
+        self._rng = random.Random(seed)
+        self.metrics = _Metrics(args.latency_window)
+
+        self._num_examples = args.num_example_demonstrations
+        if engine.args.example_data is None:
+            self._num_examples = 0
+        # 系统提示与附加指令对所有请求相同，只替换一次
+        self._template = SAMPLE_GENERATION_PROMPT.replace(
+            "{{{{system_prompt}}}}", engine.build_system_prompt()
+        ).replace("{{{{instructions}}}}", engine.build_custom_instructions_text())
+        # 主题树分支（路径前缀）到其下叶子的索引
+        self._leaves: Dict[Tuple[str, ...], List[List[str]]] = {}
+        if topic_tree is not None:
+            for path in topic_tree.tree_paths:
+                for depth in range(len(path) + 1):
+                    self._leaves.setdefault(tuple(path[:depth]), []).append(path)
+
+        self._pending: "queue.Queue[_Job]" = queue.Queue()
+        self._in_flight = threading.BoundedSemaphore(args.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=args.max_in_flight)
+        self._closed = threading.Event()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+        # 启动时就导入 litellm，首个请求不再承担数秒的导入开销
+        import litellm  # noqa: F401
+
+    def generate(
+        self, path: Optional[List[str]] = None, count: int = 1
+    ) -> Iterator[Optional[Tuple[Dict, Dict]]]:
+        """
+        为 path 生成 count 个样本，按完成顺序逐个返回 (样本, 元数据)，失败的样本为 None。
+        path 是主题树中的分支时，从该分支下的叶子中随机选取路径。
+        """
+        if count < 1 or count > self.args.max_count:
+            raise ValueError(f"count must be between 1 and {self.args.max_count}")
+        if self._closed.is_set():
+            raise Exception("generation service is closed")
+        start = time.perf_counter()
+        request = _Request()
+        with self.metrics.lock:
+            self.metrics.requests += 1
+            self.metrics.active_requests += 1
+        try:
+            for leaf in self._resolve_paths(path, count):
+                prompt = self.engine.build_prompt(
+                    data_creation_prompt=self._template,
+                    model_name=self.args.model_name,
+                    num_example_demonstrations=self._num_examples,
+                    subtopics_list=leaf,
+                )
+                self._pending.put(_Job(prompt, leaf, request))
+
+            for i in range(count):
+                result = request.results.get()
+                if i == 0:
+                    with self.metrics.lock:
+                        self.metrics.first_sample.append(time.perf_counter() - start)
+                yield result
+            with self.metrics.lock:
+                self.metrics.latencies.append(time.perf_counter() - start)
+        finally:
+            with self.metrics.lock:
+                self.metrics.active_requests -= 1
+
+    def _resolve_paths(
+        self, path: Optional[List[str]], count: int
+    ) -> List[Optional[List[str]]]:
+        leaves = self._leaves.get(tuple(path or []))
+        if leaves:
+            return [self._rng.choice(leaves) for _ in range(count)]
+        # 不在树中的路径（或没有主题树）按原样使用
+        return [path or None] * count
+
+    def _dispatch_loop(self) -> None:
+        while not self._closed.is_set():
+            try:
+                jobs = [self._pending.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.args.max_wait
+            while len(jobs) < self.args.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    jobs.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # 已满时阻塞在这里，后到的任务继续排队并合并进下一批
+            self._in_flight.acquire()
+            try:
+                self._executor.submit(self._run_batch, jobs)
+            except RuntimeError:
+                # 服务已关闭
+                self._in_flight.release()
+                for job in jobs:
+                    job.request.results.put(None)
+
+    def _run_batch(self, jobs: List[_Job]) -> None:
+        """批次中的每个任务是独立的请求，各自完成后立即交给所属的请求，不等整批"""
+        self.metrics.record_batch(jobs)
+        try:
+            results = self.engine.iter_samples(
+                self.args.model_name, [job.prompt for job in jobs], self.client
+            )
+            done = set()
+            try:
+                for i, result in results:
+                    done.add(i)
+                    self._complete(jobs[i], result)
+            except Exception as e:
+                print(f"error generating batch: {e}")
+                for i, job in enumerate(jobs):
+                    if i not in done:
+                        self._complete(job, None)
+        finally:
+            self._in_flight.release()
+
+    def _complete(self, job: _Job, result: Optional[Tuple[Dict, Dict]]) -> None:
+        if result is not None:
+            sample, provenance = result
+            metadata = self.engine.sample_metadata(self.args.model_name, job.path)
+            metadata.update(provenance)
+            with self.metrics.lock:
+                self.metrics.samples += 1
+            job.request.results.put((sample, metadata))
+            return
+        job.attempts += 1
+        if job.attempts < self.args.max_attempts and not self._closed.is_set():
+            with self.metrics.lock:
+                self.metrics.retries += 1
+            self._pending.put(job)
+            return
+        with self.metrics.lock:
+            self.metrics.failed += 1
+        job.request.results.put(None)
+
+    def make_server(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix_socket: Optional[str] = None,
+    ) -> socketserver.BaseServer:
+        """创建 HTTP 服务器（未启动）；给出 unix_socket 时监听该 Unix socket"""
+        handler = _make_handler(self)
+        if unix_socket is None:
+            server: socketserver.BaseServer = ThreadingHTTPServer((host, port), handler)
+        else:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            server = _UnixHTTPServer(unix_socket, handler)
+        return server
+
+    def serve(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix_socket: Optional[str] = None,
+    ) -> None:
+        server = self.make_server(host, port, unix_socket)
+        print(f"serving on {unix_socket or f'http://{host}:{port}'}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.close()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+        # 仍在排队的任务不再生成
+        while True:
+            try:
+                self._pending.get_nowait().request.results.put(None)
+            except queue.Empty:
+                break
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _make_handler(service: GenerationService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 以便分块传输与连接复用
+        protocol_version = "HTTP/1.1"
+
+        def address_string(self) -> str:
+            # Unix socket 的客户端地址为空
+            return str(self.client_address[0]) if self.client_address else "unix"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path == "/metrics":
+                self._send_json(200, service.metrics.snapshot())
+            elif self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self) -> None:
+            if self.path != "/generate":
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("request body must be a JSON object")
+                path = body.get("path")
+                count = int(body.get("count", 1))
+                if path is not None and not (
+                    isinstance(path, list) and all(isinstance(p, str) for p in path)
+                ):
+                    raise ValueError("path must be a list of strings")
+                results = service.generate(path, count)
+                # 参数检查在生成器第一次执行时进行
+                first = next(results)
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            except Exception as e:
+                self._send_json(503, {"error": str(e)})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            generated = 0
+            failed = 0
+            result = first
+            while True:
+                if result is None:
+                    failed += 1
+                    self._send_chunk({"error": "error generating sample"})
+                else:
+                    generated += 1
+                    self._send_chunk({"sample": result[0], "metadata": result[1]})
+                try:
+                    result = next(results)
+                except StopIteration:
+                    break
+            self._send_chunk({"done": True, "generated": generated, "failed": failed})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _send_chunk(self, payload: Dict) -> None:
+            data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: Dict) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="常驻的本地生成服务")
+    parser.add_argument("--model", required=True, help="生成样本的模型")
+    parser.add_argument("--system-prompt", required=True)
+    parser.add_argument("--instructions", default=None)
+    parser.add_argument("--examples", help="示例数据 JSONL 文件")
+    parser.add_argument("--tree", help="TopicTree.save 写出的主题树文件")
+    parser.add_argument(
+        "--provider",
+        default=APIProvider.DEFAULT.value,
+        choices=[p.value for p in APIProvider],
+    )
+    parser.add_argument("--api-base", default=None)
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="监听 Unix socket 而不是 TCP 端口")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait", type=float, default=0.02)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    client = ProviderClient(APIProvider(args.provider), args.api_base, args.api_key)
+    examples = Dataset.from_jsonl(args.examples) if args.examples else None
+    engine = DataEngine(
+        EngineArguments(args.instructions, args.system_prompt, examples), client=client
+    )
+    topic_tree = None
+    if args.tree:
+        topic_tree = TopicTree(TopicTreeArguments(root_prompt=""), client=client)
+        topic_tree.load(args.tree)
+    service = GenerationService(
+        engine,
+        ServiceArguments(
+            args.model,
+            max_batch_size=args.max_batch_size,
+            max_wait=args.max_wait,
+            max_in_flight=args.max_in_flight,
+        ),
+        client=client,
+        topic_tree=topic_tree,
+    )
+    service.serve(args.host, args.port, args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
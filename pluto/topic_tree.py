@@ -1,12 +1,23 @@
-import litellm
 import json
-from dataclasses import dataclass
-import os
-from typing import List, Optional, Tuple
-from .utils import extract_list
-from .prompts import TREE_GENERATION_PROMPT
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+from . import profiler
+from .cascade import ModelCascade
+from .utils import extract_dict, extract_list
+from .prompts import (
+    BATCH_TREE_GENERATION_PROMPT,
+    NESTED_TREE_GENERATION_PROMPT,
+    TREE_GENERATION_PROMPT,
+    TREE_WIDENING_PROMPT,
+)
+from .provider import ProviderClient
+from .schemas import subtopics_schema
 from .types import APIProvider
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 @dataclass
 class TopicTreeArguments:
@@ -14,26 +25,249 @@ class TopicTreeArguments:
     model_system_prompt: Optional[str] = None
     tree_degree: int = 10
     tree_depth: int = 3
+    # 每次模型调用展开的层数；大于 1 时一次请求返回嵌套的多层子树
+    levels_per_call: int = 1
+    # 每次模型调用展开的节点数；大于 1 时逐层建树，一次请求展开多个兄弟节点
+    expansion_batch_size: int = 1
     # API 提供商配置
     api_provider: APIProvider = APIProvider.DEFAULT
     api_base: Optional[str] = None
     api_key: Optional[str] = None
 
 
+@dataclass
+class _Node:
+    """由叶子路径推出的内部节点信息"""
+
+    # 现有子节点，保持出现顺序
+    children: List[str] = field(default_factory=list)
+    seen: Set[str] = field(default_factory=set)
+    # 该节点到最深叶子的层数
+    depth: int = 0
+    # 该节点下最后一个叶子在 tree_paths 中的下标
+    last: int = -1
+
+
 class TopicTree:
-    def __init__(self, args: TopicTreeArguments):
+    def __init__(
+        self,
+        args: TopicTreeArguments,
+        client: Optional[ProviderClient] = None,
+        cascade: Optional[ModelCascade] = None,
+    ):
         self.args = args
         self.tree_paths: List[List[str]] = []
+        # 可与 DataEngine 共享的提供商客户端；传入时忽略 args 中的提供商配置
+        self.client = client
+        # 设置模型级联时忽略 build_tree 的模型参数与 args 中的提供商配置
+        self.cascade = cascade
 
     def build_tree(self, model_name: str = "gpt-3.5-turbo-1106") -> None:
-        self.tree_paths = self.build_subtree(
+        if self.args.expansion_batch_size > 1:
+            if self.args.levels_per_call > 1:
+                raise ValueError(
+                    "levels_per_call and expansion_batch_size cannot both be greater than 1"
+                )
+            self.tree_paths = self.build_tree_batched(model_name)
+        else:
+            self.tree_paths = self.build_subtree(
+                model_name,
+                [self.args.root_prompt],
+                self.args.model_system_prompt,
+                self.args.tree_degree,
+                self.args.tree_depth,
+            )
+        if self.cascade is not None:
+            print(self.cascade.summary())
+
+    def build_tree_batched(self, model_name: str) -> List[List[str]]:
+        """逐层建树；同一层中相邻的节点（即兄弟节点）合并到一次请求中展开"""
+        frontier = [[self.args.root_prompt]]
+        batch_size = self.args.expansion_batch_size
+        for depth in range(self.args.tree_depth):
+            print(f"expanding {len(frontier)} nodes at depth {depth}")
+            next_frontier = []
+            for start in range(0, len(frontier), batch_size):
+                node_paths = frontier[start : start + batch_size]
+                subtopics = self.get_subtopics_batch(
+                    system_prompt=self.args.model_system_prompt,
+                    node_paths=node_paths,
+                    num_subtopics=self.args.tree_degree,
+                    model_name=model_name,
+                )
+                for node_path, subnodes in zip(node_paths, subtopics):
+                    next_frontier.extend(node_path + [sub] for sub in subnodes)
+            frontier = next_frontier
+        return frontier
+
+    def deepen(self, model_name: str = "gpt-3.5-turbo-1106", levels: int = 1) -> None:
+        """在每个现有叶子下再展开 levels 层；展开失败的叶子保持不变"""
+        if levels < 1:
+            return
+
+        def grow(leaf: List[str]) -> List[List[str]]:
+            paths = self.build_subtree(
+                model_name,
+                leaf,
+                self.args.model_system_prompt,
+                self.args.tree_degree,
+                levels,
+            )
+            return paths or [leaf]
+
+        grown = self._map_nodes(grow, self.tree_paths)
+        self.tree_paths = [path for paths in grown for path in paths]
+        if self.cascade is not None:
+            print(self.cascade.summary())
+
+    def widen(
+        self,
+        model_name: str = "gpt-3.5-turbo-1106",
+        num_subtopics: Optional[int] = None,
+        node_paths: Optional[List[List[str]]] = None,
+    ) -> None:
+        """
+        为已有节点追加 num_subtopics（默认 tree_degree）个新子主题，请求中附带现有的
+        子主题以避免重复；新子主题展开到与其兄弟节点相同的深度。
+        node_paths 默认为所有叶子的父节点，传入 [[root_prompt]] 则增加新的顶层分支。
+        """
+        num_subtopics = num_subtopics or self.args.tree_degree
+        nodes = self._node_index()
+        if node_paths is None:
+            node_paths = self._unique([path[:-1] for path in self.tree_paths])
+        for node_path in node_paths:
+            if tuple(node_path) not in nodes:
+                raise ValueError(f"not an inner node: {' -> '.join(node_path)}")
+
+        def grow(node_path: List[str]) -> List[List[str]]:
+            node = nodes[tuple(node_path)]
+            existing = list(node.children)
+            depth = node.depth
+            subtopics = self.get_additional_subtopics(
+                system_prompt=self.args.model_system_prompt,
+                node_path=node_path,
+                existing_subtopics=existing,
+                num_subtopics=num_subtopics,
+                model_name=model_name,
+            )
+            result = []
+            for sub in subtopics:
+                paths = self.build_subtree(
+                    model_name,
+                    node_path + [sub],
+                    self.args.model_system_prompt,
+                    self.args.tree_degree,
+                    depth - 1,
+                )
+                result.extend(paths)
+            return result
+
+        grown = self._map_nodes(grow, node_paths)
+        # 新叶子插在对应节点最后一个现有叶子之后；嵌套的节点中较深的排在前面
+        inserts: Dict[int, List[List[str]]] = {}
+        order = sorted(range(len(node_paths)), key=lambda i: -len(node_paths[i]))
+        for i in order:
+            last = nodes[tuple(node_paths[i])].last
+            inserts.setdefault(last, []).extend(grown[i])
+        tree_paths = []
+        for j, path in enumerate(self.tree_paths):
+            tree_paths.append(path)
+            tree_paths.extend(inserts.get(j, []))
+        self.tree_paths = tree_paths
+        if self.cascade is not None:
+            print(self.cascade.summary())
+
+    def regrow_branch(
+        self,
+        node_path: List[str],
+        model_name: str = "gpt-3.5-turbo-1106",
+        depth: Optional[int] = None,
+    ) -> None:
+        """
+        丢弃 node_path 以下的全部节点并重新展开 depth 层（默认与原来的深度相同），
+        node_path 本身及树的其余部分保持不变。
+        """
+        indices = [
+            j
+            for j, path in enumerate(self.tree_paths)
+            if path[: len(node_path)] == node_path
+        ]
+        if not indices:
+            raise ValueError(f"node not in tree: {' -> '.join(node_path)}")
+        depth = self._subtree_depth(node_path) if depth is None else depth
+        if depth < 1:
+            raise ValueError("depth must be at least 1 to regrow a leaf")
+
+        paths = self.build_subtree(
             model_name,
-            [self.args.root_prompt],
+            node_path,
             self.args.model_system_prompt,
             self.args.tree_degree,
-            self.args.tree_depth,
+            depth,
+        )
+        # 新的子树放在原子树第一个叶子的位置；展开失败时 node_path 成为叶子
+        removed = set(indices)
+        tree_paths = self.tree_paths[: indices[0]] + (paths or [node_path])
+        tree_paths.extend(
+            path
+            for j, path in enumerate(self.tree_paths)
+            if j > indices[0] and j not in removed
+        )
+        self.tree_paths = tree_paths
+        if self.cascade is not None:
+            print(self.cascade.summary())
+
+    def _node_index(self) -> Dict[Tuple[str, ...], _Node]:
+        """一次遍历叶子路径，得到每个内部节点的子节点、深度与最后一个叶子"""
+        nodes: Dict[Tuple[str, ...], _Node] = {}
+        for j, path in enumerate(self.tree_paths):
+            for n in range(len(path)):
+                node = nodes.get(tuple(path[:n]))
+                if node is None:
+                    node = nodes[tuple(path[:n])] = _Node()
+                if path[n] not in node.seen:
+                    node.seen.add(path[n])
+                    node.children.append(path[n])
+                node.depth = max(node.depth, len(path) - n)
+                node.last = j
+        return nodes
+
+    def _subtree_depth(self, node_path: List[str]) -> int:
+        n = len(node_path)
+        return max(
+            (len(p) - n for p in self.tree_paths if p[:n] == node_path), default=0
         )
 
+    @staticmethod
+    def _unique(items: List[List[str]]) -> List[List[str]]:
+        seen: Set[Tuple[str, ...]] = set()
+        result: List[List[str]] = []
+        for item in items:
+            if tuple(item) not in seen:
+                seen.add(tuple(item))
+                result.append(item)
+        return result
+
+    def _map_nodes(self, fn: Callable[[T], R], items: List[T]) -> List[R]:
+        """并行处理多个节点；并发上限由客户端的请求槽位决定"""
+        if self.cascade is not None:
+            workers = self.cascade.tiers[0].client.max_concurrency
+        else:
+            workers = self._get_client().max_concurrency
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items)))) as pool:
+            return list(pool.map(fn, items))
+
+    def expand_node(self, model_name: str, node_path: List[str]) -> List[List[str]]:
+        """只展开一层，返回子节点路径；供与数据生成流水线并行的建树使用"""
+        with profiler.span("expand_node", path=node_path):
+            subnodes = self.get_subtopics(
+                system_prompt=self.args.model_system_prompt,
+                node_path=node_path,
+                num_subtopics=self.args.tree_degree,
+                model_name=model_name,
+            )
+        return [node_path + [sub] for sub in subnodes]
+
     def build_subtree(
         self,
         model_name: str,
@@ -46,23 +280,127 @@ class TopicTree:
         if subtree_depth == 0:
             return [node_path]
 
-        else:
-            subnodes = self.get_subtopics(
+        with profiler.span("build_subtree", path=node_path, depth=subtree_depth):
+            return self._build_subtree(
+                model_name, node_path, system_prompt, tree_degree, subtree_depth
+            )
+
+    def _build_subtree(
+        self,
+        model_name: str,
+        node_path: List[str],
+        system_prompt: Optional[str],
+        tree_degree: int,
+        subtree_depth: int,
+    ) -> List[List[str]]:
+        num_levels = min(self.args.levels_per_call, subtree_depth)
+        if num_levels > 1:
+            nested = self.get_nested_subtopics(
                 system_prompt=system_prompt,
                 node_path=node_path,
                 num_subtopics=tree_degree,
+                num_levels=num_levels,
                 model_name=model_name,
             )
-            updated_node_paths = [node_path + [sub] for sub in subnodes]
+            if nested is not None:
+                return self._expand_nested(
+                    model_name,
+                    node_path,
+                    nested,
+                    num_levels,
+                    system_prompt,
+                    tree_degree,
+                    subtree_depth,
+                )
+            # 整个响应无法解析时退回逐节点展开
+
+        return self._expand_single_level(
+            model_name, node_path, system_prompt, tree_degree, subtree_depth
+        )
+
+    def _expand_single_level(
+        self,
+        model_name: str,
+        node_path: List[str],
+        system_prompt: Optional[str],
+        tree_degree: int,
+        subtree_depth: int,
+    ) -> List[List[str]]:
+        subnodes = self.get_subtopics(
+            system_prompt=system_prompt,
+            node_path=node_path,
+            num_subtopics=tree_degree,
+            model_name=model_name,
+        )
+        return self._expand_children(
+            model_name, node_path, subnodes, system_prompt, tree_degree, subtree_depth
+        )
+
+    def _expand_children(
+        self,
+        model_name: str,
+        node_path: List[str],
+        subnodes: List[str],
+        system_prompt: Optional[str],
+        tree_degree: int,
+        subtree_depth: int,
+    ) -> List[List[str]]:
+        updated_node_paths = [node_path + [sub] for sub in subnodes]
+        result = []
+        for path in updated_node_paths:
+            result.extend(
+                self.build_subtree(
+                    model_name, path, system_prompt, tree_degree, subtree_depth - 1
+                )
+            )
+        return result
+
+    def _expand_nested(
+        self,
+        model_name: str,
+        node_path: List[str],
+        nested: Any,
+        num_levels: int,
+        system_prompt: Optional[str],
+        tree_degree: int,
+        subtree_depth: int,
+    ) -> List[List[str]]:
+        """
+        把一次请求返回的嵌套子树展开为路径。nested 应描述 node_path 以下的
+        num_levels 层；形状不对的部分退回逐节点展开，只为这些节点重新请求。
+        """
+        if _is_subtopic_list(nested):
+            # 只给出了一层（或已到最底层）：保留这一层，其余层级继续展开
+            return self._expand_children(
+                model_name, node_path, nested, system_prompt, tree_degree, subtree_depth
+            )
+
+        if (
+            num_levels > 1
+            and isinstance(nested, dict)
+            and nested
+            and all(isinstance(sub, str) and sub for sub in nested)
+        ):
             result = []
-            for path in updated_node_paths:
+            for sub, children in nested.items():
                 result.extend(
-                    self.build_subtree(
-                        model_name, path, system_prompt, tree_degree, subtree_depth - 1
+                    self._expand_nested(
+                        model_name,
+                        node_path + [sub],
+                        children,
+                        num_levels - 1,
+                        system_prompt,
+                        tree_degree,
+                        subtree_depth - 1,
                     )
                 )
             return result
 
+        print(f"malformed nested subtopics for path: {' -> '.join(node_path)}")
+        return self._expand_single_level(
+            model_name, node_path, system_prompt, tree_degree, subtree_depth
+        )
+
     def get_subtopics(
         self,
         system_prompt: Optional[str],
@@ -70,87 +408,250 @@ class TopicTree:
         num_subtopics: int,
         model_name: str,
     ) -> List[str]:
-        prompt = TREE_GENERATION_PROMPT
+        with profiler.span(profiler.BUILD_PROMPT):
+            prompt = TREE_GENERATION_PROMPT
 
-        prompt = prompt.replace("{{{{system_prompt}}}}", system_prompt or "")
-        prompt = prompt.replace("{{{{subtopics_list}}}}", " -> ".join(node_path))
-        prompt = prompt.replace("{{{{num_subtopics}}}}", str(num_subtopics))
+            prompt = prompt.replace("{{{{system_prompt}}}}", system_prompt or "")
+            prompt = prompt.replace("{{{{subtopics_list}}}}", " -> ".join(node_path))
+            prompt = prompt.replace("{{{{num_subtopics}}}}", str(num_subtopics))
 
-        # 根据 API 提供商配置模型名称和参数
-        final_model_name, final_api_base, final_api_key = self._configure_api_provider(
-            model_name, self.args.api_provider, self.args.api_base, self.args.api_key
+        schema = subtopics_schema(num_subtopics)
+        if self.cascade is not None:
+            subtopics = self.cascade.completion(
+                [{"role": "user", "content": prompt}],
+                self._parse_subtopics,
+                schema=schema,
+                max_tokens=1000,
+            )
+            return subtopics if subtopics is not None else []
+
+        client = self._get_client()
+        content = self._complete(
+            model_name,
+            prompt,
+            max_tokens=1000,
+            **client.structured_output_params(model_name, schema),
         )
+        with profiler.span(profiler.PARSE):
+            result = _extract_subtopics(content)
+        return result if result is not None else []
 
-        # 构建参数
-        completion_params = {
-            "model": final_model_name,
-            "max_tokens": 1000,
-            "messages": [{"role": "user", "content": prompt}],
-        }
+    def get_additional_subtopics(
+        self,
+        system_prompt: Optional[str],
+        node_path: List[str],
+        existing_subtopics: List[str],
+        num_subtopics: int,
+        model_name: str,
+    ) -> List[str]:
+        """为节点生成与现有子主题不重复的新子主题"""
+        with profiler.span(profiler.BUILD_PROMPT):
+            prompt = TREE_WIDENING_PROMPT
+            prompt = prompt.replace("{{{{system_prompt}}}}", system_prompt or "")
+            prompt = prompt.replace("{{{{subtopics_list}}}}", " -> ".join(node_path))
+            prompt = prompt.replace(
+                "{{{{existing_subtopics}}}}",
+                json.dumps(existing_subtopics, ensure_ascii=False),
+            )
+            prompt = prompt.replace("{{{{num_subtopics}}}}", str(num_subtopics))
 
-        # 根据 API 提供商添加特定参数
-        if final_api_base:
-            completion_params["api_base"] = final_api_base
-        if final_api_key:
-            completion_params["api_key"] = final_api_key
+        schema = subtopics_schema(num_subtopics)
+        if self.cascade is not None:
+            result = self.cascade.completion(
+                [{"role": "user", "content": prompt}],
+                self._parse_subtopics,
+                schema=schema,
+                max_tokens=1000,
+            )
+        else:
+            client = self._get_client()
+            content = self._complete(
+                model_name,
+                prompt,
+                max_tokens=1000,
+                **client.structured_output_params(model_name, schema),
+            )
+            with profiler.span(profiler.PARSE):
+                result = _extract_subtopics(content)
 
-        response = litellm.completion(**completion_params)
+        # 模型仍可能返回已有的子主题，按不区分大小写的比较去掉
+        seen = {sub.strip().lower() for sub in existing_subtopics}
+        new = []
+        for sub in result or []:
+            if isinstance(sub, str) and sub.strip().lower() not in seen:
+                seen.add(sub.strip().lower())
+                new.append(sub)
+        return new
 
-        result = extract_list(response.choices[0].message.content)
-        return result if result is not None else []
+    def _parse_subtopics(self, response: Any) -> List[str]:
+        """抽取子主题列表；结果不是非空的字符串列表时抛出异常，供模型级联升级"""
+        with profiler.span(profiler.PARSE):
+            result = _extract_subtopics(response.choices[0].message.content)
+        if not result or not all(isinstance(sub, str) for sub in result):
+            raise ValueError(f"malformed subtopic list: {result}")
+        return result
+
+    def get_subtopics_batch(
+        self,
+        system_prompt: Optional[str],
+        node_paths: List[List[str]],
+        num_subtopics: int,
+        model_name: str,
+    ) -> List[List[str]]:
+        """
+        一次请求为多个节点生成子主题，返回与 node_paths 对应的子主题列表。
+        响应中缺失或格式不对的节点会再批量请求一次，仍失败的逐个请求。
+        """
+        results: List[Optional[List[str]]] = [None] * len(node_paths)
+        for _ in range(2):
+            pending = [i for i, result in enumerate(results) if result is None]
+            if len(pending) <= 1:
+                break
+
+            with profiler.span(profiler.BUILD_PROMPT):
+                prompt = BATCH_TREE_GENERATION_PROMPT
+                prompt = prompt.replace("{{{{system_prompt}}}}", system_prompt or "")
+                prompt = prompt.replace(
+                    "{{{{subtopics_lists}}}}",
+                    "\n".join(
+                        f"{n + 1}: {' -> '.join(node_paths[i])}"
+                        for n, i in enumerate(pending)
+                    ),
+                )
+                prompt = prompt.replace("{{{{num_subtopics}}}}", str(num_subtopics))
+            max_tokens = 200 + 20 * num_subtopics * len(pending)
+
+            if self.cascade is not None:
+                mapping = self.cascade.completion(
+                    [{"role": "user", "content": prompt}],
+                    self._parse_nested_subtopics,
+                    json_mode=True,
+                    max_tokens=max_tokens,
+                )
+            else:
+                client = self._get_client()
+                content = self._complete(
+                    model_name,
+                    prompt,
+                    max_tokens=max_tokens,
+                    **client.json_mode_params(),
+                )
+                with profiler.span(profiler.PARSE):
+                    mapping = extract_dict(content)
+
+            for n, i in enumerate(pending):
+                subnodes = (mapping or {}).get(str(n + 1))
+                if _is_subtopic_list(subnodes):
+                    results[i] = subnodes
+
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = self.get_subtopics(
+                    system_prompt=system_prompt,
+                    node_path=node_paths[i],
+                    num_subtopics=num_subtopics,
+                    model_name=model_name,
+                )
+        return [result or [] for result in results]
+
+    def get_nested_subtopics(
+        self,
+        system_prompt: Optional[str],
+        node_path: List[str],
+        num_subtopics: int,
+        num_levels: int,
+        model_name: str,
+    ) -> Optional[Dict[str, Any]]:
+        """一次请求生成 node_path 以下 num_levels 层的嵌套子树；无法解析时返回 None"""
+        with profiler.span(profiler.BUILD_PROMPT):
+            prompt = NESTED_TREE_GENERATION_PROMPT
+
+            prompt = prompt.replace("{{{{system_prompt}}}}", system_prompt or "")
+            prompt = prompt.replace("{{{{subtopics_list}}}}", " -> ".join(node_path))
+            prompt = prompt.replace("{{{{num_subtopics}}}}", str(num_subtopics))
+            prompt = prompt.replace("{{{{num_levels}}}}", str(num_levels))
+
+        # 按节点数估计输出长度，每个子主题约十几个 token
+        num_nodes = sum(num_subtopics**level for level in range(1, num_levels + 1))
+        max_tokens = 200 + 20 * num_nodes
+
+        if self.cascade is not None:
+            return self.cascade.completion(
+                [{"role": "user", "content": prompt}],
+                self._parse_nested_subtopics,
+                json_mode=True,
+                max_tokens=max_tokens,
+            )
+
+        client = self._get_client()
+        content = self._complete(
+            model_name, prompt, max_tokens=max_tokens, **client.json_mode_params()
+        )
+        with profiler.span(profiler.PARSE):
+            return extract_dict(content)
+
+    def _complete(self, model_name: str, prompt: str, **kwargs: Any) -> str:
+        """发送一次请求并返回文本；超过客户端的请求截止时间时重试"""
+        for j in range(3):
+            try:
+                response = self._get_client().completion(
+                    model_name, [{"role": "user", "content": prompt}], **kwargs
+                )
+                break
+            except TimeoutError as e:
+                # 重新发起而不是卡住整棵树
+                print(f"{e}, retrying...")
+                if j == 2:
+                    raise
+        return response.choices[0].message.content
+
+    def _parse_nested_subtopics(self, response: Any) -> Dict[str, Any]:
+        with profiler.span(profiler.PARSE):
+            result = extract_dict(response.choices[0].message.content)
+        if not result:
+            raise ValueError("malformed nested subtopics")
+        return result
 
     def save(self, save_path: str) -> None:
         with open(save_path, "w", encoding="utf-8") as f:
             for path in self.tree_paths:
                 f.write(json.dumps(dict(path=path), ensure_ascii=False) + "\n")
 
-    def _configure_api_provider(
-        self,
-        model_name: str,
-        api_provider: APIProvider,
-        api_base: Optional[str],
-        api_key: Optional[str],
-    ) -> Tuple[str, Optional[str], Optional[str]]:
-        """根据 API 提供商配置模型名称和参数"""
-        
-        final_model_name: str
-        final_api_base: Optional[str]
-        final_api_key: Optional[str]
-
-        if api_provider == APIProvider.OLLAMA:
-            # Ollama 配置
-            final_model_name = f"ollama/{model_name}"
-            final_api_base = api_base or "http://localhost:11434"
-            final_api_key = api_key  # Ollama 通常不需要 API key
-
-        elif api_provider == APIProvider.OPENAI_COMPATIBLE:
-            # 自定义 base URL 的 OpenAI 兼容接口
-            final_model_name = f"openai/{model_name}"
-            if not api_base:
-                raise ValueError("api_base is required for OpenAI compatible provider")
-            if not api_key:
-                raise ValueError("api_key is required for OpenAI compatible provider")
-            final_api_base = api_base
-            final_api_key = api_key
-
-        elif api_provider == APIProvider.OPENROUTER:
-            # OpenRouter 配置
-            final_model_name = f"openrouter/{model_name}"
-            final_api_base = api_base or "https://openrouter.ai/api/v1"
-            final_api_key = api_key
-
-            if not final_api_key:
-                # 尝试从环境变量获取
-                final_api_key = os.getenv("OPENROUTER_API_KEY")
-                if not final_api_key:
-                    raise ValueError(
-                        "api_key or OPENROUTER_API_KEY environment variable is required for OpenRouter provider"
-                    )
+    def load(self, load_path: str) -> None:
+        """读取 save 写出的叶子路径，之后可继续 deepen / widen / regrow_branch"""
+        with open(load_path, "r", encoding="utf-8") as f:
+            self.tree_paths = [json.loads(line)["path"] for line in f if line.strip()]
+
+    def _get_client(self) -> ProviderClient:
+        """优先使用共享的客户端，否则按 args 中的提供商配置创建一个"""
+        if self.client is None:
+            self.client = ProviderClient(
+                self.args.api_provider, self.args.api_base, self.args.api_key
+            )
+        return self.client
+
+
+def _extract_subtopics(content: str) -> Optional[List[Any]]:
+    """结构化输出为 {"subtopics": [...]}；不支持 JSON Schema 的模型返回的文本中抽取列表"""
+    try:
+        result = json.loads(content)
+    except ValueError:
+        result = None
+    if isinstance(result, dict):
+        result = result.get("subtopics")
+    if isinstance(result, list):
+        return result
+    try:
+        return extract_list(content)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError) as e:
+        # literal_eval 对畸形或嵌套过深的输入会抛出这些异常
+        print(f"failed to parse subtopics: {e}")
+        return None
 
-        else:  # APIProvider.DEFAULT
-            # 默认配置（OpenAI/Azure 等）
-            final_model_name = model_name
-            final_api_base = api_base
-            final_api_key = api_key
 
-        return final_model_name, final_api_base, final_api_key
+def _is_subtopic_list(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) > 0
+        and all(isinstance(sub, str) and sub for sub in value)
+    )
@@ -1,6 +1,7 @@
 import ast
+import json
 import re
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 
 
 def extract_list(input_string: str) -> Optional[List[Any]]:
@@ -12,6 +13,7 @@ def extract_list(input_string: str) -> Optional[List[Any]]:
 
     # Count the brackets to find the end of the list
     count = 0
+    end = -1
     for i, char in enumerate(input_string[start:]):
         if char == "[":
             count += 1
@@ -20,13 +22,52 @@ def extract_list(input_string: str) -> Optional[List[Any]]:
         if count == 0:
             end = i + start + 1
             break
-            # Extract the list
+    if end == -1:
+        print("Unterminated Python list in the input string.")
+        return None
+
+    # Extract the list
     found_list_str = input_string[start:end]
     found_list = ast.literal_eval(found_list_str)
 
     return found_list
 
 
+def extract_dict(input_string: str) -> Optional[Dict[str, Any]]:
+    # Find the start of the object
+    start = input_string.find("{")
+    if start == -1:
+        print("No json object found in the input string.")
+        return None
+
+    # Count the braces to find the end of the object
+    count = 0
+    end = -1
+    for i, char in enumerate(input_string[start:]):
+        if char == "{":
+            count += 1
+        elif char == "}":
+            count -= 1
+        if count == 0:
+            end = i + start + 1
+            break
+    if end == -1:
+        print("Unterminated json object in the input string.")
+        return None
+
+    found_dict_str = input_string[start:end]
+    try:
+        found_dict = json.loads(found_dict_str)
+    except json.JSONDecodeError:
+        # Fall back to a Python literal, e.g. single-quoted strings
+        try:
+            found_dict = ast.literal_eval(found_dict_str)
+        except (ValueError, SyntaxError):
+            return None
+
+    return found_dict if isinstance(found_dict, dict) else None
+
+
 def replace_linebreaks(input_string: str) -> str:
     return input_string.replace("\n", "\\n")
 
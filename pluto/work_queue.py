@@ -0,0 +1,243 @@
+"""
+基于 SQLite 的持久化工作队列，支持多进程（共享文件系统时也可多机）并行生成数据
+"""
+
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from .dataset import Dataset
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    path TEXT,
+    count INTEGER NOT NULL DEFAULT 1,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (state, lease_expires);
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL REFERENCES items (id),
+    sample TEXT NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_item ON samples (item_id);
+"""
+
+
+@dataclass
+class WorkItem:
+    id: int
+    # 主题树叶子路径；无主题树时为 None
+    path: Optional[List[str]]
+    # 该任务要生成的样本数
+    count: int = 1
+
+
+@dataclass
+class Lease:
+    token: str
+    worker_id: str
+    items: List[WorkItem] = field(default_factory=list)
+
+
+class WorkQueue:
+    """
+    工作队列。任务状态为 pending -> leased -> done / failed；
+    租约超时未提交的任务（例如 worker 崩溃）会被重新领取，
+    超过 max_attempts 次仍未完成的任务标记为 failed。
+    """
+
+    def __init__(
+        self, db_path: str, lease_timeout: float = 600.0, max_attempts: int = 3
+    ):
+        self.db_path = db_path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            # WAL 允许读写并发；注意网络文件系统上的 SQLite 锁并不可靠
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # 旧版本创建的队列没有 metadata 列
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(samples)")]
+            if "metadata" not in columns:
+                conn.execute("ALTER TABLE samples ADD COLUMN metadata TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 每次操作使用独立连接，保证 fork 出的 worker 进程之间不共享连接
+        conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            # IMMEDIATE 事务在开始时即拿到写锁，避免多个 worker 领取到同一任务
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue_paths(self, tree_paths: List[List[str]]) -> int:
+        """每个叶子路径作为一个任务入队，生成一个样本"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO items (path, count) VALUES (?, 1)",
+                [(json.dumps(path, ensure_ascii=False),) for path in tree_paths],
+            )
+        return len(tree_paths)
+
+    def enqueue_steps(self, num_steps: int, batch_size: int) -> int:
+        """无主题树时，每个 step 作为一个任务入队，生成 batch_size 个样本"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO items (path, count) VALUES (NULL, ?)",
+                [(batch_size,) for _ in range(num_steps)],
+            )
+        return num_steps
+
+    def lease(self, worker_id: str, max_items: int = 1) -> Lease:
+        """领取至多 max_items 个待处理或租约已过期的任务"""
+        lease = Lease(token=uuid.uuid4().hex, worker_id=worker_id)
+        now = time.time()
+        with self._transaction() as conn:
+            # 租约过期且已用完重试次数的任务不再重新领取
+            conn.execute(
+                "UPDATE items SET state = ?, error = 'lease expired' "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, LEASED, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT id, path, count FROM items "
+                "WHERE state = ? OR (state = ? AND lease_expires < ?) "
+                "ORDER BY id LIMIT ?",
+                (PENDING, LEASED, now, max_items),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE items SET state = ?, attempts = attempts + 1, worker_id = ?, "
+                "lease_token = ?, lease_expires = ? WHERE id = ?",
+                [
+                    (LEASED, worker_id, lease.token, now + self.lease_timeout, row[0])
+                    for row in rows
+                ],
+            )
+
+        lease.items = [
+            WorkItem(
+                id=row[0], path=json.loads(row[1]) if row[1] else None, count=row[2]
+            )
+            for row in rows
+        ]
+        return lease
+
+    def complete(
+        self,
+        lease: Lease,
+        samples: Dict[int, List[Dict]],
+        metadata: Optional[Dict[int, List[Dict]]] = None,
+    ) -> List[int]:
+        """
+        提交任务生成的样本及其元数据（与样本一一对应，可省略），
+        返回实际提交成功的任务 id。
+        租约已过期并被其他 worker 重新领取的任务不会重复提交。
+        """
+        committed = []
+        with self._transaction() as conn:
+            for item_id, item_samples in samples.items():
+                cursor = conn.execute(
+                    "UPDATE items SET state = ?, error = NULL "
+                    "WHERE id = ? AND state = ? AND lease_token = ?",
+                    (DONE, item_id, LEASED, lease.token),
+                )
+                if cursor.rowcount == 0:
+                    continue
+                item_metadata = (metadata or {}).get(item_id)
+                conn.executemany(
+                    "INSERT INTO samples (item_id, sample, metadata) VALUES (?, ?, ?)",
+                    [
+                        (
+                            item_id,
+                            json.dumps(sample, ensure_ascii=False),
+                            json.dumps(item_metadata[i], ensure_ascii=False)
+                            if item_metadata is not None
+                            else None,
+                        )
+                        for i, sample in enumerate(item_samples)
+                    ],
+                )
+                committed.append(item_id)
+        return committed
+
+    def fail(self, lease: Lease, item_ids: List[int], error: str) -> None:
+        """任务失败：未超过重试次数时放回队列，否则标记为 failed"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE items SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, lease_token = NULL, lease_expires = NULL "
+                "WHERE id = ? AND state = ? AND lease_token = ?",
+                [
+                    (
+                        self.max_attempts,
+                        FAILED,
+                        PENDING,
+                        error,
+                        item_id,
+                        LEASED,
+                        lease.token,
+                    )
+                    for item_id in item_ids
+                ],
+            )
+
+    def requeue_failed(self) -> int:
+        """把失败的任务放回队列并重置重试次数"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET state = ?, attempts = 0, error = NULL WHERE state = ?",
+                (PENDING, FAILED),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        with self._connect() as conn:
+            for state, count in conn.execute(
+                "SELECT state, COUNT(*) FROM items GROUP BY state"
+            ):
+                counts[state] = count
+        return counts
+
+    def is_finished(self) -> bool:
+        stats = self.stats()
+        return stats[PENDING] == 0 and stats[LEASED] == 0
+
+    def merge(self) -> Dataset:
+        """按任务入队顺序把已提交的样本及其元数据合并为一个 Dataset"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT sample, metadata FROM samples ORDER BY item_id, id"
+            ).fetchall()
+        dataset = Dataset.from_list([json.loads(row[0]) for row in rows])
+        dataset.metadata = [json.loads(row[1]) if row[1] else {} for row in rows]
+        return dataset
@@ -7,6 +7,11 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=["litellm>=1.74.0"],
+    extras_require={
+        "arrow": ["pyarrow>=10.0"],
+        "diverse": ["numpy>=1.17"],
+        "analysis": ["numpy>=1.17"],
+    },
     python_requires=">=3.7",
     author="Carlton",
     license="MIT",
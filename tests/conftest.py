@@ -0,0 +1,35 @@
+import os
+import sys
+from typing import Any, Callable, Iterator, List, Tuple
+
+import pytest
+
+# 与 test_ollama_integration.py 一致，直接从源码目录导入 pluto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 使用 litellm 自带的模型价格表，导入时不联网
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks.stub_server import StubServer, default_reply  # noqa: E402
+from pluto.provider import ProviderClient  # noqa: E402
+from pluto.types import APIProvider  # noqa: E402
+
+
+@pytest.fixture
+def stub_client() -> Iterator[Callable[..., Tuple[StubServer, ProviderClient]]]:
+    """启动本地桩服务器并返回指向它的 ProviderClient，测试结束后全部关闭"""
+    started: List[Tuple[StubServer, ProviderClient]] = []
+
+    def make(
+        reply: Callable[[Any], str] = default_reply, latency: float = 0.0, **kwargs: Any
+    ) -> Any:
+        stub = StubServer(reply, latency).start()
+        client = ProviderClient(
+            APIProvider.OPENAI_COMPATIBLE, stub.url + "/v1", "stub-key", **kwargs
+        )
+        started.append((stub, client))
+        return stub, client
+
+    yield make
+    for stub, client in started:
+        client.close()
+        stub.stop()
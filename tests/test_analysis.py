@@ -0,0 +1,34 @@
+import sys
+
+import pytest
+
+from pluto import analysis
+
+pytest.importorskip("pyarrow")
+from pluto import columnar  # noqa: E402
+
+
+def sample(i):
+    return {"messages": [{"role": "user", "content": f"question {i}"}]}
+
+
+@pytest.mark.parametrize("suffix", ["parquet", "arrow"])
+def test_iter_file_reads_columnar_files_batch_by_batch(tmp_path, suffix):
+    path = str(tmp_path / f"data.{suffix}")
+    with columnar.ColumnarWriter(path, row_group_size=10) as writer:
+        for i in range(25):
+            writer.write(sample(i), 3, {"tree_path": ["root", str(i % 2)], "n": i})
+
+    batches = list(columnar.iter_batches(path, batch_size=10))
+    rows = list(analysis.iter_file(path))
+
+    assert [batch.num_rows for batch in batches] == [10, 10, 5]
+    assert [s for s, _ in rows] == [sample(i) for i in range(25)]
+    assert rows[3][1] == {"tree_path": ["root", "1"], "n": 3}
+
+
+def test_missing_numpy_names_the_analysis_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+
+    with pytest.raises(ImportError, match=r"pluto-clean\[analysis\]"):
+        analysis._import_numpy()
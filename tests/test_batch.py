@@ -0,0 +1,159 @@
+import json
+import os
+from typing import Dict, List
+
+from benchmarks.stub_server import SAMPLE_CONTENT
+from pluto import DataEngine, EngineArguments, LocalBatchBackend
+from pluto import batch
+from pluto.provider import OllamaArguments, ProviderClient
+from pluto.types import APIProvider
+
+INVALID_CONTENT = json.dumps({"messages": [{"role": "bot", "content": "hi"}]})
+
+
+def result_line(custom_id: str, content: str) -> Dict:
+    body = {
+        "model": "stub-model",
+        "created": 1700000000,
+        "usage": {"total_tokens": 20},
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+    }
+    return {
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "body": body},
+        "error": None,
+    }
+
+
+class FakeBackend(batch.BatchBackend):
+    """在内存中完成批次：每次提交按 outcomes 中对应的一轮结果返回"""
+
+    def __init__(self, outcomes: List[Dict[str, str]]):
+        self.outcomes = outcomes
+        self.submitted: List[List[str]] = []
+
+    def submit(self, requests_path: str) -> str:
+        self.submitted.append([r["custom_id"] for r in batch.iter_jsonl(requests_path)])
+        return f"batch-{len(self.submitted)}"
+
+    def status(self, batch_id: str) -> str:
+        return batch.COMPLETED
+
+    def download_results(self, batch_id: str, output_path: str) -> bool:
+        outcome = self.outcomes[len(self.submitted) - 1]
+        lines = []
+        for custom_id in self.submitted[-1]:
+            content = outcome.get(custom_id, SAMPLE_CONTENT)
+            if content == "error":
+                lines.append(
+                    {
+                        "custom_id": custom_id,
+                        "response": None,
+                        "error": {"code": "server_error", "message": "overloaded"},
+                    }
+                )
+            elif content != "missing":
+                lines.append(result_line(custom_id, content))
+        batch.write_jsonl(output_path, lines)
+        return True
+
+
+def test_read_results_parses_successes_and_errors(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    batch.write_jsonl(
+        path,
+        [
+            result_line("a", SAMPLE_CONTENT),
+            {"custom_id": "b", "response": None, "error": {"message": "boom"}},
+            {
+                "custom_id": "c",
+                "response": {"status_code": 429, "body": {"error": "slow down"}},
+                "error": None,
+            },
+        ],
+    )
+
+    results = batch.read_results(path)
+
+    assert results["a"] == (
+        SAMPLE_CONTENT,
+        None,
+        {"model": "stub-model", "timestamp": 1700000000, "usage": {"total_tokens": 20}},
+    )
+    assert results["b"] == (None, "boom", {})
+    assert results["c"] == (None, "status 429: slow down", {})
+
+
+def test_prepare_batch_writes_chat_completions_bodies(tmp_path):
+    client = ProviderClient(APIProvider.OLLAMA, ollama=OllamaArguments())
+    engine = DataEngine(EngineArguments("instructions", "SYS"), client=client)
+    path = str(tmp_path / "requests.jsonl")
+
+    assert engine.prepare_batch("llama3", path, num_steps=1, batch_size=2) == 2
+
+    requests = list(batch.iter_jsonl(path))
+    assert [r["custom_id"] for r in requests] == ["sample-000000", "sample-000001"]
+    for request in requests:
+        # Ollama 的 format 字段不能出现在 Chat Completions 请求体中
+        assert "format" not in request["body"]
+        assert request["body"]["response_format"]["type"] == "json_schema"
+    client.close()
+
+
+def test_ingest_batch_resubmits_only_failed_requests(tmp_path, stub_client):
+    _, client = stub_client()
+    engine = DataEngine(EngineArguments("instructions", "SYS"), client=client)
+    path = str(tmp_path / "requests.jsonl")
+    engine.prepare_batch("stub-model", path, num_steps=2, batch_size=2)
+    backend = FakeBackend(
+        [
+            {
+                "sample-000001": "error",
+                "sample-000002": INVALID_CONTENT,
+                "sample-000003": "missing",
+            },
+            {},
+        ]
+    )
+
+    dataset = engine.ingest_batch(backend, backend.submit(path), path, poll_interval=0)
+
+    assert backend.submitted[1] == ["sample-000001", "sample-000002", "sample-000003"]
+    assert len(dataset.samples) == 4
+    assert [m["endpoint"] for m in dataset.metadata] == ["batch/batch-1"] + [
+        "batch/batch-2"
+    ] * 3
+    assert all(s["messages"][0]["role"] == "system" for s in dataset.samples)
+
+
+def test_local_backend_round_trip_and_persisted_status(tmp_path, stub_client):
+    stub, client = stub_client()
+    engine = DataEngine(EngineArguments("instructions", "SYS"), client=client)
+    path = str(tmp_path / "requests.jsonl")
+    engine.prepare_batch("stub-model", path, num_steps=1, batch_size=3)
+    workdir = str(tmp_path / "work")
+    backend = LocalBatchBackend(client, workdir)
+
+    batch_id = backend.submit(path)
+    assert backend.wait(batch_id, poll_interval=0.05, timeout=30) == batch.COMPLETED
+    assert stub.requests == 3
+
+    # 另一个进程（新的 backend 实例）读取同一 workdir 中的状态与结果
+    reopened = LocalBatchBackend(client, workdir)
+    assert reopened.status(batch_id) == batch.COMPLETED
+    results_path = str(tmp_path / "results.jsonl")
+    assert reopened.download_results(batch_id, results_path)
+    results = batch.read_results(results_path)
+    assert sorted(results) == ["sample-000000", "sample-000001", "sample-000002"]
+    assert all(content == SAMPLE_CONTENT for content, _, _ in results.values())
+    assert not [name for name in os.listdir(workdir) if name.endswith(".tmp")]
+
+
+def test_local_backend_reports_orphaned_batch_as_failed(tmp_path, stub_client):
+    _, client = stub_client()
+    backend = LocalBatchBackend(client, str(tmp_path))
+    # 提交该批次的进程已退出，状态文件仍停在 in_progress
+    backend._set_status("batch_local_orphan", batch.IN_PROGRESS)
+
+    assert backend.status("batch_local_orphan") == batch.FAILED
+    assert not backend.download_results("batch_local_orphan", str(tmp_path / "out"))
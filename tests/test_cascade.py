@@ -0,0 +1,23 @@
+import json
+
+from pluto import DataEngine, EngineArguments, ModelCascade, ModelTier
+
+INVALID_CONTENT = json.dumps({"messages": [{"role": "bot", "content": "hi"}]})
+
+
+def test_invalid_samples_escalate_to_next_tier(stub_client):
+    small_stub, small = stub_client(lambda body: INVALID_CONTENT)
+    big_stub, big = stub_client()
+    cascade = ModelCascade([ModelTier(small, "small"), ModelTier(big, "big")])
+    engine = DataEngine(EngineArguments("instructions", "SYS"), cascade=cascade)
+
+    dataset = engine.create_data("ignored", num_steps=2, batch_size=3)
+
+    assert len(dataset.samples) == 6
+    assert small_stub.requests == 6
+    assert big_stub.requests == 6
+    small_stats, big_stats = cascade.stats
+    assert (small_stats.attempts, small_stats.successes) == (6, 0)
+    assert (big_stats.attempts, big_stats.successes) == (6, 6)
+    assert all(m["model"] == "big" for m in dataset.metadata)
+    assert all(s["messages"][0]["role"] == "system" for s in dataset.samples)
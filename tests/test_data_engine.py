@@ -0,0 +1,98 @@
+import json
+import re
+import threading
+
+import pytest
+
+from benchmarks.stub_server import SAMPLE_CONTENT
+from pluto import DataEngine, EngineArguments, Pipeline, TopicTree, TopicTreeArguments
+
+INVALID_CONTENT = json.dumps({"messages": [{"role": "bot", "content": "hi"}]})
+
+
+def invalid_first(count: int):
+    """前 count 个请求返回角色无效的样本，之后返回有效样本"""
+    lock = threading.Lock()
+    seen = [0]
+
+    def reply(body):
+        with lock:
+            seen[0] += 1
+            return INVALID_CONTENT if seen[0] <= count else SAMPLE_CONTENT
+
+    return reply
+
+
+def test_invalid_samples_are_retried(stub_client):
+    stub, client = stub_client(invalid_first(2))
+    engine = DataEngine(EngineArguments("instructions", "SYS"), client=client)
+
+    dataset = engine.create_data("stub-model", num_steps=2, batch_size=3)
+
+    assert len(dataset.samples) == 6
+    assert stub.requests == 8
+    for sample in dataset.samples:
+        assert sample["messages"][0] == {"role": "system", "content": "SYS"}
+        assert all(m["role"] != "bot" for m in sample["messages"])
+
+
+def test_pipeline_runs_only_registered_stages(stub_client):
+    stub, client = stub_client(invalid_first(1))
+    pipeline = Pipeline().add_filter(lambda sample: True, name="keep")
+    engine = DataEngine(
+        EngineArguments("instructions", "SYS"), client=client, pipeline=pipeline
+    )
+
+    dataset = engine.create_data("stub-model", num_steps=1, batch_size=4)
+
+    assert len(dataset.samples) == 4
+    assert list(pipeline.stats) == ["keep"]
+    assert pipeline.stats["keep"].received == 4
+    assert all(s["messages"][0]["role"] == "system" for s in dataset.samples)
+
+
+def tree_or_sample(failing: str, failures: int):
+    """回复子主题请求；生成样本的 prompt 提到 failing 时，前 failures 次返回无效样本"""
+    lock = threading.Lock()
+    seen = [0]
+
+    def reply(body):
+        prompt = body["messages"][-1]["content"]
+        tail = prompt[prompt.rfind("</system_prompt>") :]
+        match = re.search(r"node path: (.*)", tail)
+        if match:
+            name = match.group(1).split(" -> ")[-1]
+            return json.dumps({"subtopics": [f"{name}.{i}" for i in range(2)]})
+        if failing in prompt:
+            with lock:
+                seen[0] += 1
+                if seen[0] <= failures:
+                    return INVALID_CONTENT
+        return SAMPLE_CONTENT
+
+    return reply
+
+
+def pipelined(stub_client, reply):
+    _, client = stub_client(reply)
+    tree = TopicTree(TopicTreeArguments("root", tree_degree=2, tree_depth=2))
+    engine = DataEngine(EngineArguments("instructions", "SYS"), client=client)
+    return engine, tree
+
+
+def test_pipelined_retries_failed_leaves(stub_client):
+    engine, tree = pipelined(stub_client, tree_or_sample("root.1.0", 2))
+
+    dataset = engine.create_data_pipelined("stub-model", 2, tree, batch_size=2)
+
+    assert len(dataset.samples) == 4
+    paths = sorted(m["tree_path"] for m in dataset.metadata)
+    assert paths == sorted(tree.tree_paths)
+
+
+def test_pipelined_raises_when_selected_leaf_keeps_failing(stub_client):
+    engine, tree = pipelined(stub_client, tree_or_sample("root.1.0", 3))
+
+    with pytest.raises(Exception, match="1 selected leaves failed"):
+        engine.create_data_pipelined("stub-model", 2, tree, batch_size=2)
+    assert len(engine.dataset.samples) == 3
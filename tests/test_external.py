@@ -0,0 +1,140 @@
+import json
+
+from pluto import external, packing, provenance
+from pluto.external import merge_files, shuffle_file, split_file
+
+
+def sample(text):
+    return {"messages": [{"role": "user", "content": text}]}
+
+
+def write(path, texts, metadata=None, lengths=None):
+    with open(path, "w", encoding="utf-8") as f:
+        for text in texts:
+            f.write(json.dumps(sample(text)) + "\n")
+    if metadata is not None:
+        provenance.save_metadata(str(path), metadata)
+    if lengths is not None:
+        packing.save_index(str(path), lengths, "test-tokenizer")
+    return str(path)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["messages"][0]["content"] for line in f]
+
+
+def test_merge_drops_duplicates_across_and_within_inputs(tmp_path):
+    a = write(tmp_path / "a.jsonl", ["x", "y", "x"])
+    b = write(tmp_path / "b.jsonl", ["z", "y"])
+    out = str(tmp_path / "merged.jsonl")
+
+    assert merge_files([a, b], out) == 3
+    assert sorted(read(out)) == ["x", "y", "z"]
+
+
+def test_merge_keeps_duplicates_when_asked(tmp_path):
+    a = write(tmp_path / "a.jsonl", ["x", "y"])
+    b = write(tmp_path / "b.jsonl", ["y"])
+    out = str(tmp_path / "merged.jsonl")
+
+    assert merge_files([a, b], out, dedupe=False) == 3
+    assert sorted(read(out)) == ["x", "y", "y"]
+
+
+def test_merge_with_small_memory_budget_spills_runs(tmp_path):
+    texts = [f"sample {i}" for i in range(200)]
+    a = write(tmp_path / "a.jsonl", texts)
+    b = write(tmp_path / "b.jsonl", texts[100:] + ["extra"])
+    out = str(tmp_path / "merged.jsonl")
+
+    assert merge_files([a, b], out, max_memory_bytes=512) == 201
+    assert sorted(read(out)) == sorted(texts + ["extra"])
+
+
+def test_sidecars_move_with_their_lines(tmp_path):
+    texts = [str(i) for i in range(50)]
+    metadata = [{"n": i} for i in range(50)]
+    path = write(tmp_path / "a.jsonl", texts, metadata, list(range(50)))
+    out = str(tmp_path / "shuffled.jsonl")
+
+    shuffle_file(path, out, seed=0, max_memory_bytes=256)
+
+    shuffled = read(out)
+    assert shuffled != texts
+    assert [m["n"] for m in provenance.load_metadata(out, 50)] == [
+        int(t) for t in shuffled
+    ]
+    assert packing.load_index(out, 50) == [int(t) for t in shuffled]
+
+
+def test_merge_skips_sidecars_missing_from_any_input(tmp_path):
+    a = write(tmp_path / "a.jsonl", ["x"], [{"n": 0}])
+    b = write(tmp_path / "b.jsonl", ["y"])
+    out = str(tmp_path / "merged.jsonl")
+    # 输出路径上过期的旁路文件会被删除
+    provenance.save_metadata(out, [{}, {}])
+
+    merge_files([a, b], out)
+
+    assert provenance.load_metadata(out, 2) is None
+
+
+def test_split_by_tree_path_keeps_branches_together(tmp_path):
+    texts = [str(i) for i in range(100)]
+    metadata = []
+    for i in range(100):
+        path = ["root", str(i % 7)]
+        metadata.append({"tree_path": path, "tree_path_id": provenance.path_id(path)})
+    path = write(tmp_path / "a.jsonl", texts, metadata)
+    outputs = {
+        "train": str(tmp_path / "train.jsonl"),
+        "val": str(tmp_path / "val.jsonl"),
+    }
+
+    counts = split_file(path, outputs, {"train": 0.5, "val": 0.5}, by_tree_path=True)
+
+    assert sum(counts.values()) == 100
+    branches = {}
+    for name, out in outputs.items():
+        for text, meta in zip(read(out), provenance.load_metadata(out, counts[name])):
+            assert meta["tree_path"] == ["root", str(int(text) % 7)]
+            branches.setdefault(meta["tree_path_id"], set()).add(name)
+    assert all(len(names) == 1 for names in branches.values())
+
+
+def test_merge_in_bounded_fan_in_passes(tmp_path, monkeypatch):
+    texts = [f"sample {i:03d}" for i in range(300)]
+    a = write(tmp_path / "a.jsonl", texts, [{"n": i} for i in range(300)])
+    b = write(tmp_path / "b.jsonl", texts[::3], [{"n": -i} for i in range(100)])
+    out = str(tmp_path / "merged.jsonl")
+
+    open_runs = set()
+    peak = []
+
+    class Tracked:
+        def __init__(self, f):
+            self.f = f
+
+        def __enter__(self):
+            open_runs.add(id(self))
+            peak.append(len(open_runs))
+            return self.f.__enter__()
+
+        def __exit__(self, *exc):
+            open_runs.discard(id(self))
+            return self.f.__exit__(*exc)
+
+    def tracked_open(path, mode="r", *args, **kwargs):
+        f = open(path, mode, *args, **kwargs)
+        return Tracked(f) if mode == "rb" else f
+
+    monkeypatch.setattr(external, "open", tracked_open, raising=False)
+
+    assert merge_files([a, b], out, max_memory_bytes=600, fan_in=3) == 300
+    assert read(out) == texts
+    # 重复样本保留排序最前（来源信息最小）的一份
+    with open(provenance.metadata_path(out), encoding="utf-8") as f:
+        kept = [json.loads(line)["n"] for line in f]
+    assert kept == [-(i // 3) if i % 3 == 0 else i for i in range(300)]
+    assert 1 < max(peak) <= 3
@@ -0,0 +1,53 @@
+import os
+import random
+
+from pluto import Dataset
+from pluto.packing import bucket_lengths, index_path, pack_lengths
+
+
+def test_bins_respect_capacity_and_cover_every_sample():
+    rng = random.Random(0)
+    lengths = [rng.randint(1, 600) for _ in range(500)] + [700, 1500]
+
+    bins, oversized = pack_lengths(lengths, max_tokens=1024)
+
+    assert all(sum(lengths[i] for i in b) <= 1024 for b in bins)
+    assert oversized == [501]
+    packed = sorted(i for b in bins for i in b)
+    assert packed == [i for i in range(len(lengths)) if i != 501]
+
+
+def test_best_fit_fills_tightest_bin():
+    # 最佳适应：4 放入剩余 4 的箱子（装 6 的那个），而不是剩余 5 的箱子
+    bins, oversized = pack_lengths([6, 5, 4, 3, 2], max_tokens=10)
+
+    assert oversized == []
+    assert sorted(sorted(b) for b in bins) == [[0, 2], [1, 3, 4]]
+
+
+def test_sample_exactly_at_capacity_gets_its_own_bin():
+    bins, oversized = pack_lengths([10, 10, 1], max_tokens=10)
+
+    assert oversized == []
+    assert len(bins) == 3
+
+
+def test_bucket_boundaries_are_inclusive():
+    buckets = bucket_lengths([1, 128, 129, 512, 513], [128, 512])
+
+    assert buckets == [[0, 1], [2, 3], [4]]
+
+
+def test_save_writes_token_length_index(tmp_path):
+    samples = [
+        {"messages": [{"role": "user", "content": "hi " * n}]} for n in (1, 5, 20)
+    ]
+    dataset = Dataset(token_counter=lambda s: len(s["messages"][0]["content"]))
+    dataset.add_samples(samples)
+    path = str(tmp_path / "data.jsonl")
+
+    dataset.save(path)
+
+    assert os.path.exists(index_path(path))
+    loaded = Dataset.from_jsonl(path, token_counter=lambda s: 0)
+    assert loaded.token_lengths == [3, 15, 60]
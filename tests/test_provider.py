@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_server import SAMPLE_CONTENT, StubError
+from pluto.provider import HedgeArguments, _ConcurrencyLimit
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_hedge_fires_after_percentile_delay_and_first_response_wins(stub_client):
+    slow = threading.Event()
+
+    def reply(body):
+        # 打开开关后只有第一个请求变慢，对冲副本立即返回
+        if slow.is_set():
+            slow.clear()
+            time.sleep(2.0)
+        return SAMPLE_CONTENT
+
+    hedge = HedgeArguments(percentile=0.5, max_extra_fraction=1.0, min_samples=5)
+    stub, client = stub_client(reply, hedge=hedge)
+    for _ in range(5):
+        client.completion("stub-model", MESSAGES)
+    assert client.num_hedges == 0
+
+    slow.set()
+    start = time.perf_counter()
+    response = client.completion("stub-model", MESSAGES)
+
+    assert response.choices[0].message.content == SAMPLE_CONTENT
+    assert time.perf_counter() - start < 1.5
+    assert (client.num_hedges, client.num_hedge_wins) == (1, 1)
+    assert stub.requests == 7
+
+
+def test_deadline_raises_timeout_error(stub_client):
+    stub, client = stub_client(latency=2.0, request_timeout=0.5)
+
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        client.completion("stub-model", MESSAGES)
+    assert time.perf_counter() - start < 1.5
+
+
+def test_schema_rejection_falls_back_to_json_mode(stub_client):
+    formats = []
+
+    def reply(body):
+        response_format = body.get("response_format") or {}
+        formats.append(response_format.get("type"))
+        if response_format.get("type") == "json_schema":
+            raise StubError(400, "response_format json_schema is not supported")
+        return SAMPLE_CONTENT
+
+    stub, client = stub_client(reply)
+    schema = {"type": "object", "properties": {}}
+    params = client.structured_output_params("stub-model", schema)
+
+    client.completion("stub-model", MESSAGES, **params)
+    client.completion(
+        "stub-model", MESSAGES, **client.structured_output_params("stub-model", schema)
+    )
+
+    assert formats == ["json_schema", "json_object", "json_object"]
+
+
+def test_other_bad_requests_are_not_retried_in_json_mode(stub_client):
+    def reply(body):
+        raise StubError(400, "messages must not be empty")
+
+    stub, client = stub_client(reply)
+    params = client.structured_output_params("stub-model", {"type": "object"})
+
+    with pytest.raises(Exception):
+        client.completion("stub-model", MESSAGES, max_retries=0, **params)
+    assert stub.requests == 1
+    # 失败的请求也计入对冲分位数使用的延迟样本
+    assert len(client._latencies) == 1
+
+
+def test_shrinking_limit_waits_for_in_flight_requests():
+    limit = _ConcurrencyLimit(2)
+    limit.acquire()
+    limit.acquire()
+    limit.resize(1)
+
+    acquired = threading.Event()
+
+    def acquire():
+        limit.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    limit.release()
+    assert not acquired.wait(0.1)
+    limit.release()
+    assert acquired.wait(1.0)
+    thread.join()
+    assert limit.in_flight == 1
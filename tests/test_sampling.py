@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from pluto.sampling import (
+    WITH_REPLACEMENT,
+    AliasSampler,
+    SamplingArguments,
+    sample_paths,
+)
+
+
+def test_alias_draws_follow_weights():
+    weights = [1.0, 2.0, 3.0, 0.0, 4.0]
+    sampler = AliasSampler(weights, random.Random(0))
+    n = 100000
+
+    counts = [0] * len(weights)
+    for i in sampler.draw_many(n):
+        counts[i] += 1
+
+    total = sum(weights)
+    for count, weight in zip(counts, weights):
+        assert abs(count / n - weight / total) < 0.01
+    assert counts[3] == 0
+
+
+def test_alias_table_is_exact():
+    # 每个下标的概率 = (自身格子的概率 + 作为别名被选中的概率) / n
+    weights = [0.5, 0.1, 0.1, 0.3]
+    sampler = AliasSampler(weights)
+    n = len(weights)
+
+    mass = [0.0] * n
+    for i in range(n):
+        mass[i] += sampler._prob[i] / n
+        mass[sampler._alias[i]] += (1 - sampler._prob[i]) / n
+    assert mass == pytest.approx(weights)
+
+
+@pytest.mark.parametrize("weights", [[], [0.0, 0.0], [1.0, -1.0]])
+def test_alias_rejects_invalid_weights(weights):
+    with pytest.raises(ValueError):
+        AliasSampler(weights)
+
+
+def test_branch_weights_with_replacement():
+    tree_paths = [["root", "a", str(i)] for i in range(3)] + [["root", "b", "0"]]
+    args = SamplingArguments(
+        strategy=WITH_REPLACEMENT,
+        branch_weights={"a": 0.0},
+        seed=1,
+    )
+
+    paths = sample_paths(tree_paths, 50, args)
+
+    assert len(paths) == 50
+    assert all(path == ["root", "b", "0"] for path in paths)
@@ -0,0 +1,85 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from pluto import DataEngine, EngineArguments, TopicTree, TopicTreeArguments
+from pluto.service import GenerationService, ServiceArguments
+
+TREE_PATHS = [
+    ["root", "a", "a1"],
+    ["root", "a", "a2"],
+    ["root", "b", "b1"],
+]
+
+
+@pytest.fixture
+def service_url(stub_client):
+    _, client = stub_client()
+    engine = DataEngine(EngineArguments("instructions", "SYS"), client=client)
+    tree = TopicTree(TopicTreeArguments(root_prompt="root"), client=client)
+    tree.tree_paths = TREE_PATHS
+    service = GenerationService(
+        engine, ServiceArguments("stub-model"), topic_tree=tree, seed=0
+    )
+    server = service.make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def post(url: str, body: Dict[str, Any]) -> Tuple[int, List[Dict]]:
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"))
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, [json.loads(line) for line in response]
+    except urllib.error.HTTPError as e:
+        return e.code, [json.loads(e.read())]
+
+
+def get(url: str) -> Dict:
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def test_generate_streams_samples_under_branch(service_url):
+    status, lines = post(service_url + "/generate", {"path": ["root", "a"], "count": 3})
+
+    assert status == 200
+    samples, done = lines[:-1], lines[-1]
+    assert done == {"done": True, "generated": 3, "failed": 0}
+    assert len(samples) == 3
+    for line in samples:
+        assert line["sample"]["messages"][0] == {"role": "system", "content": "SYS"}
+        assert line["metadata"]["tree_path"] in TREE_PATHS[:2]
+
+
+def test_health_and_metrics(service_url):
+    assert get(service_url + "/health") == {"status": "ok"}
+    post(service_url + "/generate", {"path": ["root", "b"], "count": 2})
+
+    metrics = get(service_url + "/metrics")
+
+    assert metrics["requests"] == 1
+    assert metrics["samples"] == 2
+    assert metrics["active_requests"] == 0
+    assert metrics["latency_p50"] is not None
+
+
+def test_invalid_requests_are_rejected(service_url):
+    status, lines = post(service_url + "/generate", {"count": 0})
+    assert status == 400
+    assert "count" in lines[0]["error"]
+
+    status, lines = post(service_url + "/generate", {"path": "root"})
+    assert status == 400
+
+    status, lines = post(service_url + "/unknown", {})
+    assert status == 404
@@ -0,0 +1,192 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from pluto import TopicTree, TopicTreeArguments
+
+
+class FakeTopicModel:
+    """
+    按 prompt 的类型回复子主题，子主题名为父主题名加序号，例如 root.0.1。
+    broken 中的节点在嵌套请求中返回无法解析的响应或格式错误的子树，
+    在批量请求中缺失。
+    """
+
+    def __init__(self, broken: Optional[List[str]] = None):
+        self.broken = set(broken or [])
+        self.kinds: List[str] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, body: Dict[str, Any]) -> str:
+        prompt = body["messages"][-1]["content"]
+        # 只看系统提示之后的部分，前面的示例中也有同样格式的行
+        prompt = prompt[prompt.rindex("</system_prompt>") :]
+        num = int(re.search(r"desired number of [a-z ]*: (\d+)", prompt).group(1))
+        if "desired number of levels" in prompt:
+            kind = "nested"
+            levels = int(re.search(r"number of levels: (\d+)", prompt).group(1))
+            name = self._name(prompt)
+            content = (
+                "here are the subtopics you asked for"
+                if name in self.broken
+                else self._nested(name, num, levels)
+            )
+        elif "node paths:" in prompt:
+            kind = "batch"
+            content = {
+                key: self._children(path.split(" -> ")[-1], num)
+                for key, path in re.findall(r"^(\d+): (.*)$", prompt, re.M)
+                if path.split(" -> ")[-1] not in self.broken
+            }
+        elif "existing subtopics" in prompt:
+            kind = "widen"
+            existing = re.search(r"existing subtopics: (.*)", prompt).group(1)
+            existing = json.loads(existing)
+            name = self._name(prompt)
+            new = [f"{name}.{len(existing) + i}" for i in range(num)]
+            # 模型可能重复已有的子主题，应被过滤掉
+            content = {"subtopics": existing[:1] + new}
+        else:
+            kind = "single"
+            content = {"subtopics": self._children(self._name(prompt), num)}
+        with self._lock:
+            self.kinds.append(kind)
+        return content if isinstance(content, str) else json.dumps(content)
+
+    @staticmethod
+    def _name(prompt: str) -> str:
+        return re.search(r"node path: (.*)", prompt).group(1).split(" -> ")[-1]
+
+    @staticmethod
+    def _children(name: str, num: int) -> List[str]:
+        return [f"{name}.{i}" for i in range(num)]
+
+    def _nested(self, name: str, num: int, levels: int) -> Any:
+        if levels == 1:
+            return self._children(name, num)
+        return {
+            child: {"bad": 1}
+            if child in self.broken
+            else self._nested(child, num, levels - 1)
+            for child in self._children(name, num)
+        }
+
+
+def full_tree(name: str, degree: int, depth: int) -> List[List[str]]:
+    """FakeTopicModel 对应的完整树的叶子路径"""
+    if depth == 0:
+        return [[name]]
+    return [
+        [name] + path
+        for child in FakeTopicModel._children(name, degree)
+        for path in full_tree(child, degree, depth - 1)
+    ]
+
+
+def make_tree(stub_client, model: FakeTopicModel, **kwargs: Any) -> TopicTree:
+    _, client = stub_client(model)
+    args = TopicTreeArguments(root_prompt="root", tree_degree=2, **kwargs)
+    return TopicTree(args, client=client)
+
+
+def test_build_tree_expands_one_level_per_call(stub_client):
+    model = FakeTopicModel()
+    tree = make_tree(stub_client, model, tree_depth=3)
+
+    tree.build_tree("stub-model")
+
+    assert tree.tree_paths == full_tree("root", 2, 3)
+    assert model.kinds == ["single"] * 7
+
+
+def test_nested_subtree_in_one_call(stub_client):
+    model = FakeTopicModel()
+    tree = make_tree(stub_client, model, tree_depth=3, levels_per_call=2)
+
+    tree.build_tree("stub-model")
+
+    assert tree.tree_paths == full_tree("root", 2, 3)
+    # 根节点一次请求展开两层，剩下的一层逐节点展开
+    assert model.kinds == ["nested"] + ["single"] * 4
+
+
+def test_malformed_nested_part_falls_back_to_single_level(stub_client):
+    model = FakeTopicModel(broken=["root.1"])
+    tree = make_tree(stub_client, model, tree_depth=2, levels_per_call=2)
+
+    tree.build_tree("stub-model")
+
+    assert tree.tree_paths == full_tree("root", 2, 2)
+    # 只为格式错误的 root.1 重新请求
+    assert model.kinds == ["nested", "single"]
+
+
+def test_unparseable_nested_response_falls_back_to_single_level(stub_client):
+    model = FakeTopicModel(broken=["root"])
+    tree = make_tree(stub_client, model, tree_depth=2, levels_per_call=2)
+
+    tree.build_tree("stub-model")
+
+    assert tree.tree_paths == full_tree("root", 2, 2)
+    assert model.kinds == ["nested"] + ["single"] * 3
+
+
+def test_batched_expansion_requeries_missing_nodes(stub_client):
+    model = FakeTopicModel(broken=["root.1.0", "root.1.1"])
+    tree = make_tree(stub_client, model, tree_depth=3, expansion_batch_size=4)
+
+    tree.build_tree("stub-model")
+
+    assert tree.tree_paths == full_tree("root", 2, 3)
+    # 根节点单独一个请求；两个缺失的节点先批量重试，仍缺失时逐个请求
+    assert model.kinds == ["single", "batch", "batch", "batch", "single", "single"]
+
+
+def test_widen_keeps_existing_leaves_and_adds_new_siblings(stub_client):
+    model = FakeTopicModel()
+    tree = make_tree(stub_client, model, tree_depth=2)
+    tree.build_tree("stub-model")
+    before = [list(path) for path in tree.tree_paths]
+    model.kinds.clear()
+
+    tree.widen("stub-model", num_subtopics=1)
+
+    # 新叶子紧跟在各自父节点最后一个已有叶子之后，重复的已有子主题被过滤
+    assert tree.tree_paths == [
+        before[0],
+        before[1],
+        ["root", "root.0", "root.0.2"],
+        before[2],
+        before[3],
+        ["root", "root.1", "root.1.2"],
+    ]
+    assert model.kinds == ["widen", "widen"]
+
+
+def test_widen_root_grows_new_branch_to_full_depth(stub_client):
+    model = FakeTopicModel()
+    tree = make_tree(stub_client, model, tree_depth=2)
+    tree.build_tree("stub-model")
+    before = [list(path) for path in tree.tree_paths]
+    model.kinds.clear()
+
+    tree.widen("stub-model", num_subtopics=1, node_paths=[["root"]])
+
+    assert tree.tree_paths == before + [
+        ["root", "root.2", "root.2.0"],
+        ["root", "root.2", "root.2.1"],
+    ]
+    assert model.kinds == ["widen", "single"]
+
+
+def test_deepen_only_requests_new_nodes(stub_client):
+    model = FakeTopicModel()
+    tree = make_tree(stub_client, model, tree_depth=1)
+    tree.build_tree("stub-model")
+    model.kinds.clear()
+
+    tree.deepen("stub-model")
+
+    assert tree.tree_paths == full_tree("root", 2, 2)
+    assert model.kinds == ["single", "single"]
@@ -0,0 +1,13 @@
+from pluto.utils import extract_dict, extract_list
+
+
+def test_extract_list_from_surrounding_text():
+    assert extract_list('subtopics: ["a", ["b"]] done') == ["a", ["b"]]
+
+
+def test_extract_list_unclosed_bracket_returns_none():
+    assert extract_list('["a", "b"') is None
+
+
+def test_extract_dict_unclosed_brace_returns_none():
+    assert extract_dict('{"a": 1') is None
@@ -0,0 +1,152 @@
+import sqlite3
+import time
+
+import pytest
+
+from pluto import DataEngine, EngineArguments
+from pluto.work_queue import DONE, FAILED, LEASED, PENDING, WorkQueue
+
+
+def sample(text):
+    return {"messages": [{"role": "user", "content": text}]}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "queue.db")
+
+
+def test_lease_takes_pending_items_in_order(db_path):
+    queue = WorkQueue(db_path)
+    queue.enqueue_paths([["root", "a"], ["root", "b"], ["root", "c"]])
+
+    first = queue.lease("w1", max_items=2)
+    second = queue.lease("w2", max_items=2)
+
+    assert [item.path for item in first.items] == [["root", "a"], ["root", "b"]]
+    assert [item.path for item in second.items] == [["root", "c"]]
+    assert queue.lease("w3").items == []
+    assert queue.stats()[LEASED] == 3
+
+
+def test_expired_lease_is_leased_again(db_path):
+    queue = WorkQueue(db_path, lease_timeout=0.0)
+    queue.enqueue_paths([["root", "a"]])
+
+    first = queue.lease("w1")
+    time.sleep(0.01)
+    second = queue.lease("w2")
+
+    assert [item.id for item in second.items] == [item.id for item in first.items]
+    assert second.token != first.token
+
+
+def test_commit_with_stale_token_is_ignored(db_path):
+    queue = WorkQueue(db_path, lease_timeout=0.0)
+    queue.enqueue_paths([["root", "a"]])
+    first = queue.lease("w1")
+    time.sleep(0.01)
+    second = queue.lease("w2")
+    item_id = first.items[0].id
+
+    assert queue.complete(first, {item_id: [sample("stale")]}) == []
+    assert queue.complete(second, {item_id: [sample("fresh")]}) == [item_id]
+    assert queue.stats()[DONE] == 1
+    assert queue.merge().samples == [sample("fresh")]
+
+
+def test_fail_requeues_until_max_attempts(db_path):
+    queue = WorkQueue(db_path, max_attempts=2)
+    queue.enqueue_paths([["root", "a"]])
+
+    lease = queue.lease("w1")
+    queue.fail(lease, [lease.items[0].id], "bad output")
+    assert queue.stats()[PENDING] == 1
+
+    lease = queue.lease("w1")
+    queue.fail(lease, [lease.items[0].id], "bad output")
+    assert queue.stats()[FAILED] == 1
+    assert queue.lease("w1").items == []
+    assert queue.is_finished()
+
+    assert queue.requeue_failed() == 1
+    assert queue.stats()[PENDING] == 1
+
+
+def test_expired_lease_fails_after_max_attempts(db_path):
+    queue = WorkQueue(db_path, lease_timeout=0.0, max_attempts=2)
+    queue.enqueue_paths([["root", "a"]])
+
+    queue.lease("w1")
+    time.sleep(0.01)
+    queue.lease("w2")
+    time.sleep(0.01)
+
+    assert queue.lease("w3").items == []
+    assert queue.stats()[FAILED] == 1
+
+
+def test_merge_follows_enqueue_order(db_path):
+    queue = WorkQueue(db_path)
+    queue.enqueue_paths([["root", "a"], ["root", "b"], ["root", "c"]])
+    leases = [queue.lease(f"w{i}") for i in range(3)]
+
+    # 提交顺序与入队顺序相反
+    for lease in reversed(leases):
+        item = lease.items[0]
+        samples = [sample(f"{item.path[-1]}{k}") for k in range(2)]
+        queue.complete(lease, {item.id: samples})
+
+    texts = [s["messages"][0]["content"] for s in queue.merge().samples]
+    assert texts == ["a0", "a1", "b0", "b1", "c0", "c1"]
+
+
+def test_merge_restores_sample_metadata(db_path):
+    queue = WorkQueue(db_path)
+    queue.enqueue_paths([["root", "a"], ["root", "b"]])
+    lease = queue.lease("w1", max_items=2)
+    first, second = lease.items
+
+    queue.complete(
+        lease,
+        {first.id: [sample("a")], second.id: [sample("b")]},
+        {first.id: [{"tree_path": ["root", "a"], "model": "m"}]},
+    )
+    dataset = queue.merge()
+
+    assert dataset.samples == [sample("a"), sample("b")]
+    assert dataset.metadata == [{"tree_path": ["root", "a"], "model": "m"}, {}]
+
+
+def test_queue_without_metadata_column_is_migrated(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        "CREATE TABLE items (id INTEGER PRIMARY KEY, path TEXT, "
+        "count INTEGER NOT NULL DEFAULT 1, state TEXT NOT NULL DEFAULT 'pending', "
+        "attempts INTEGER NOT NULL DEFAULT 0, worker_id TEXT, lease_token TEXT, "
+        "lease_expires REAL, error TEXT);"
+        "CREATE TABLE samples (id INTEGER PRIMARY KEY, "
+        "item_id INTEGER NOT NULL REFERENCES items (id), sample TEXT NOT NULL);"
+        "INSERT INTO items (path, state) VALUES (NULL, 'done');"
+        'INSERT INTO samples (item_id, sample) VALUES '
+        '(1, \'{"messages": [{"role": "user", "content": "old"}]}\');'
+    )
+    conn.close()
+
+    dataset = WorkQueue(db_path).merge()
+
+    assert dataset.samples == [sample("old")]
+    assert dataset.metadata == [{}]
+
+
+def test_run_worker_commits_provenance(db_path, stub_client):
+    stub, client = stub_client()
+    queue = WorkQueue(db_path)
+    queue.enqueue_paths([["root", "a"], ["root", "b"]])
+    engine = DataEngine(EngineArguments("instructions", "SYS"), client=client)
+
+    assert engine.run_worker(queue, "stub-model", batch_size=2) == 2
+    dataset = queue.merge()
+
+    assert [m["tree_path"] for m in dataset.metadata] == [["root", "a"], ["root", "b"]]
+    assert all(m["model"] and m["usage"] for m in dataset.metadata)
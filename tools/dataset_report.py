@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+数据集多样性与冗余报告：distinct-n、近似重复簇、按顶层分支的冗余率与两两相似度分布。
+在大规模生成前用小批量样本调整树的宽度、深度与温度。
+
+用法: python tools/dataset_report.py data.jsonl [--threshold 0.8] [--json report.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pluto.analysis import (  # noqa: E402
+    DEFAULT_BANDS,
+    DEFAULT_NUM_PERM,
+    DEFAULT_THRESHOLD,
+    analyze_file,
+    format_report,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="数据集多样性与冗余报告")
+    parser.add_argument("input_file", help="JSONL、Parquet 或 Arrow 数据集文件")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="判定为近似重复的 Jaccard 相似度阈值",
+    )
+    parser.add_argument(
+        "--num-perm", type=int, default=DEFAULT_NUM_PERM, help="MinHash 签名长度"
+    )
+    parser.add_argument(
+        "--bands", type=int, default=DEFAULT_BANDS, help="LSH 分段数，须整除签名长度"
+    )
+    parser.add_argument("--top", type=int, default=10, help="列出的最大重复簇个数")
+    parser.add_argument(
+        "--pairwise-sample", type=int, default=2000, help="计算两两相似度的抽样样本数"
+    )
+    parser.add_argument("--json", help="同时把完整报告写入 JSON 文件")
+    args = parser.parse_args()
+
+    report = analyze_file(
+        args.input_file,
+        num_perm=args.num_perm,
+        bands=args.bands,
+        threshold=args.threshold,
+        top_clusters=args.top,
+        pairwise_sample=args.pairwise_sample,
+    )
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,75 @@
 """
 修复 JSONL 文件中的 Unicode 编码问题
 将 Unicode 转义序列转换为可读的中文字符
+
+按字节区间分块，在进程池中并行处理并保持行序；内存占用只与块大小和并发数有关。
+结果先写入同目录下的临时文件，完成后原子地重命名，中途崩溃不会截断原文件。
 """
 
-import json
 import argparse
+import glob
+import json
+import os
 import sys
-
-
-def fix_unicode_file(input_file, output_file=None):
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import BinaryIO, Deque, Iterator, List, Optional, Tuple
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+# (修复后的内容, 有效行数, 总行数, [(块内行号, 错误信息, 行内容)])
+ChunkResult = Tuple[bytes, int, int, List[Tuple[int, str, str]]]
+
+
+def iter_chunks(input_file: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """把文件切分为按行对齐的字节区间"""
+    file_size = os.path.getsize(input_file)
+    with open(input_file, "rb") as f:
+        start = 0
+        while start < file_size:
+            f.seek(min(start + chunk_size, file_size))
+            # 读完当前行，使区间结束于换行符之后
+            f.readline()
+            end = min(f.tell(), file_size)
+            yield start, end
+            start = end
+
+
+def fix_chunk(input_file: str, start: int, end: int) -> ChunkResult:
+    """重新编码一个字节区间内的所有行"""
+    with open(input_file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    fixed_lines = []
+    errors = []
+    # 按 \n 切分字节而不是 str.splitlines()，后者会在 JSON 字符串中的 U+2028 等字符处断行
+    lines = data.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    for line_num, raw_line in enumerate(lines, 1):
+        line = raw_line.decode("utf-8").strip()
+        if not line:
+            continue
+
+        try:
+            # 解析 JSON 后重新编码，确保中文字符正常显示
+            fixed_lines.append(json.dumps(json.loads(line), ensure_ascii=False))
+        except json.JSONDecodeError as e:
+            errors.append((line_num, str(e), line[:100]))
+
+    output = "".join(line + "\n" for line in fixed_lines).encode("utf-8")
+    return output, len(fixed_lines), len(lines), errors
+
+
+def fix_unicode_file(
+    input_file: str,
+    output_file: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> bool:
     """修复文件中的 Unicode 编码问题"""
 
     if output_file is None:
@@ -18,70 +79,154 @@ def fix_unicode_file(input_file, output_file=None):
     print(f"🔧 修复文件: {input_file}")
     print(f"📁 输出到: {output_file}")
 
-    try:
-        fixed_lines = []
-        with open(input_file, "r", encoding="utf-8") as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-
-                try:
-                    # 解析 JSON
-                    data = json.loads(line)
-                    # 重新编码，确保中文字符正常显示
-                    fixed_line = json.dumps(data, ensure_ascii=False)
-                    fixed_lines.append(fixed_line)
-
-                except json.JSONDecodeError as e:
-                    print(f"⚠️  第 {line_num} 行 JSON 解析错误: {e}")
-                    print(f"   内容: {line[:100]}...")
-                    continue
-
-        # 写入修复后的文件
-        with open(output_file, "w", encoding="utf-8") as f:
-            for line in fixed_lines:
-                f.write(line + "\n")
-
-        print("✅ 修复完成！")
-        print(f"📊 处理了 {len(fixed_lines)} 行数据")
-
-        # 显示修复前后对比
-        print("\n🔍 修复效果对比:")
-        if fixed_lines:
-            print("修复前:")
-            with open(input_file, "r", encoding="utf-8") as f:
-                first_line = f.readline().strip()
-                print(f"  {first_line[:80]}...")
+    if not os.path.isfile(input_file):
+        print(f"❌ 文件不存在: {input_file}")
+        return False
 
-            print("修复后:")
-            print(f"  {fixed_lines[0][:80]}...")
+    workers = workers or os.cpu_count() or 1
+    # 原地修复时原文件会被替换，先记下第一行用于对比
+    with open(input_file, "r", encoding="utf-8", errors="replace") as f:
+        first_line = f.readline().strip()
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    tmp_fd, tmp_path = tempfile.mkstemp(
+        prefix=".fix_unicode_", suffix=".tmp", dir=output_dir
+    )
+    start_time = time.time()
+    num_fixed = 0
+    num_lines = 0
+    num_bytes = 0
+
+    def write_result(out: BinaryIO, result: ChunkResult) -> None:
+        nonlocal num_fixed, num_lines
+        output, fixed, lines, errors = result
+        for line_num, error, content in errors:
+            print(f"⚠️  第 {num_lines + line_num} 行 JSON 解析错误: {error}")
+            print(f"   内容: {content}...")
+        out.write(output)
+        num_fixed += fixed
+        num_lines += lines
 
-        return True
+    try:
+        with os.fdopen(tmp_fd, "wb") as out:
+            chunks = list(iter_chunks(input_file, chunk_size))
+            num_bytes = chunks[-1][1] if chunks else 0
+            if len(chunks) <= 1 or workers == 1:
+                # 小文件直接在当前进程处理，省去进程池开销
+                for start, end in chunks:
+                    write_result(out, fix_chunk(input_file, start, end))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    # 限制在途块数，按提交顺序写出以保持行序
+                    in_flight: Deque[Future] = deque()
+                    for start, end in chunks:
+                        if len(in_flight) >= 2 * workers:
+                            write_result(out, in_flight.popleft().result())
+                        in_flight.append(
+                            executor.submit(fix_chunk, input_file, start, end)
+                        )
+                    while in_flight:
+                        write_result(out, in_flight.popleft().result())
+
+        # 临时文件权限为 0600：保留已有输出文件的权限，否则按 umask 设置
+        if os.path.exists(output_file):
+            mode = os.stat(output_file).st_mode & 0o777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, output_file)
 
-    except FileNotFoundError:
-        print(f"❌ 文件不存在: {input_file}")
-        return False
     except Exception as e:
+        os.unlink(tmp_path)
         print(f"❌ 修复过程中出错: {e}")
         return False
 
+    elapsed = max(time.time() - start_time, 1e-9)
+    print("✅ 修复完成！")
+    print(f"📊 处理了 {num_fixed} 行数据")
+    print(
+        f"⏱️  用时 {elapsed:.2f}s，{num_bytes / elapsed / 1024 / 1024:.1f} MB/s，"
+        f"{num_lines / elapsed:.0f} 行/s"
+    )
+
+    # 显示修复前后对比
+    if num_fixed:
+        print("\n🔍 修复效果对比:")
+        print("修复前:")
+        print(f"  {first_line[:80]}...")
+        print("修复后:")
+        with open(output_file, "r", encoding="utf-8") as f:
+            print(f"  {f.readline().strip()[:80]}...")
+
+    return True
 
-def main():
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """展开通配符，保持参数顺序并去重"""
+    files: List[str] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            print(f"⚠️  没有匹配的文件: {pattern}")
+        for path in matches:
+            if path not in files:
+                files.append(path)
+    return files
+
+
+def main() -> None:
     parser = argparse.ArgumentParser(description="修复 JSONL 文件中的 Unicode 编码问题")
-    parser.add_argument("input_file", help="输入的 JSONL 文件路径")
-    parser.add_argument("-o", "--output", help="输出文件路径（可选）")
+    parser.add_argument(
+        "input_files", nargs="+", help="输入的 JSONL 文件路径，可以是多个文件或通配符"
+    )
+    parser.add_argument("-o", "--output", help="输出文件路径（可选，仅限单个输入文件）")
     parser.add_argument("--inplace", action="store_true", help="直接修改原文件")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="并行进程数（默认为 CPU 核数）"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+        help="每个分块的大小（MB）",
+    )
 
     args = parser.parse_args()
 
-    if args.inplace:
-        output_file = args.input_file
-    else:
-        output_file = args.output
-
-    success = fix_unicode_file(args.input_file, output_file)
-    sys.exit(0 if success else 1)
+    input_files = expand_inputs(args.input_files)
+    if args.output and len(input_files) > 1:
+        parser.error("--output 只能用于单个输入文件")
+
+    start_time = time.time()
+    total_bytes = 0
+    failed = 0
+    for input_file in input_files:
+        if args.inplace:
+            output_file: Optional[str] = input_file
+        else:
+            output_file = args.output
+
+        if os.path.isfile(input_file):
+            total_bytes += os.path.getsize(input_file)
+        if not fix_unicode_file(
+            input_file,
+            output_file,
+            workers=args.workers,
+            chunk_size=args.chunk_size * 1024 * 1024,
+        ):
+            failed += 1
+        print()
+
+    if len(input_files) > 1:
+        elapsed = max(time.time() - start_time, 1e-9)
+        print(
+            f"📦 共 {len(input_files)} 个文件，失败 {failed} 个，"
+            f"{total_bytes / 1024 / 1024:.1f} MB，"
+            f"{total_bytes / elapsed / 1024 / 1024:.1f} MB/s"
+        )
+
+    sys.exit(0 if input_files and failed == 0 else 1)
 
 
 if __name__ == "__main__":